@@ -0,0 +1,109 @@
+"""
+Benchmark de latencia del event loop con partidas concurrentes.
+
+Compara DB_EXECUTION_MODE="inline" contra "threadpool": mientras varias partidas
+consultan mano, mazo y turno en paralelo, se mide la latencia de GET "/"
+(que no toca la base) como indicador de cuanto se bloquea el loop.
+
+Uso (desde la raiz del repo):
+    python benchmarks/bench_ejecucion_db.py [--partidas 8] [--jugadores 4] [--rondas 30]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_DIR_DB = tempfile.mkdtemp(prefix="bench_db_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DIR_DB, 'bench.db')}"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import httpx
+from settings import settings
+from game.modelos import ejecucion
+from main import app
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+async def _preparar_partida(client, jugadores):
+    resp = await client.post("/partidas", json={
+        "nombre-partida": "bench",
+        "max-jugadores": 6,
+        "min-jugadores": 2,
+        "nombre-jugador": "anfitrion",
+        "dia-nacimiento": "1990-01-01",
+    })
+    datos = resp.json()
+    id_partida, id_anfitrion = datos["id_partida"], datos["id_jugador"]
+    ids = [id_anfitrion]
+    for i in range(jugadores - 1):
+        resp = await client.post(f"/partidas/{id_partida}", json={
+            "nombreJugador": f"jugador{i}",
+            "fechaNacimiento": "1991-01-01",
+        })
+        ids.append(resp.json()["id_jugador"])
+    await client.put(f"/partidas/{id_partida}", json={"id_jugador": id_anfitrion})
+    return id_partida, ids
+
+
+async def _jugar(client, id_partida, ids, rondas):
+    for _ in range(rondas):
+        for id_jugador in ids:
+            await client.get(f"/partidas/{id_partida}/mano", params={"id_jugador": id_jugador})
+        await client.get(f"/partidas/{id_partida}/mazo")
+        await client.get(f"/partidas/{id_partida}/turno")
+
+
+async def _sondear(client, fin, latencias):
+    while not fin.is_set():
+        inicio = time.perf_counter()
+        await client.get("/")
+        latencias.append(time.perf_counter() - inicio)
+        await asyncio.sleep(0.001)
+
+
+async def _correr(modo, partidas, jugadores, rondas):
+    settings.DB_EXECUTION_MODE = modo
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as client:
+        juegos = [await _preparar_partida(client, jugadores) for _ in range(partidas)]
+        fin = asyncio.Event()
+        latencias = []
+        sonda = asyncio.create_task(_sondear(client, fin, latencias))
+        inicio = time.perf_counter()
+        await asyncio.gather(*(_jugar(client, id_partida, ids, rondas) for id_partida, ids in juegos))
+        total = time.perf_counter() - inicio
+        fin.set()
+        await sonda
+    ejecucion.cerrar_executor()
+    return total, latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--partidas", type=int, default=8)
+    parser.add_argument("--jugadores", type=int, default=4)
+    parser.add_argument("--rondas", type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"{args.partidas} partidas x {args.jugadores} jugadores, {args.rondas} rondas")
+    print(f"{'modo':<12}{'total(s)':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for modo in ("inline", "threadpool"):
+        total, latencias = asyncio.run(_correr(modo, args.partidas, args.jugadores, args.rondas))
+        if not latencias:
+            latencias = [0.0]
+        print(f"{modo:<12}{total:>10.2f}"
+              f"{statistics.median(latencias) * 1000:>10.2f}"
+              f"{_percentil(latencias, 99) * 1000:>10.2f}"
+              f"{max(latencias) * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
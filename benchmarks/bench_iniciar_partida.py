@@ -0,0 +1,100 @@
+"""
+Benchmark de iniciarPartida para 2 a 6 jugadores.
+
+Compara el armado anterior (objetos ORM carta por carta) contra el actual
+(CartaService.preparar_cartas_partida: armado en memoria + un INSERT
+masivo), sobre una base SQLite en archivo. El armado anterior ya no esta en
+el codigo: se mide iniciarPartida en un `git worktree` del commit base
+(por defecto el anterior al INSERT masivo) y en el arbol actual, cada uno
+en su propio proceso.
+
+Uso (desde la raiz del repo):
+    python benchmarks/bench_iniciar_partida.py [--repeticiones 20] [--base ed476a7^]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+BASE = "ed476a7^"
+
+
+def _medir_arbol(src: str, repeticiones: int) -> dict:
+    """Mediana de iniciarPartida por cantidad de jugadores, con el codigo de src."""
+    directorio = tempfile.mkdtemp(prefix="bench_iniciar_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directorio, 'bench.db')}"
+    sys.path.insert(0, src)
+
+    from game.modelos.db import Base, get_engine, get_session_local
+    from game.partidas.utils import crearPartida, unir_a_partida, iniciarPartida
+    from game.partidas.schemas import PartidaData, IniciarPartidaData
+    from game.jugadores.schemas import JugadorData
+
+    Base.metadata.create_all(bind=get_engine())
+    SessionLocal = get_session_local(get_engine())
+    medianas = {}
+    for cantidad_jugadores in range(2, 7):
+        tiempos = []
+        for _ in range(repeticiones):
+            db = SessionLocal()
+            partida = crearPartida(PartidaData(**{
+                "nombre-partida": "bench", "max-jugadores": 6, "min-jugadores": 2,
+                "nombre-jugador": "j0", "dia-nacimiento": "1990-01-01",
+            }), db)
+            for i in range(1, cantidad_jugadores):
+                unir_a_partida(partida.id_partida, JugadorData(nombreJugador=f"j{i}", fechaNacimiento="1991-01-01"), db)
+            data = IniciarPartidaData(id_jugador=partida.id_jugador)
+            inicio = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                iniciarPartida(partida.id_partida, data, db)
+            tiempos.append(time.perf_counter() - inicio)
+            db.close()
+        medianas[cantidad_jugadores] = statistics.median(tiempos)
+    shutil.rmtree(directorio, ignore_errors=True)
+    return medianas
+
+
+def _medir_en_proceso(src: str, repeticiones: int) -> dict:
+    salida = subprocess.run(
+        [sys.executable, __file__, "--src", src, "--repeticiones", str(repeticiones)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return {int(k): v for k, v in json.loads(salida.splitlines()[-1]).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--base", default=BASE, help="commit con el armado anterior")
+    parser.add_argument("--src", help=argparse.SUPPRESS)  # uso interno: medir un arbol
+    args = parser.parse_args()
+
+    if args.src:
+        print(json.dumps(_medir_arbol(args.src, args.repeticiones)))
+        return
+
+    worktree = tempfile.mkdtemp(prefix="bench_iniciar_base_")
+    subprocess.run(["git", "-C", RAIZ, "worktree", "add", "--detach", "--force", worktree, args.base],
+                   check=True, capture_output=True)
+    try:
+        anterior = _medir_en_proceso(os.path.join(worktree, "src"), args.repeticiones)
+    finally:
+        subprocess.run(["git", "-C", RAIZ, "worktree", "remove", "--force", worktree], capture_output=True)
+    actual = _medir_en_proceso(os.path.join(RAIZ, "src"), args.repeticiones)
+
+    print(f"{'jugadores':<10}{'anterior p50(ms)':>18}{'bulk p50(ms)':>14}{'mejora':>8}")
+    for cantidad_jugadores in range(2, 7):
+        antes, ahora = anterior[cantidad_jugadores], actual[cantidad_jugadores]
+        print(f"{cantidad_jugadores:<10}{antes * 1000:>18.2f}{ahora * 1000:>14.2f}{antes / ahora:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark de robar_cartas segun el tamanio del mazo de robo.
+
+Compara el robo anterior (cargar todo el mazo_robo y quedarse con las
+primeras k filas) contra CartaService.robar_cartas, que lee solo las k
+cartas del tope por orden_mazo. Con el indice el costo del robo nuevo no
+deberia crecer con el mazo. Cada robo se revierte para medir siempre
+sobre el mismo mazo.
+
+Uso (desde la raiz del repo):
+    python benchmarks/bench_robar_cartas.py [--repeticiones 50] [--cantidad 3]
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_DIR_DB = tempfile.mkdtemp(prefix="bench_robar_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DIR_DB, 'bench.db')}"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from game.modelos.db import Base, get_engine, get_session_local
+from game.partidas.models import Partida
+from game.jugadores.models import Jugador
+from game.cartas.models import Carta
+import game.partidas.utils  # noqa: F401 - cartas.services se importa despues de partidas (import circular)
+from game.cartas.services import CartaService
+
+TAMANIOS_MAZO = (50, 500, 5_000, 50_000)
+
+
+def _armar_partida(db, id_partida, tamanio_mazo):
+    db.add(Partida(id=id_partida, nombre="bench", anfitrionId=id_partida, cantJugadores=1,
+                   iniciada=True, maxJugadores=6, minJugadores=2))
+    db.add(Jugador(id=id_partida, nombre="j", fecha_nacimiento=datetime.date(1990, 1, 1), partida_id=id_partida))
+    db.flush()
+    db.bulk_insert_mappings(Carta, [
+        {"id_carta": 7, "nombre": "Hercule Poirot", "tipo": "Detective", "ubicacion": "mazo_robo",
+         "orden_mazo": tamanio_mazo - i, "bocaArriba": False, "partida_id": id_partida, "jugador_id": 0}
+        for i in range(tamanio_mazo)
+    ])
+    db.commit()
+
+
+def _robar_anterior(db, id_partida, id_jugador, cantidad):
+    """Robo previo: todo el mazo en memoria, sin ORDER BY."""
+    mazo = db.query(Carta).filter_by(partida_id=id_partida, ubicacion="mazo_robo").all()
+    for carta in mazo[:cantidad]:
+        carta.jugador_id = id_jugador
+        carta.ubicacion = "mano"
+        carta.orden_mazo = None
+    db.flush()
+
+
+def _robar_tope(db, id_partida, id_jugador, cantidad):
+    CartaService(db).robar_cartas(id_partida, id_jugador, cantidad)
+
+
+def _medir(robar, db, id_partida, cantidad, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        robar(db, id_partida, id_partida, cantidad)
+        tiempos.append(time.perf_counter() - inicio)
+        db.rollback()
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=50)
+    parser.add_argument("--cantidad", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    db = get_session_local(engine)()
+    print(f"{'mazo':<10}{'anterior p50(ms)':>18}{'tope p50(ms)':>14}{'mejora':>9}")
+    for id_partida, tamanio in enumerate(TAMANIOS_MAZO, start=1):
+        _armar_partida(db, id_partida, tamanio)
+        anterior = _medir(_robar_anterior, db, id_partida, args.cantidad, args.repeticiones)
+        tope = _medir(_robar_tope, db, id_partida, args.cantidad, args.repeticiones)
+        print(f"{tamanio:<10}{anterior * 1000:>18.3f}{tope * 1000:>14.3f}{anterior / tope:>8.1f}x")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Catalogo inmutable de cartas, armado una sola vez al importar a partir de
+cartasDict y secretosDict (que estan indexados por un numero arbitrario,
+no por el id de la carta).
+
+Todas las consultas son O(1): id -> tipo, id -> nombre, nombre -> id y
+conjuntos congelados de ids por tipo. Las reglas deben preguntar aca en
+lugar de comparar nombres de cartas.
+"""
+from dataclasses import dataclass
+from types import MappingProxyType
+from game.cartas.constants import cartasDict, secretosDict
+from game.cartas.enums import TipoCarta
+
+
+@dataclass(frozen=True)
+class CartaCatalogo:
+    id: int
+    nombre: str
+    tipo: TipoCarta
+    cantidad: int
+
+
+def _armar_catalogo() -> MappingProxyType:
+    catalogo = {}
+    for datos in (*cartasDict.values(), *secretosDict.values()):
+        catalogo[datos["id"]] = CartaCatalogo(
+            id=datos["id"],
+            nombre=datos["carta"],
+            tipo=TipoCarta(datos["tipo"]),
+            cantidad=datos["cantidad"],
+        )
+    return MappingProxyType(catalogo)
+
+
+CATALOGO = _armar_catalogo()
+
+TIPO_POR_ID = MappingProxyType({c.id: c.tipo for c in CATALOGO.values()})
+NOMBRE_POR_ID = MappingProxyType({c.id: c.nombre for c in CATALOGO.values()})
+ID_POR_NOMBRE = MappingProxyType({c.nombre: c.id for c in CATALOGO.values()})
+
+
+def _ids_de_tipo(tipo: TipoCarta) -> frozenset:
+    return frozenset(c.id for c in CATALOGO.values() if c.tipo is tipo)
+
+
+IDS_DETECTIVE = _ids_de_tipo(TipoCarta.DETECTIVE)
+IDS_EVENTO = _ids_de_tipo(TipoCarta.EVENTO)
+IDS_INSTANTANEA = _ids_de_tipo(TipoCarta.INSTANTANEA)
+IDS_DEVIOUS = _ids_de_tipo(TipoCarta.DEVIOUS)
+IDS_SECRETO = _ids_de_tipo(TipoCarta.SECRETO)
+
+ID_COMODIN = ID_POR_NOMBRE["Harley Quin Wildcard"]
+IDS_COMODIN = frozenset({ID_COMODIN})
+ID_ASESINO = ID_POR_NOMBRE["murderer"]
+ID_COMPLICE = ID_POR_NOMBRE["accomplice"]
+ID_SECRETO_COMUN = ID_POR_NOMBRE["secreto_comun"]
+IDS_ROLES_ASESINOS = frozenset({ID_ASESINO, ID_COMPLICE})
+
+
+def tipo_de(id_carta: int) -> TipoCarta | None:
+    return TIPO_POR_ID.get(id_carta)
+
+
+def nombre_de(id_carta: int) -> str | None:
+    return NOMBRE_POR_ID.get(id_carta)
+
+
+def id_de(nombre: str) -> int | None:
+    return ID_POR_NOMBRE.get(nombre)
+
+
+def es_evento(id_carta: int) -> bool:
+    return id_carta in IDS_EVENTO
+
+
+def es_detective(id_carta: int) -> bool:
+    return id_carta in IDS_DETECTIVE
+
+
+def es_comodin(id_carta: int) -> bool:
+    return id_carta in IDS_COMODIN
+
+
+def es_carta(nombre: str, id_carta: int) -> bool:
+    """True si id_carta es el id de la carta llamada `nombre`."""
+    return id_carta is not None and ID_POR_NOMBRE.get(nombre) == id_carta
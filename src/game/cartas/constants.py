@@ -29,6 +29,7 @@ secretosDict = {
 }
 
 ARIADNE_OLIVER=15
+NOT_SO_FAST=16
 BLACKMAILED=26
 SOCIAL_FAUX_PAS=27
 DESGRACIA_SOCIAL_0=True
@@ -0,0 +1,101 @@
+"""
+Ubicaciones y tipos de carta.
+
+En la base se guardan como enteros chicos (ver EnumEntero); en Python son
+enums que heredan de str, asi que siguen comparando igual que los strings
+de siempre (carta.ubicacion == "mano") y se serializan como tales.
+"""
+from enum import Enum
+from sqlalchemy.types import SmallInteger, TypeDecorator
+
+
+class EnumCodificado(str, Enum):
+    """Enum de strings con un codigo entero estable para persistir."""
+
+    def __new__(cls, valor: str, codigo: int):
+        obj = str.__new__(cls, valor)
+        obj._value_ = valor
+        obj.codigo = codigo
+        return obj
+
+    def __str__(self):
+        return self.value
+
+    def __format__(self, spec):
+        return format(self.value, spec)
+
+    def __hash__(self):
+        return str.__hash__(self)
+
+    @classmethod
+    def _missing_(cls, valor):
+        # "Secreto" / "secreto", "Event" / "event": no distinguimos mayusculas
+        if isinstance(valor, str):
+            buscado = valor.lower()
+            for miembro in cls:
+                if miembro.value.lower() == buscado:
+                    return miembro
+            return cls.__dict__.get("_alias", {}).get(buscado)
+        return None
+
+    @classmethod
+    def desde_codigo(cls, codigo: int):
+        return cls._por_codigo()[codigo]
+
+    @classmethod
+    def _por_codigo(cls) -> dict:
+        # Se arma una sola vez por clase
+        mapa = cls.__dict__.get("_mapa_codigos")
+        if mapa is None:
+            mapa = {m.codigo: m for m in cls}
+            type.__setattr__(cls, "_mapa_codigos", mapa)
+        return mapa
+
+
+class UbicacionCarta(EnumCodificado):
+    MAZO_ROBO = ("mazo_robo", 1)
+    MANO = ("mano", 2)
+    DESCARTE = ("descarte", 3)
+    DRAFT = ("draft", 4)
+    MESA = ("mesa", 5)
+    EVENTO_JUGADO = ("evento_jugado", 6)
+    EN_LA_PILA = ("en_la_pila", 7)
+    SET_JUGADO = ("set_jugado", 8)
+    ELIMINADA = ("eliminada", 9)
+    REMOVIDA = ("removida", 10)
+
+
+class TipoCarta(EnumCodificado):
+    DETECTIVE = ("Detective", 1)
+    EVENTO = ("Event", 2)
+    INSTANTANEA = ("Instant", 3)
+    DEVIOUS = ("Deviuos", 4)  # asi figura en cartasDict y lo recibe el front
+    SECRETO = ("secreto", 5)
+
+
+# Otros nombres con los que llega un tipo (Not so fast es la carta de "respuesta")
+TipoCarta._alias = {"respuesta": TipoCarta.INSTANTANEA}
+
+
+class EnumEntero(TypeDecorator):
+    """
+    Columna SmallInteger que acepta y devuelve miembros de un EnumCodificado.
+    Los filtros con strings ("mano") se traducen al codigo al bindear.
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_cls):
+        super().__init__()
+        self.enum_cls = enum_cls
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        miembro = self.enum_cls(value)
+        return miembro.codigo
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return self.enum_cls.desde_codigo(value)
@@ -1,8 +1,10 @@
 """Modelo Carta"""
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.types import String
+from typing import List
 from game.modelos.db import Base
+from game.cartas.enums import EnumEntero, TipoCarta, UbicacionCarta
 
 class Carta(Base):
     __tablename__ = "cartas"
@@ -10,21 +12,35 @@ class Carta(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     id_carta: Mapped[int] = mapped_column(Integer, nullable=True)
     nombre: Mapped[str] = mapped_column(String, nullable=False)
-    tipo: Mapped[str] = mapped_column(String, nullable=False)
-    bocaArriba: Mapped[bool] = mapped_column(Boolean, default=True)
-    ubicacion: Mapped[str] = mapped_column(String, nullable=True)
+    tipo: Mapped[TipoCarta] = mapped_column(EnumEntero(TipoCarta), nullable=False)
+    bocaArriba: Mapped[bool] = mapped_column(Boolean, default=True, active_history=True)
+    # active_history: los contadores de pilas y de secretos necesitan el valor anterior aunque este expirado
+    ubicacion: Mapped[UbicacionCarta] = mapped_column(EnumEntero(UbicacionCarta), nullable=True, active_history=True)
     descripcion: Mapped[str] = mapped_column(String, nullable=True)
     orden_descarte: Mapped[int] = mapped_column(Integer, nullable=True)
     orden_mazo: Mapped[int] = mapped_column(Integer, nullable=True)  
     # Relacion de muchos a 1 con partida
     # Relacion de muchos a 1 con partida
-    partida_id: Mapped[int] = mapped_column(Integer, ForeignKey("partidas.id"))
+    partida_id: Mapped[int] = mapped_column(Integer, ForeignKey("partidas.id"), active_history=True)
     partida: Mapped["Partida"] = relationship("Partida", back_populates="cartas")
 
     # Relación de muchos a 1 con Jugador
-    jugador_id: Mapped[int] = mapped_column(Integer, ForeignKey("jugadores.id"))
+    jugador_id: Mapped[int] = mapped_column(Integer, ForeignKey("jugadores.id"), active_history=True)
     jugador: Mapped["Jugador"] = relationship("Jugador", back_populates="cartas")
 
+    # Indices segun los patrones de acceso de CartaService
+    __table_args__ = (
+        # mano, mazo de robo, draft, secretos en mesa, eventos jugados de una partida
+        Index("ix_cartas_partida_ubicacion_jugador", "partida_id", "ubicacion", "jugador_id"),
+        # pilas ordenadas: tope del descarte y del mazo de robo
+        Index("ix_cartas_partida_ubicacion_orden_descarte", "partida_id", "ubicacion", "orden_descarte"),
+        Index("ix_cartas_partida_ubicacion_orden_mazo", "partida_id", "ubicacion", "orden_mazo"),
+        # cartas de un jugador (mano, evento jugado en el turno)
+        Index("ix_cartas_jugador_ubicacion_id_carta", "jugador_id", "ubicacion", "id_carta"),
+        # busqueda de una carta por tipo dentro de una partida
+        Index("ix_cartas_partida_id_carta", "partida_id", "id_carta"),
+    )
+
 
 class SetJugado(Base):
     __tablename__ = "sets_jugados"
@@ -33,6 +49,55 @@ class SetJugado(Base):
     partida_id: Mapped[int] = mapped_column(Integer, ForeignKey("partidas.id"), nullable=False)
     jugador_id: Mapped[int] = mapped_column(Integer, ForeignKey("jugadores.id"), nullable=False)
     representacion_id_carta: Mapped[int] = mapped_column(Integer, nullable=False)
-    # Lista de ids de carta (id_carta), serializada como CSV simple para simplicidad
-    cartas_ids_csv: Mapped[str] = mapped_column(String, nullable=False)
 
+    # Cartas del set, una fila por carta y en el orden en que se jugaron
+    cartas: Mapped[List["SetJugadoCarta"]] = relationship(
+        "SetJugadoCarta",
+        order_by="SetJugadoCarta.posicion",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+    )
+
+    @property
+    def cartas_ids(self) -> list[int]:
+        """Lista de id_carta de las cartas del set."""
+        return [c.id_carta for c in self.cartas]
+
+    @cartas_ids.setter
+    def cartas_ids(self, ids: list[int]):
+        self.cartas = [SetJugadoCarta(posicion=i, id_carta=int(id_carta)) for i, id_carta in enumerate(ids)]
+
+    @property
+    def cartas_ids_csv(self) -> str:
+        """Representacion CSV de las cartas del set (formato del esquema anterior)."""
+        return ",".join(str(i) for i in self.cartas_ids)
+
+    @cartas_ids_csv.setter
+    def cartas_ids_csv(self, csv: str):
+        self.cartas_ids = [int(x) for x in csv.split(",") if x]
+
+    def agregar_carta(self, id_carta: int):
+        self.cartas.append(SetJugadoCarta(posicion=len(self.cartas), id_carta=id_carta))
+
+    __table_args__ = (
+        # sets de una partida, por tipo de set y por dueño
+        Index("ix_sets_jugados_partida_representacion_jugador", "partida_id", "representacion_id_carta", "jugador_id"),
+        # agregar una carta al set de un jugador
+        Index("ix_sets_jugados_jugador_representacion", "jugador_id", "representacion_id_carta"),
+    )
+
+
+class SetJugadoCarta(Base):
+    __tablename__ = "sets_jugados_cartas"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    set_id: Mapped[int] = mapped_column(Integer, ForeignKey("sets_jugados.id", ondelete="CASCADE"), nullable=False)
+    posicion: Mapped[int] = mapped_column(Integer, nullable=False)
+    id_carta: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (
+        # cartas de un set, en orden
+        Index("ix_sets_jugados_cartas_set_posicion", "set_id", "posicion"),
+        # sets que contienen una carta dada
+        Index("ix_sets_jugados_cartas_id_carta_set", "id_carta", "set_id"),
+    )
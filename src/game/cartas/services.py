@@ -1,5 +1,12 @@
-from game.cartas.constants import cartasDict, secretosDict
-from game.cartas.models import Carta, SetJugado
+from game.cartas.constants import cartasDict, secretosDict, NOT_SO_FAST
+from game.cartas.catalogo import (ID_ASESINO, ID_COMPLICE, ID_SECRETO_COMUN, es_carta, es_comodin,
+                                  id_de, nombre_de)
+from game.cartas.models import Carta, SetJugado, SetJugadoCarta
+from game.partidas.models import Partida
+from game.partidas.pilas import reservar_orden_descarte, reservar_orden_tope_mazo, mover_cartas
+from game.partidas.victoria import fijar_rol
+from game.partidas.roles import publicar_roles, roles_partida
+from game.partidas.contexto import contexto_vigente
 from game.jugadores.models import Jugador
 from game.jugadores.services import JugadorService
 from game.partidas.utils import *
@@ -7,7 +14,9 @@ import random
 from typing import List
 from collections import Counter
 import logging
-from sqlalchemy import func
+from sqlalchemy import func, insert
+from game.modelos.db import cache_de_sesion
+from game.partidas.estado import obtener_estado
 
 logger = logging.getLogger(__name__)
 
@@ -17,45 +26,116 @@ class CartaService:
         self._db = db
 
 
-    def crear_mazo_inicial(self, id_partida: int) -> list[Carta]:
+    def preparar_cartas_partida(self, id_partida: int, jugadores_en_partida: list[Jugador]) -> list[dict]:
         """
-        Crea el mazo inicial de cartas para una partida.
-        
+        Arma en memoria todas las cartas de una partida que se inicia (mazo mezclado,
+        reparto inicial, draft y secretos) y las inserta con un unico INSERT masivo.
+
         Parameters
         ----------
         id_partida: int
-            ID de la partida para la cual se crea el mazo.
-        
+            ID de la partida que se inicia.
+
+        jugadores_en_partida: list[Jugador]
+            Jugadores de la partida, en el orden en que se reparte.
+
         Returns
         -------
-        List[Carta]
-            Lista de objetos Carta que representan el mazo incicial.
-        """
-        mazo_nuevo = []
-        for carta in cartasDict.values():
-            cantidad = carta["cantidad"]
-            while cantidad > 0:
-                cartita = Carta(
-                    nombre=carta["carta"],
-                    tipo=carta["tipo"],
-                    bocaArriba=carta["bocaArriba"],
-                    ubicacion=carta["ubicacion"],
-                    jugador_id=0,
-                    partida_id=id_partida,
-                    id_carta=carta["id"]
-                )
-                cantidad -= 1
-                mazo_nuevo.append(cartita)
-
-        random.shuffle(mazo_nuevo)
-        for i, carta in enumerate(mazo_nuevo):
-            carta.orden_mazo = i
-
-        self._db.add_all(mazo_nuevo)
-        self._db.commit()
-        return mazo_nuevo
+        list[dict]
+            Filas insertadas en la tabla cartas.
+        """
+        mazo = [
+            {
+                "nombre": carta["carta"],
+                "tipo": carta["tipo"],
+                "bocaArriba": carta["bocaArriba"],
+                "ubicacion": carta["ubicacion"],
+                "jugador_id": 0,
+                "partida_id": id_partida,
+                "id_carta": carta["id"],
+                "orden_mazo": None,
+            }
+            for carta in cartasDict.values()
+            for _ in range(carta["cantidad"])
+        ]
+        random.shuffle(mazo)
+        for i, carta in enumerate(mazo):
+            carta["orden_mazo"] = i
+
+        # Una carta "Not so fast" por jugador y luego 5 mas, en el orden del mazo
+        def _dar(carta, jugador):
+            carta["jugador_id"] = jugador.id
+            carta["ubicacion"] = "mano"
+            carta["orden_mazo"] = None
+
+        not_so_fast = (carta for carta in mazo if carta["id_carta"] == NOT_SO_FAST)
+        for jugador in jugadores_en_partida:
+            _dar(next(not_so_fast), jugador)
+        libres = (carta for carta in mazo if carta["jugador_id"] == 0)
+        for jugador in jugadores_en_partida:
+            for _ in range(5):
+                _dar(next(libres), jugador)
+
+        # Las 3 primeras cartas que quedan en el mazo de robo forman el draft
+        for _ in range(3):
+            next(libres)["ubicacion"] = "draft"
+
+        filas = mazo + self._secretos_iniciales(id_partida, jugadores_en_partida)
+        self._db.execute(insert(Carta.__table__).execution_options(partidas=frozenset({id_partida})), filas)
+
+        # El INSERT masivo no pasa por el flush: fijamos aca los contadores de pilas
+        en_mazo = [carta["orden_mazo"] for carta in mazo if carta["ubicacion"] == "mazo_robo"]
+        partida = self._db.get(Partida, id_partida)
+        # Tres secretos ocultos por jugador
+        for jugador in jugadores_en_partida:
+            jugador.secretos_ocultos = 3
+            jugador.secretos_revelados = 0
+            jugador.desgracia_social = False
+        if partida is not None:
+            partida.cartas_mazo_robo = len(en_mazo)
+            partida.cartas_descarte = 0
+            partida.orden_tope_mazo = min(en_mazo, default=0)
+            partida.orden_tope_descarte = 0
+            roles = {secreto["id_carta"]: secreto["jugador_id"] for secreto in filas[len(mazo):]
+                     if secreto["id_carta"] in (ID_ASESINO, ID_COMPLICE)}
+            for id_carta, jugador_id in roles.items():
+                fijar_rol(partida, id_carta, jugador_id)
+            publicar_roles(self._db, id_partida, roles.get(ID_ASESINO), roles.get(ID_COMPLICE))
+        logger.info("REPARTO INICIAL: partida=%s jugadores=%s cartas=%s",
+                    id_partida, len(jugadores_en_partida), len(filas))
+        return filas
+
+
+    def _secretos_iniciales(self, id_partida: int, jugadores_en_partida: list[Jugador]) -> list[dict]:
+        """
+        Tres secretos por jugador: uno de ellos es el del asesino (y el del complice
+        en partidas de 5 o 6 jugadores), en una posicion al azar.
+        """
+        asesino, complice = (random.sample(jugadores_en_partida, 2) if len(jugadores_en_partida) >= 5
+                             else (random.choice(jugadores_en_partida), None))
+        secretos = []
+        for jugador in jugadores_en_partida:
+            especial = None
+            if jugador is asesino:
+                especial = (nombre_de(ID_ASESINO), ID_ASESINO)
+            elif jugador is complice:
+                especial = (nombre_de(ID_COMPLICE), ID_COMPLICE)
+            posicion_especial = random.randrange(3)
+            for i in range(3):
+                nombre, id_carta = especial if (especial and i == posicion_especial) else (nombre_de(ID_SECRETO_COMUN), ID_SECRETO_COMUN)
+                secretos.append({
+                    "nombre": nombre,
+                    "tipo": "secreto",
+                    "bocaArriba": False,
+                    "ubicacion": "mesa",
+                    "jugador_id": jugador.id,
+                    "partida_id": id_partida,
+                    "id_carta": id_carta,
+                    "orden_mazo": None,
+                })
+        return secretos
+
 
-    
     def obtener_cartas_descarte(self, id_partida: int, cantidad: int) -> list[Carta]:
         """
         Obtiene las ultimas 'cantidad' cartas del mazo de descarte de una partida.
@@ -74,44 +154,6 @@ class CartaService:
         return cartas_descarte
 
 
-    def repartir_cartas_iniciales(self, mazo: list[Carta], jugadores_en_partida: list[Jugador]):
-        """
-        Reparte las cartas iniciales a los jugadores en una partida.
-        
-        Parameters
-        ----------
-        mazo: list[Carta]
-            Lista de objetos Carta que representan el mazo incicial.
-
-        jugadores_en_partida: list[Jugador]
-            Lista de jugadores en un
-        """
-        # Una carta "Not so fast" por jugador
-        for jugador in jugadores_en_partida:
-            for carta in mazo:
-                if carta.nombre.lower() == "not so fast" and carta.jugador_id == 0:
-                    carta.jugador_id = jugador.id
-                    carta.ubicacion = "mano"
-                    break  # pasamos al siguiente jugador
-        # Luego, repartir hasta 6 cartas por jugador
-        for jugador in jugadores_en_partida:
-            cartas_jugador = 0
-            for carta in mazo:
-                if carta.jugador_id == 0:
-                    carta.jugador_id = jugador.id
-                    carta.ubicacion = "mano"
-                    cartas_jugador += 1
-                    if cartas_jugador == 5:
-                        break  # pasamos al siguiente jugador
-        self._db.commit()
-        # refrescar última carta tocada si existe (defensivo)
-        try:
-            self._db.refresh(carta)  # type: ignore[name-defined]
-        except Exception:
-            pass
-        logger.info("REPARTO INICIAL: se repartieron cartas iniciales a jugadores")
-
-
     def obtener_mazo_de_robo(self, id_partida: int) -> list[Carta]:
         """
         Obtiene el mazo de robo para una partida específica.
@@ -124,12 +166,37 @@ class CartaService:
         Returns
         -------
         List[Carta]
-            Lista de objetos Carta que representan el mazo de robo.
+            Lista de objetos Carta que representan el mazo de robo, desde el tope.
         """
-        mazo_robo = self._db.query(Carta).filter_by(partida_id=id_partida, ubicacion="mazo_robo").all()
+        mazo_robo = (self._db.query(Carta)
+                     .filter_by(partida_id=id_partida, ubicacion="mazo_robo")
+                     .order_by(Carta.orden_mazo, Carta.id)
+                     .all())
         return mazo_robo
 
 
+    def tope_mazo_robo(self, id_partida: int, cantidad: int) -> list[Carta]:
+        """
+        Devuelve las primeras `cantidad` cartas del mazo de robo (menor orden_mazo
+        primero). Recorre ix_cartas_partida_ubicacion_orden_mazo y corta en
+        `cantidad`, asi que no depende del tamanio del mazo.
+        """
+        if cantidad <= 0:
+            return []
+        return (self._db.query(Carta)
+                .filter_by(partida_id=id_partida, ubicacion="mazo_robo")
+                .order_by(Carta.orden_mazo, Carta.id)
+                .limit(cantidad)
+                .all())
+
+
+    def contar_cartas(self, id_partida: int, ubicacion: str) -> int:
+        """Cantidad de cartas de una partida en una ubicacion (COUNT sobre el indice)."""
+        return (self._db.query(func.count(Carta.id))
+                .filter(Carta.partida_id == id_partida, Carta.ubicacion == ubicacion)
+                .scalar())
+
+
     def obtener_mano_jugador(self, id_jugador: int, id_partida: int) -> list[Carta]:
         """
         Obtiene la mano de cartas de un jugador en una partida específica.
@@ -147,18 +214,17 @@ class CartaService:
         List[Carta]
             Lista de objetos Carta que representan la mano del jugador.
         """
+        contexto = contexto_vigente(self._db, id_partida=id_partida)
+        if contexto is not None:
+            return contexto.mano(id_jugador)
         mano_jugador = self._db.query(Carta).filter_by(partida_id=id_partida, jugador_id=id_jugador, ubicacion="mano").all()
         return mano_jugador
 
 
     def ultimo_orden_descarte(self, id_partida: int) -> int:
-        
-        from sqlalchemy import func
-        ultimo_orden_descarte = (self._db.query(func.max(Carta.orden_descarte)).
-                                 filter(Carta.partida_id == id_partida).
-                                 scalar() or 0)
-        
-        return ultimo_orden_descarte
+        """Orden de la carta del tope del descarte (0 si nunca se descarto)."""
+        partida = self._db.get(Partida, id_partida)
+        return partida.orden_tope_descarte if partida is not None else 0
     
 
     def descartar_cartas(self, id_jugador, cartas_descarte_id):
@@ -167,70 +233,60 @@ class CartaService:
         """
         jugador = JugadorService(self._db).obtener_jugador(id_jugador)
 
-        tiene_cartas = True
-        cartas_mano = jugador.cartas
+        # Todas las cartas pedidas en una sola consulta; cada id_carta repetido toma otra instancia
+        cartas_jugador = (self._db.query(Carta)
+                          .filter(Carta.partida_id == jugador.partida_id,
+                                  Carta.jugador_id == id_jugador,
+                                  Carta.id_carta.in_(set(cartas_descarte_id)))
+                          .order_by(Carta.id)
+                          .all())
+        cartas_descarte = []
         for carta_id in cartas_descarte_id:
-            enMano = False
-            for carta in cartas_mano:
-                if (carta_id == carta.id_carta):
-                    enMano = enMano or True 
-            tiene_cartas = tiene_cartas and enMano
-
-        if not tiene_cartas:
-            raise Exception("Una o mas cartas no se encuentran en la mano del jugador")
-        
-        # Mantener orden de descarte y dejar visibles las cartas descartadas
-        ultimo_orden = (
-            self._db.query(func.max(Carta.orden_descarte))
-            .filter(Carta.partida_id == jugador.partida_id)
-            .scalar() or 0
-        )
-        
-        for carta in cartas_descarte_id:
-            carta_descarte = self._db.query(Carta).filter(Carta.id_carta == carta, Carta.jugador_id == id_jugador).first()
-            carta_descarte.jugador_id = 0
-            carta_descarte.ubicacion = "descarte"
-
-
-            carta_descarte.bocaArriba = False
-            ultimo_orden = ultimo_orden + 1
-            carta_descarte.orden_descarte = ultimo_orden
+            carta_descarte = next((c for c in cartas_jugador
+                                   if c.id_carta == carta_id and c not in cartas_descarte), None)
+            if carta_descarte is None:
+                raise Exception("Una o mas cartas no se encuentran en la mano del jugador")
+            cartas_descarte.append(carta_descarte)
+
+        self._mover_al_descarte(jugador.partida_id, cartas_descarte)
+        for carta_descarte in cartas_descarte:
+            print(f'Se descarto la carta con id {carta_descarte.id} y nombre {carta_descarte.nombre}.')
 
-            carta_descarte.orden_mazo = None
 
-            self._db.commit()
-            print(f'Se descarto la carta con id {carta_descarte.id} y nombre {carta_descarte.nombre}.')
+    def _mover_al_descarte(self, id_partida: int, cartas: list[Carta], boca_arriba: bool = False):
+        """Apila las cartas en el descarte, en el orden dado, con un unico UPDATE."""
+        ordenes = reservar_orden_descarte(self._db, id_partida, len(cartas))
+        mover_cartas(self._db, cartas, "descarte",
+                     jugador_id=0,
+                     partida_id=id_partida,
+                     bocaArriba=boca_arriba,
+                     orden_mazo=None,
+                     orden_descarte={carta.id: orden for carta, orden in zip(cartas, ordenes)})
 
     def obtener_cantidad_mazo(self, id_partida: int) -> int:
         """
         Calcula la cantidad de cartas restantes en el mazo de robo.
         """
-        mazo_robo = self.obtener_mazo_de_robo(id_partida)
-        return len(mazo_robo)
+        estado = obtener_estado(self._db, id_partida)
+        if estado is not None:
+            return estado.cantidad_mazo()
+        partida = self._db.get(Partida, id_partida)
+        return (partida.cartas_mazo_robo or 0) if partida is not None else 0
 
 
     def robar_cartas(self, id_partida: int, id_jugador: int, cantidad: int = 1):
         if cantidad <= 0:
             raise ValueError("La cantidad a robar debe ser mayor a 0")
 
-        # Obtener mazo de robo
-        mazo = self.obtener_mazo_de_robo(id_partida)
-        # Si no hay suficientes, robar tantas como haya
-        if len(mazo) == 0:
+        # Solo las cartas del tope; si no hay suficientes, se roban tantas como haya
+        cartas_a_robar = self.tope_mazo_robo(id_partida, cantidad)
+        if not cartas_a_robar:
             return []
-        if len(mazo) < cantidad:
-            cantidad = len(mazo)
 
-        cartas_a_robar = mazo[:cantidad]
-
-        # Asignar cartas al jugador
-        for carta in cartas_a_robar:
-            carta.jugador_id = id_jugador
-            carta.ubicacion = "mano"
-            carta.orden_mazo = None
+        mover_cartas(self._db, cartas_a_robar, "mano", jugador_id=id_jugador, orden_mazo=None)
         self.descartar_eventos(id_partida, id_jugador)
 
-        self._db.commit()
+        self._db.flush()
 
         resultado = [
             {"id": carta.id_carta, "nombre": carta.nombre}
@@ -253,22 +309,9 @@ class CartaService:
             id_partida (int)
 
         """
-        mazo_draft = (
-            self._db.query(Carta)
-            .filter(Carta.partida_id == id_partida, Carta.ubicacion == "draft")
-            .all()
-        )
-
-        cartas_draft = len(mazo_draft)
-        if cartas_draft <= 2:
-            mazo_robo = self.obtener_mazo_de_robo(id_partida)
-            for carta in mazo_robo:
-                carta.ubicacion = "draft"
-                cartas_draft += 1
-                if cartas_draft == 3:
-                    break
-            
-            self._db.commit()
+        faltantes = 3 - self.contar_cartas(id_partida, "draft")
+        if faltantes > 0:
+            mover_cartas(self._db, self.tope_mazo_robo(id_partida, faltantes), "draft", orden_mazo=None)
 
 
     def obtener_mazo_draft(self, id_partida: int) -> list[Carta]:
@@ -311,118 +354,26 @@ class CartaService:
                 cartas_tomadas_ids.remove(carta.id_carta)
                 tomados_nombres.append(carta.nombre)
 
-        self._db.commit()
+        self._db.flush()
         logger.info(
             "DRAFT TOMAR: partida=%s jugador=%s ids=%s nombres=%s",
             id_partida, id_jugador, original_ids, tomados_nombres,
         )
 
 
-    def crear_secretos(self, id_partida):
+    def obtener_carta(self, id_carta: int, id_partida: int) -> Carta:
         """
-        Crea las cartas secreto para una partida. Todas las cartas creadas son secretos comunes,
-        en el reparto se asigna la del asesino y cómplice (si aplica).
-        
-        Parameters
-        ----------
-        id_partida: int
-            ID de la partida para la cual se crean los secretos.
-        
-        Returns
-        -------
-        List[Carta]
-            Lista de objetos Carta que representan los secretos.
+        Obtiene un objeto Carta de la partida por su id_carta.
+        Las busquedas repetidas dentro del mismo request se sirven del cache de la sesion.
         """
-
-        secretos = []
-        for _ in range (18):
-            secret = Carta(
-                nombre="secreto_comun",
-                tipo="secreto",
-                bocaArriba=False,
-                ubicacion="mesa",
-                jugador_id=0,
-                partida_id=id_partida,
-                id_carta=6
-                )
-            secretos.append(secret)
-
-        self._db.add_all(secretos)
-        self._db.commit()
-
-        return secretos
-
-    
-    def repartir_secretos(self, secretos: list[Carta], jugadores_en_partida: list[Jugador]):
-        """
-        Reparte las cartas secreto a los jugadores en una partida.
-        
-        Parameters
-        ----------
-        mazo: list[Carta]
-            Lista de objetos Carta que son los secretos.
-
-        jugadores_en_partida: list[Jugador]
-            Lista de jugadores en un
-        """
-   
-        # Se elige un jugador al azar para que sea el asesino
-        index_murderer = random.randrange(len(jugadores_en_partida))
-        id_asesino = jugadores_en_partida[index_murderer].id
-        
-        id_complice = None
-        # Si es una partida de 5 o 6 jugadores debe haber un cómplice
-        if (len(jugadores_en_partida) >= 5):
-            accomplice_found = False
-            while not accomplice_found:
-                index_accomplice = random.randrange(len(jugadores_en_partida))
-                if index_accomplice != index_murderer:
-                    accomplice_found = True
-                    id_complice = jugadores_en_partida[index_accomplice].id
-        
-        secret_index = 0
-        for jugador in jugadores_en_partida:
-            # Si es el asesino o el cómplice, elijo una ubicacion al azar para esa carta y le doy las 2 comunes
-            if jugador.id == id_asesino:
-                ubicacionRandom = random.randrange(3)
-                for i in range(3):
-                    if i == ubicacionRandom:
-                        secretos[secret_index].nombre="murderer"
-                        secretos[secret_index].jugador_id=jugador.id
-                        secretos[secret_index].id_carta=3
-                        secret_index+=1
-                    else:
-                        secretos[secret_index].jugador_id=jugador.id
-                        secret_index+=1
-            elif (id_complice is not None and jugador.id == id_complice):
-                ubicacionRandom = random.randrange(3)
-                for i in range(3):
-                    if i == ubicacionRandom:
-                        secretos[secret_index].nombre="accomplice"
-                        secretos[secret_index].jugador_id=jugador.id
-                        secretos[secret_index].id_carta=4
-                        secret_index+=1
-                    else:
-                        secretos[secret_index].jugador_id=jugador.id
-                        secret_index+=1
-            # Si no es asesino o cómplice, le doy los 3 secretos
-            else:
-                for _ in range(3):
-                    secretos[secret_index].jugador_id = jugador.id
-                    secret_index+=1
-        
-        self._db.commit()
-            
-        print("se repartieron los secretos")
-
-
-    def obtener_carta(self, id_carta: int) -> Carta:
-        """
-        Obtiene un objeto Carta específico por su id_carta.
-        """
-        carta = self._db.query(Carta).filter(Carta.id_carta == id_carta).first()
-        if not carta:
-            raise ValueError(f"No se encontró una carta con id_carta {id_carta}")
+        cache = cache_de_sesion(self._db, "cartas_por_tipo")
+        clave = (id_partida, id_carta)
+        carta = cache.get(clave)
+        if carta is None:
+            carta = self._db.query(Carta).filter(Carta.partida_id == id_partida, Carta.id_carta == id_carta).first()
+            if not carta:
+                raise ValueError(f"No se encontró una carta con id_carta {id_carta} en la partida {id_partida}")
+            cache[clave] = carta
         return carta
 
 
@@ -443,6 +394,9 @@ class CartaService:
         List[Carta]
             Lista de objetos Carta secreto del jugador.
         """
+        contexto = contexto_vigente(self._db, id_partida=id_partida)
+        if contexto is not None:
+            return contexto.secretos(id_jugador)
         secretos_jugador = self._db.query(Carta).filter_by(partida_id=id_partida, jugador_id=id_jugador, ubicacion="mesa").all()
         return secretos_jugador
 
@@ -465,7 +419,7 @@ class CartaService:
         secreto_a_revelar = self._db.get(Carta, id_unico_secreto)
         
         secreto_a_revelar.bocaArriba = True
-        self._db.commit()
+        self._db.flush()
         #secreto_revelado = {"id-secreto": secreto_a_revelar.id}
 
         return secreto_a_revelar
@@ -497,26 +451,15 @@ class CartaService:
 
     def es_asesino(self, id_unico_secreto: int):
         secreto = self._db.get(Carta, id_unico_secreto)
-        return (secreto.nombre == "murderer")
+        return (secreto.id_carta == ID_ASESINO)
 
     def es_complice(self, id_unico_secreto: int):
         secreto = self._db.get(Carta, id_unico_secreto)
-        return (secreto.nombre == "accomplice")
+        return (secreto.id_carta == ID_COMPLICE)
 
     def obtener_asesino_complice(self, id_partida):
-        carta_asesino = self._db.query(Carta).filter_by(partida_id=id_partida, tipo="secreto", nombre="murderer").first()
-        asesino_id = carta_asesino.jugador_id if carta_asesino else None
-        carta_complice = self._db.query(Carta).filter_by(partida_id=id_partida, tipo="secreto", nombre="accomplice").first()
-        complice_id = carta_complice.jugador_id if carta_complice else None
-        
-        return {"asesino-id": asesino_id, "complice-id": complice_id}
-
-
-    def obtener_carta_por_id(self, id_carta: int) -> Carta:
-        carta = self._db.query(Carta).filter(Carta.id == id_carta).first()
-        if not carta:
-            raise ValueError(f"No se encontró la carta con id {id_carta}")
-        return carta
+        """jugador_id del asesino y del complice (None si no hay), desde la cache de roles."""
+        return roles_partida(self._db, id_partida) or {"asesino-id": None, "complice-id": None}
 
 
     def mover_set(self, set_cartas: list[int]) -> list[Carta]:
@@ -526,77 +469,51 @@ class CartaService:
             carta.ubicacion = "set_jugado"
             set_jugado.append(carta)
             self._db.add(carta)
-        self._db.commit()
+        self._db.flush()
         return set_jugado
 
 
     def registrar_set_jugado(self, id_partida: int, id_jugador: int, cartas: list[Carta]):
         # Representación del set: NUNCA usar comodín (Harley Quin, id=14)
         # Elegir la primera carta no comodín; si por algún motivo no hay, usar la primera
-        WILDCARD_ID = 14
-        representacion_id = 1
-        if cartas:
-            no_wildcards = [c for c in cartas if c.id_carta != WILDCARD_ID]
-            representacion_id = (no_wildcards[0].id_carta if no_wildcards else cartas[0].id_carta)
-        ids_csv = ",".join(str(c.id_carta) for c in cartas)
-        registro = SetJugado(
-            partida_id=id_partida,
-            jugador_id=id_jugador,
-            representacion_id_carta=representacion_id,
-            cartas_ids_csv=ids_csv,
-        )
-        self._db.add(registro)
-        self._db.commit()
-        return registro
-
-    def obtener_asesino_complice(self, id_partida):
-        carta_asesino = self._db.query(Carta).filter_by(partida_id=id_partida, tipo="secreto", nombre="murderer").first()
-        asesino_id = carta_asesino.jugador_id if carta_asesino else None
-        carta_complice = self._db.query(Carta).filter_by(partida_id=id_partida, tipo="secreto", nombre="accomplice").first()
-        complice_id = carta_complice.jugador_id if carta_complice else None
-        
-        return {"asesino-id": asesino_id, "complice-id": complice_id}
-
-
-    def registrar_set_jugado(self, id_partida: int, id_jugador: int, cartas: list[Carta]):
-        # Representación del set: NUNCA usar comodín (Harley Quin, id=14)
-        # Elegir la primera carta no comodín; si por algún motivo no hay, usar la primera
-        WILDCARD_ID = 14
         representacion_id = 1
         if cartas:
-            no_wildcards = [c for c in cartas if c.id_carta != WILDCARD_ID]
+            no_wildcards = [c for c in cartas if not es_comodin(c.id_carta)]
             representacion_id = (no_wildcards[0].id_carta if no_wildcards else cartas[0].id_carta)
-        ids_csv = ",".join(str(c.id_carta) for c in cartas)
         registro = SetJugado(
             partida_id=id_partida,
             jugador_id=id_jugador,
             representacion_id_carta=representacion_id,
-            cartas_ids_csv=ids_csv,
+            cartas_ids=[c.id_carta for c in cartas],
         )
         self._db.add(registro)
-        self._db.commit()
+        self._db.flush()
         return registro
 
 
     def obtener_sets_jugados(self, id_partida: int):
         """Devuelve [{ jugador_id, representacion_id_carta, cartas_ids: [int,int...] }]"""
+        # registrar_set_jugado nunca guarda el comodin como representacion,
+        # y las cartas de cada set llegan en una sola consulta (selectin)
         registros = self._db.query(SetJugado).filter(SetJugado.partida_id == id_partida).all()
-        WILDCARD_ID = 14
-        salida = []
-        for r in registros:
-            ids = [int(x) for x in r.cartas_ids_csv.split(",") if x]
-            rep = r.representacion_id_carta
-            # Corrección retroactiva: si por error quedó comodín como representación, usar primer no comodín
-            if rep == WILDCARD_ID:
-                rep_candidates = [i for i in ids if i != WILDCARD_ID]
-                if rep_candidates:
-                    rep = rep_candidates[0]
-            salida.append({
+        return [
+            {
                 "jugador_id": r.jugador_id,
-                "representacion_id_carta": rep,
-                "cartas_ids": ids,
-            })
-        return salida
+                "representacion_id_carta": r.representacion_id_carta,
+                "cartas_ids": r.cartas_ids,
+            }
+            for r in registros
+        ]
+
+    def obtener_sets_con_carta(self, id_partida: int, id_carta: int) -> list[SetJugado]:
+        """Sets de la partida que contienen al menos una carta con ese id_carta."""
+        return (
+            self._db.query(SetJugado)
+            .join(SetJugadoCarta, SetJugadoCarta.set_id == SetJugado.id)
+            .filter(SetJugadoCarta.id_carta == id_carta, SetJugado.partida_id == id_partida)
+            .distinct()
+            .all()
+        )
 
 
     def ocultar_secreto(self, id_unico_secreto: int) -> Carta:
@@ -617,7 +534,7 @@ class CartaService:
         secreto_a_ocultar = self._db.get(Carta, id_unico_secreto)
         
         secreto_a_ocultar.bocaArriba = False
-        self._db.commit()
+        self._db.flush()
 
         return secreto_a_ocultar
 
@@ -630,23 +547,30 @@ class CartaService:
     def robar_secreto(self, secreto_a_robar: Carta, id_jugador_destino: int):
         secreto_a_robar.bocaArriba = False
         secreto_a_robar.jugador_id = id_jugador_destino
-        self._db.commit()
+        self._db.flush()
         secreto_robado = {"id-secreto": secreto_a_robar.id}
         return secreto_robado
 
 
-    def obtener_carta_de_mano(self, id_carta: int, id_jugador: int) -> Carta:
-    
+    def obtener_carta_de_mano(self, id_carta: int, id_jugador: int, id_partida: int) -> Carta:
+        contexto = contexto_vigente(self._db, id_partida=id_partida)
+        if contexto is not None:
+            return contexto.carta_de_mano(id_jugador, id_carta)
         carta = (self._db.query(Carta).
-                 filter(Carta.id_carta == id_carta, Carta.jugador_id == id_jugador, Carta.ubicacion == "mano").
+                 filter(Carta.partida_id == id_partida, Carta.ubicacion == "mano",
+                        Carta.jugador_id == id_jugador, Carta.id_carta == id_carta).
                  first())
         return carta
     
     
-    def evento_jugado_en_turno(self, id_jugador: int) -> bool:
+    def evento_jugado_en_turno(self, id_jugador: int, id_partida: int) -> bool:
+        contexto = contexto_vigente(self._db, id_partida=id_partida)
+        if contexto is not None:
+            return contexto.evento_jugado(id_jugador)
         no_mas_eventos = False
         evento_ya_jugado = (self._db.query(Carta).
-                 filter(Carta.jugador_id == id_jugador, Carta.ubicacion == "evento_jugado").
+                 filter(Carta.partida_id == id_partida, Carta.ubicacion == "evento_jugado",
+                        Carta.jugador_id == id_jugador).
                  first())
         if evento_ya_jugado is not None:
             no_mas_eventos = True
@@ -657,17 +581,16 @@ class CartaService:
         cartas_jugador = self._db.query(Carta).filter_by(partida_id=id_partida,
                                                           jugador_id=id_objetivo, 
                                                           ubicacion="mano",
-                                                          nombre="Not so fast").all()
+                                                          id_carta=NOT_SO_FAST).all()
         if cartas_jugador:
-            id_cartas_jugador = [carta.id_carta for carta in cartas_jugador]
-            self.descartar_cartas(id_objetivo, id_cartas_jugador)
+            self._mover_al_descarte(id_partida, cartas_jugador)
             
     
     def obtener_cartas_jugadas(self, id_partida: int, id_jugador: int, nombre: str, ubicacion: str):
         carta_evento = self._db.query(Carta).filter_by(partida_id=id_partida,
                                                         jugador_id=id_jugador, 
                                                         ubicacion=ubicacion,
-                                                        nombre=nombre).first()
+                                                        id_carta=id_de(nombre)).first()
         return carta_evento
     
     
@@ -678,8 +601,8 @@ class CartaService:
                                                     id_carta=id_carta_objetivo,
                                                     ubicacion="descarte"
                                                     ).order_by(Carta.orden_descarte.desc()).first()
-            carta_objetivo.orden_descarte = self.ultimo_orden_descarte(id_partida) + 1
-            self._db.commit()
+            carta_objetivo.orden_descarte = reservar_orden_descarte(self._db, id_partida)[0]
+            self._db.flush()
             self._db.refresh(carta_objetivo)
         
             carta_evento_vuelve = self._db.query(Carta).filter_by(partida_id=id_partida,
@@ -691,7 +614,7 @@ class CartaService:
             carta_evento_vuelve.ubicacion = "mano"
             carta_evento_vuelve.bocaArriba = False
             carta_evento_vuelve.orden_descarte = None
-            self._db.commit()
+            self._db.flush()
             self._db.refresh(carta_evento_vuelve)
         
         else:
@@ -704,7 +627,7 @@ class CartaService:
             carta_objetivo.ubicacion = "mano"
             carta_objetivo.bocaArriba = False
             carta_objetivo.orden_descarte = None
-            self._db.commit()
+            self._db.flush()
             self._db.refresh(carta_objetivo)
 
     
@@ -716,11 +639,11 @@ class CartaService:
     
         if carta_jugada is None:
             return
-        if carta_jugada.nombre == "Delay the murderer's escape!":
+        if es_carta("Delay the murderer's escape!", carta_jugada.id_carta):
             carta_jugada.partida_id = 0
             carta_jugada.ubicacion = "eliminada"
             carta_jugada.jugador_id = 0
-            self._db.commit()
+            self._db.flush()
         else:
             self.descartar_cartas(id_jugador, [carta_jugada.id_carta])
             
@@ -728,44 +651,36 @@ class CartaService:
     def jugar_delay_the_murderer_escape(self, id_partida: int, id_jugador: int,cantidad: int):
     
         cartas = self.obtener_cartas_descarte(id_partida, cantidad) 
-        min_orden = self._db.query(func.min(Carta.orden_mazo)).filter_by(partida_id=id_partida, ubicacion="mazo_robo").scalar()
-        if min_orden is None:
-            min_orden = 0
-
-        for i, carta in enumerate(cartas, start=1):
-            carta.ubicacion = "mazo_robo"
-            carta.bocaArriba = False
-            carta.orden_mazo = min_orden - i
-
-        self._db.commit()
+        ordenes = reservar_orden_tope_mazo(self._db, id_partida, len(cartas))
+        mover_cartas(self._db, cartas, "mazo_robo",
+                     bocaArriba=False,
+                     orden_descarte=None,
+                     orden_mazo={carta.id: orden for carta, orden in zip(cartas, ordenes)})
 
 
     def robar_set(self, id_partida: int, id_jugador: int, id_objetivo: int, id_representacion_carta: int, ids_cartas: list[int]):
-        # Convertimos la lista de cartas a CSV para comparar correctamente
-        cartas_csv = ",".join(map(str, ids_cartas))
-        
-        
-        set_a_robar = (
+        # Candidatos por indice (partida, tipo, dueño); se compara la lista de cartas en memoria
+        candidatos = (
         self._db.query(SetJugado)
         .filter_by(
             partida_id=id_partida,
-            jugador_id=id_objetivo,
             representacion_id_carta=id_representacion_carta,
-            cartas_ids_csv=cartas_csv
+            jugador_id=id_objetivo,
         )
-        .first()
+        .all()
         )
+        set_a_robar = next((s for s in candidatos if s.cartas_ids == list(ids_cartas)), None)
 
         if not set_a_robar:
             raise ValueError("El set no existe o los parámetros son incorrectos.")
 
         set_a_robar.jugador_id = id_jugador
-        self._db.commit()
+        self._db.flush()
 
         carta_jugada = self._db.query(Carta).filter_by(partida_id=id_partida,
                                                           jugador_id=id_jugador, 
                                                           ubicacion="evento_jugado",
-                                                          nombre="Another Victim").first()
+                                                          id_carta=id_de("Another Victim")).first()
 
         self.descartar_cartas(id_jugador, [carta_jugada.id_carta])
  
@@ -773,9 +688,8 @@ class CartaService:
     def eliminar_carta(self, carta: Carta):
         try:
             self._db.delete(carta)
-            self._db.commit()
+            self._db.flush()
         except Exception as e:
-            self._db.rollback()
             raise ValueError(f"Error al eliminar la carta: {str(e)}")
         
 
@@ -791,33 +705,26 @@ class CartaService:
                 .all()
 
             if cartas_a_mover:
-                max_orden_descarte = self._db.query(func.max(Carta.orden_mazo))\
-                    .filter_by(partida_id=id_partida, ubicacion="descarte")\
-                    .scalar() or 0
-
-                for i, carta in enumerate(cartas_a_mover, start=1):
-                    carta.ubicacion = "descarte"
-                    carta.bocaArriba = True
-                    carta.orden_descarte = max_orden_descarte + i
+                self._mover_al_descarte(id_partida, cartas_a_mover, boca_arriba=True)
 
             carta_evento_jugada = self._db.query(Carta).filter_by(
                 partida_id=id_partida,
                 jugador_id=id_jugador,
                 ubicacion="evento_jugado",
-                nombre="Early train to paddington" 
+                id_carta=id_de("Early train to paddington"),
             ).first()
 
             if carta_evento_jugada:
                 carta_evento_jugada.ubicacion = "removida"
             
-            self._db.commit()
+            self._db.flush()
             
             
     def jugar_carta_instantanea(self, id_partida: int, id_jugador: int, id_carta_tipo: int) -> Carta:
         """
         Mueve una carta de la mano del jugador a "en_la_pila".
         """
-        carta = self.obtener_carta_de_mano(id_carta_tipo, id_jugador) 
+        carta = self.obtener_carta_de_mano(id_carta_tipo, id_jugador, id_partida)
         if not carta:
              raise ValueError("La carta no se encuentra en la mano del jugador.")
         if carta.partida_id != id_partida:
@@ -825,7 +732,7 @@ class CartaService:
              
         carta.ubicacion = "en_la_pila"
         carta.bocaArriba = True
-        self._db.commit()
+        self._db.flush()
         self._db.refresh(carta)
         return carta
 
@@ -837,18 +744,8 @@ class CartaService:
         if not ids_cartas_db:
             return
 
-        ultimo_orden = self.ultimo_orden_descarte(id_partida) 
         cartas = self._db.query(Carta).filter(Carta.id.in_(ids_cartas_db)).all()
-        
-        for i, carta in enumerate(cartas):
-            carta.ubicacion = "descarte" 
-            carta.jugador_id = 0
-            carta.orden_mazo = None
-            carta.bocaArriba = False
-            carta.orden_descarte = ultimo_orden + 1 + i
-            carta.partida_id = id_partida
-
-        self._db.commit()
+        self._mover_al_descarte(id_partida, cartas)
 
     
     def jugar_ariadne_oliver(self, id_partida:int, set_destino_id: int):
@@ -866,12 +763,9 @@ class CartaService:
             .first()
         )
 
-        ids_actuales = set_destino.cartas_ids_csv.split(",") if set_destino.cartas_ids_csv else []
-        ids_actuales.append(str(15))
-        set_destino.cartas_ids_csv = ",".join(ids_actuales)
-
-        self._db.add(set_destino)
-        self._db.commit()
+        set_destino.agregar_carta(15)
+        self._db.flush()
+        ids_actuales = [str(i) for i in set_destino.cartas_ids]
 
         return {
             "mensaje": "Ariadne Oliver jugada correctamente",
@@ -908,26 +802,28 @@ class CartaService:
         carta.ubicacion = "set_jugado" 
         self._db.add(carta)
 
-        nuevas_cartas_ids = set_jugado.cartas_ids_csv.split(',') if set_jugado.cartas_ids_csv else []
-        nuevas_cartas_ids.append(str(carta.id_carta)) 
-        set_jugado.cartas_ids_csv = ",".join(nuevas_cartas_ids)
-        self._db.add(set_jugado)
+        set_jugado.agregar_carta(carta.id_carta)
 
-        self._db.commit()
+        self._db.flush()
 
         return set_jugado
 
     def mover_carta_a_objetivo(self, id_carta, id_objetivo: int):
 
-        carta = self._db.query(Carta).filter(Carta.id == id_carta).first()
-
-        carta.jugador_id = id_objetivo
-        self._db.commit()
-        self._db.refresh(carta)
+        self.pasar_cartas({id_carta: id_objetivo})
 
         return {
             "mensaje": "carta enviada correctamente",
             "carta_actualizada": {
-                "jugador_id": carta.jugador_id
+                "jugador_id": id_objetivo
             }
-        }   
\ No newline at end of file
+        }
+
+
+    def pasar_cartas(self, pases: dict[int, int]):
+        """
+        Pasa cartas de mano en mano (Dead Card Folly, cartas Devious) con un
+        unico UPDATE. `pases` es id de carta -> id del jugador que la recibe.
+        """
+        cartas = [self._db.get(Carta, id_carta) for id_carta in pases]
+        mover_cartas(self._db, [c for c in cartas if c is not None], jugador_id=dict(pases))   
\ No newline at end of file
@@ -1,13 +1,16 @@
 from game.cartas.constants import cartasDict
+from game.cartas.catalogo import es_detective
 from game.cartas.models import Carta 
 from game.jugadores.models import Jugador 
 from game.jugadores.services import JugadorService
 from game.cartas.services import CartaService 
 from game.partidas.services import PartidaService
 from game.partidas.utils import determinar_desgracia_social
+from game.modelos.db import transaccional
 
 from fastapi import HTTPException, status
 
+@transaccional
 def jugar_set_detective(id_partida: int, id_jugador: int,set_destino_id: int, set_cartas: list[int], db) -> list[Carta]:
     """
     Valida y mueve a set_jugado exactamente las cartas seleccionadas por el jugador.
@@ -84,7 +87,7 @@ def jugar_set_detective(id_partida: int, id_jugador: int,set_destino_id: int, se
     for carta in set_id:
         cartas_por_id.append(CartaService(db).obtener_carta_por_id(carta))
 
-    if not all(carta.tipo == "Detective" for carta in cartas_por_id):
+    if not all(es_detective(carta.id_carta) for carta in cartas_por_id):
         raise HTTPException(status_code=400, detail="Todas las cartas deben ser del tipo Detective")
 
     #fin de la verificacion de que sean todos detectives ------------------------------
@@ -15,6 +15,9 @@ class Jugador(Base):
     nombre: Mapped[str] = mapped_column(String, nullable=False)
     fecha_nacimiento: Mapped[date] = mapped_column(Date, nullable=False)
     desgracia_social: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    # Secretos en mesa del jugador; se mantienen en cada flush (ver game.jugadores.secretos)
+    secretos_revelados: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    secretos_ocultos: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
  
     # Relación de 1 a muchos con Carta
     cartas: Mapped[List["Carta"]] = relationship("Carta", back_populates="jugador", cascade="all, delete-orphan")
@@ -0,0 +1,84 @@
+"""
+Cantidad de secretos revelados y ocultos de cada jugador.
+
+Jugador.secretos_revelados / secretos_ocultos se ajustan en el before_flush,
+en la misma transaccion en que un secreto se revela, se oculta o cambia de
+dueño (revelar_secreto, ocultar_secreto, robar_secreto, And then there was
+one more...). Con eso Jugador.desgracia_social queda siempre al dia (un
+jugador esta en desgracia social cuando no le queda ningun secreto oculto)
+y consultarlo es leer una columna, sin recorrer sus secretos ni escribir.
+
+Los secretos del reparto inicial entran con un INSERT masivo que no pasa
+por el flush: preparar_cartas_partida fija los contadores.
+"""
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from game.jugadores.models import Jugador
+from game.cartas.models import Carta
+from game.cartas.enums import TipoCarta
+
+_SEGUIDOS = ("jugador_id", "ubicacion", "bocaArriba")
+
+
+def _es_secreto(carta) -> bool:
+    # los objetos nuevos todavia tienen el string con el que se crearon ("Secreto", "secreto")
+    if carta.tipo is None:
+        return False
+    try:
+        return TipoCarta(carta.tipo) is TipoCarta.SECRETO
+    except ValueError:
+        return False
+
+
+def _aporte(jugador_id, ubicacion, boca_arriba):
+    """(jugador, contador) al que suma un secreto en ese estado, o None."""
+    if not jugador_id or ubicacion != "mesa":
+        return None
+    return jugador_id, "secretos_revelados" if boca_arriba else "secretos_ocultos"
+
+
+def _valor_anterior(estado, atributo):
+    historial = estado.attrs[atributo].history
+    if historial.deleted:
+        return historial.deleted[0]
+    if historial.unchanged:
+        return historial.unchanged[0]
+    return None if historial.added else estado.attrs[atributo].value
+
+
+def actualizar_desgracia(jugador: Jugador):
+    jugador.desgracia_social = (jugador.secretos_ocultos or 0) == 0
+
+
+@event.listens_for(Session, "before_flush")
+def _actualizar_secretos(session, flush_context, instances):
+    deltas = {}  # (id_jugador, contador) -> delta
+
+    for carta in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(carta, Carta) or not _es_secreto(carta):
+            continue
+        estado = inspect(carta)
+        ahora = _aporte(carta.jugador_id, carta.ubicacion, carta.bocaArriba)
+        if carta in session.new:
+            antes = None
+        elif carta in session.deleted:
+            antes, ahora = ahora, None
+        elif any(estado.attrs[a].history.has_changes() for a in _SEGUIDOS):
+            antes = _aporte(*(_valor_anterior(estado, a) for a in _SEGUIDOS))
+        else:
+            continue
+        if antes != ahora:
+            for clave, delta in ((antes, -1), (ahora, +1)):
+                if clave is not None:
+                    deltas[clave] = deltas.get(clave, 0) + delta
+
+    if not deltas:
+        return
+    nuevos = {j.id: j for j in session.new if isinstance(j, Jugador) and j.id is not None}
+    with session.no_autoflush:
+        for (id_jugador, contador), delta in deltas.items():
+            jugador = nuevos.get(id_jugador) or session.get(Jugador, id_jugador)
+            if jugador is None or jugador in session.deleted or not delta:
+                continue
+            setattr(jugador, contador, (getattr(jugador, contador) or 0) + delta)
+            actualizar_desgracia(jugador)
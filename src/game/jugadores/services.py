@@ -33,7 +33,6 @@ class JugadorService:
         )
         self._db.add(nuevo_jugador)
         self._db.flush()
-        self._db.commit()
         self._db.refresh(nuevo_jugador)
         return nuevo_jugador
     
@@ -62,7 +61,6 @@ class JugadorService:
         )
         self._db.add(nuevo_jugador)
         self._db.flush()
-        self._db.commit()
         self._db.refresh(nuevo_jugador)
         return nuevo_jugador
     
@@ -81,8 +79,8 @@ class JugadorService:
         Optional[Jugador]
             El jugador si se encuentra, o None si no existe.
         """
-        jugador = self._db.query(Jugador).filter(Jugador.id == id_jugador).first()
-        return jugador
+        # si ya esta en la sesion (p. ej. cargado por el contexto del request) no consulta
+        return self._db.get(Jugador, id_jugador)
 
 
     def eliminar_jugador(self, jugador: Jugador):
@@ -97,9 +95,8 @@ class JugadorService:
         """
         try:
             self._db.delete(jugador)
-            self._db.commit()
+            self._db.flush()
         except Exception as e:
-            self._db.rollback()
             raise ValueError(f"Error al eliminar el jugador: {str(e)}")
         
     def obtener_jugador_id_carta(self, partida: Partida, carta: Carta) -> int:
@@ -0,0 +1,153 @@
+"""
+Medicion de las sentencias SQL por request.
+
+crear_engine engancha before/after_cursor_execute al engine: cada sentencia
+suma a la MedicionConsultas activa en el contexto (la que abre el middleware
+de main.py para cada request HTTP) la cantidad y el tiempo en la base, y se
+guarda si esta entre las mas lentas. El middleware devuelve los totales en
+las cabeceras X-DB-Consultas / X-DB-Tiempo-Ms y loguea las huellas de las
+sentencias mas lentas cuando el request paso mas de DB_LOG_CONSULTAS_MS en
+la base. Las huellas se calculan recien ahi, no por cada sentencia.
+
+La huella de una sentencia es el SQL sin la lista de columnas ni los valores
+(las listas IN de cualquier largo quedan iguales): agrupa las sentencias que
+el ORM emite desde el mismo lugar.
+
+presupuesto_consultas es para los tests: falla si lo ejecutado en el bloque
+supera la cantidad de sentencias declarada.
+"""
+import contextvars
+import heapq
+import re
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+
+CABECERA_CONSULTAS = "X-DB-Consultas"
+CABECERA_TIEMPO = "X-DB-Tiempo-Ms"
+
+_LARGO_HUELLA = 200
+
+_COLUMNAS = re.compile(r"^SELECT\s.*?\sFROM\s", re.IGNORECASE | re.DOTALL)
+_TEXTOS = re.compile(r"'(?:[^']|'')*'")
+_NUMEROS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ESPACIOS = re.compile(r"\s+")
+
+
+def huella(sentencia: str) -> str:
+    """SQL normalizado: sin columnas del SELECT, sin valores y con las listas IN colapsadas."""
+    sql = _ESPACIOS.sub(" ", sentencia).strip()
+    sql = _COLUMNAS.sub("SELECT ... FROM ", sql, count=1)
+    sql = _TEXTOS.sub("?", sql)
+    sql = _NUMEROS.sub("?", sql)
+    sql = _LISTAS.sub("(...)", sql)
+    return sql[:_LARGO_HUELLA]
+
+
+class MedicionConsultas:
+    """
+    Cantidad de sentencias, tiempo total en la base y las mas lentas. Con
+    guardar_todas tambien guarda el SQL de cada sentencia (presupuesto).
+    """
+    def __init__(self, lentas: int = 3, guardar_todas: bool = False):
+        self._lock = threading.Lock()
+        self._cupo_lentas = lentas
+        self._lentas = []  # heap de (duracion, orden, sentencia)
+        self.cantidad = 0
+        self.tiempo = 0.0
+        self.sentencias = [] if guardar_todas else None
+
+    def registrar(self, sentencia: str, duracion: float):
+        with self._lock:
+            self.cantidad += 1
+            self.tiempo += duracion
+            if self.sentencias is not None:
+                self.sentencias.append(sentencia)
+            entrada = (duracion, self.cantidad, sentencia)
+            if len(self._lentas) < self._cupo_lentas:
+                heapq.heappush(self._lentas, entrada)
+            elif self._lentas and duracion > self._lentas[0][0]:
+                heapq.heapreplace(self._lentas, entrada)
+
+    @property
+    def tiempo_ms(self) -> float:
+        return round(self.tiempo * 1000, 3)
+
+    def mas_lentas(self) -> list[tuple[float, str]]:
+        """(milisegundos, huella) de las sentencias mas lentas, de mayor a menor."""
+        with self._lock:
+            lentas = sorted(self._lentas, reverse=True)
+        return [(round(duracion * 1000, 3), huella(sentencia)) for duracion, _, sentencia in lentas]
+
+
+_medicion_actual: contextvars.ContextVar[MedicionConsultas | None] = contextvars.ContextVar(
+    "medicion_consultas", default=None
+)
+
+# mediciones que ven todas las sentencias, sin importar el contexto (tests)
+_observadores: list[MedicionConsultas] = []
+_observadores_lock = threading.Lock()
+
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_consultas", []).append(time.perf_counter())
+
+
+def _despues(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("inicio_consultas")
+    if not inicios:
+        return
+    duracion = time.perf_counter() - inicios.pop()
+    medicion = _medicion_actual.get()
+    if medicion is not None:
+        medicion.registrar(statement, duracion)
+    if _observadores:
+        with _observadores_lock:
+            observadores = list(_observadores)
+        for observador in observadores:
+            observador.registrar(statement, duracion)
+
+
+def instrumentar_engine(engine):
+    """Engancha la medicion de sentencias al engine (una sola vez)."""
+    if not event.contains(engine, "before_cursor_execute", _antes):
+        event.listen(engine, "before_cursor_execute", _antes)
+        event.listen(engine, "after_cursor_execute", _despues)
+    return engine
+
+
+@contextmanager
+def medir_consultas(lentas: int = 3):
+    """Mide las sentencias que se ejecuten en este contexto (un request)."""
+    medicion = MedicionConsultas(lentas)
+    token = _medicion_actual.set(medicion)
+    try:
+        yield medicion
+    finally:
+        _medicion_actual.reset(token)
+
+
+@contextmanager
+def presupuesto_consultas(maximo: int, engine=None):
+    """
+    Falla (AssertionError) si en el bloque se ejecutan mas de `maximo`
+    sentencias. Cuenta todas las sentencias de los engines instrumentados,
+    tambien las que corren en otro hilo (TestClient, executor de la base).
+    """
+    if engine is not None:
+        instrumentar_engine(engine)
+    medicion = MedicionConsultas(lentas=0, guardar_todas=True)
+    with _observadores_lock:
+        _observadores.append(medicion)
+    try:
+        yield medicion
+    finally:
+        with _observadores_lock:
+            _observadores.remove(medicion)
+    if medicion.cantidad > maximo:
+        detalle = "\n".join(f"  {huella(s)}" for s in medicion.sentencias)
+        raise AssertionError(
+            f"Se ejecutaron {medicion.cantidad} sentencias (presupuesto: {maximo}):\n{detalle}"
+        )
@@ -1,26 +1,315 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import functools
+import inspect
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from sqlalchemy.orm.exc import StaleDataError
+from fastapi import HTTPException, status
+from sqlalchemy.pool import QueuePool
 from settings import settings
+from game.modelos.consultas import instrumentar_engine
+
+
+class EstadisticasPool:
+    """
+    Contadores de uso del pool de conexiones de un engine.
+    Sirven para dimensionar DB_POOL_SIZE / DB_MAX_OVERFLOW. Los eventos del
+    pool llegan desde varios hilos (executor de la base): todo se suma con el lock.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.conexiones_creadas = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    def registrar_conexion(self):
+        with self._lock:
+            self.conexiones_creadas += 1
+
+    def registrar_checkout(self):
+        with self._lock:
+            self.checkouts += 1
+
+    def registrar_checkin(self):
+        with self._lock:
+            self.checkins += 1
+
+    def registrar_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def registrar_espera(self, segundos: float):
+        with self._lock:
+            self.espera_total += segundos
+            if segundos > self.espera_max:
+                self.espera_max = segundos
+
+    def como_dict(self) -> dict:
+        with self._lock:
+            return {
+                "conexiones_creadas": self.conexiones_creadas,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "timeouts": self.timeouts,
+                "espera_total_s": round(self.espera_total, 6),
+                "espera_max_s": round(self.espera_max, 6),
+                "espera_promedio_s": round(self.espera_total / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mide cuanto espera cada checkout hasta obtener una conexion."""
+    estadisticas: EstadisticasPool = None
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if self.estadisticas is not None:
+                self.estadisticas.registrar_timeout()
+            raise
+        finally:
+            if self.estadisticas is not None:
+                self.estadisticas.registrar_espera(time.perf_counter() - inicio)
+
+    def recreate(self):
+        # engine.dispose() recrea el pool: conservamos los contadores
+        nuevo = super().recreate()
+        nuevo.estadisticas = self.estadisticas
+        return nuevo
+
+
+def _es_sqlite_en_memoria(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/") == "sqlite:")
+
+
+def crear_engine(url: str):
+    """
+    Crea un engine con su pool configurado desde settings y le engancha
+    los contadores de EstadisticasPool (accesibles en engine.pool.estadisticas)
+    y la medicion de sentencias por request (ver game.modelos.consultas).
+    """
+    kwargs = {}
+    if url.startswith("sqlite"):
+        kwargs["connect_args"] = {"check_same_thread": False}
+    # SQLite en memoria usa SingletonThreadPool, que no acepta estos parametros
+    if not _es_sqlite_en_memoria(url):
+        kwargs.update(
+            poolclass=PoolMedido,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    engine = create_engine(url, **kwargs)
+    instrumentar_engine(engine)
+
+    estadisticas = EstadisticasPool()
+    engine.pool.estadisticas = estadisticas
+
+    @event.listens_for(engine, "connect")
+    def _al_conectar(dbapi_connection, connection_record):
+        estadisticas.registrar_conexion()
+
+    @event.listens_for(engine, "checkout")
+    def _al_checkout(dbapi_connection, connection_record, connection_proxy):
+        estadisticas.registrar_checkout()
+
+    @event.listens_for(engine, "checkin")
+    def _al_checkin(dbapi_connection, connection_record):
+        estadisticas.registrar_checkin()
+
+    return engine
+
+
+_engine = None
+_SessionLocal = None
+_engine_lock = threading.Lock()
+
 
 def get_engine():
-    return create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+    """Devuelve el engine del proceso; se crea una sola vez."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = crear_engine(settings.DATABASE_URL)
+    return _engine
 
 def get_session_local(engine):
     return sessionmaker(autocommit = False, autoflush=False, bind=engine)
 
+def _get_session_factory():
+    global _SessionLocal
+    if _SessionLocal is None:
+        with _engine_lock:
+            if _SessionLocal is None:
+                _SessionLocal = get_session_local(get_engine())
+    return _SessionLocal
+
+
+def estadisticas_pool(engine=None) -> dict:
+    """
+    Devuelve el estado del pool (tamanio, conexiones en uso, overflow)
+    junto con los contadores de checkouts y tiempos de espera.
+    """
+    engine = engine or get_engine()
+    pool = engine.pool
+    datos = {"pool": type(pool).__name__, "estado": pool.status()}
+    if isinstance(pool, QueuePool):
+        datos.update(
+            tamanio=pool.size(),
+            en_uso=pool.checkedout(),
+            libres=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    estadisticas = getattr(pool, "estadisticas", None)
+    if estadisticas is not None:
+        datos.update(estadisticas.como_dict())
+    return datos
+
+
+def cache_de_sesion(db, nombre: str) -> dict:
+    """
+    Cache asociado a la sesion (una sesion = un request). Se vacia en cada
+    commit/rollback, asi que solo cubre lecturas repetidas dentro de una accion.
+    """
+    info = getattr(db, "info", None)
+    if not isinstance(info, dict):
+        return {}
+    return info.setdefault("cache", {}).setdefault(nombre, {})
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_soft_rollback")
+def _vaciar_cache_de_sesion(session, *args):
+    session.info.pop("cache", None)
+
+
+class ConflictoDeVersion(HTTPException):
+    """
+    Otra transaccion modifico la partida entre que se leyo y se confirmo la
+    accion (ver game.partidas.version). No se aplico nada: se puede reintentar.
+    """
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="La partida fue modificada por otra accion. Volver a intentar.",
+            headers={"Retry-After": "0"},
+        )
+
+
+class unidad_de_trabajo:
+    """
+    Agrupa todas las modificaciones de una accion en una unica transaccion.
+
+    Los servicios solo hacen flush(); el bloque mas externo hace commit al salir
+    sin errores o rollback si se propaga una excepcion. Los bloques anidados
+    (un util dentro de un endpoint, un servicio dentro de un util) no confirman.
+    Se puede usar con `with` o, desde un endpoint async, con `async with`
+    (el commit corre entonces por ejecutar_db).
+    """
+    def __init__(self, db):
+        self._db = db
+
+    def _entrar(self):
+        info = getattr(self._db, "info", None)
+        if isinstance(info, dict):
+            info["uow_profundidad"] = info.get("uow_profundidad", 0) + 1
+
+    def _salir(self) -> bool:
+        """Devuelve True si se cerro el bloque mas externo."""
+        info = getattr(self._db, "info", None)
+        if not isinstance(info, dict):
+            return True
+        info["uow_profundidad"] -= 1
+        return info["uow_profundidad"] == 0
+
+    def __enter__(self):
+        self._entrar()
+        return self._db
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._salir():
+            try:
+                if exc_type is None:
+                    self._db.commit()
+                else:
+                    self._db.rollback()
+            except StaleDataError as e:
+                self._db.rollback()
+                raise ConflictoDeVersion() from e
+        if exc_type is StaleDataError:
+            raise ConflictoDeVersion() from exc
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        from game.modelos.ejecucion import ejecutar_db
+        if self._salir():
+            try:
+                if exc_type is None:
+                    await ejecutar_db(self._db.commit)
+                else:
+                    await ejecutar_db(self._db.rollback)
+            except StaleDataError as e:
+                await ejecutar_db(self._db.rollback)
+                raise ConflictoDeVersion() from e
+        if exc_type is StaleDataError:
+            raise ConflictoDeVersion() from exc
+        return False
+
+
+def transaccional(func):
+    """
+    Decorador para funciones de utils que reciben la sesion como parametro `db`:
+    ejecuta la funcion dentro de una unidad_de_trabajo.
+    """
+    firma = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        db = firma.bind_partial(*args, **kwargs).arguments.get("db")
+        if db is None:
+            return func(*args, **kwargs)
+        with unidad_de_trabajo(db):
+            return func(*args, **kwargs)
+
+    return wrapper
+
 
 Base = declarative_base()
 
 from game.partidas.models import Partida
 from game.jugadores.models import Jugador
 from game.cartas.models import Carta
+# listeners de Session: fotos en memoria, contadores de pilas y de secretos y version optimista de las partidas
+import game.partidas.estado
+import game.partidas.pilas
+import game.jugadores.secretos
+import game.partidas.victoria
+import game.partidas.roles
+import game.partidas.version
 
 #Dependencia
 def get_db():
-    engine = get_engine()
-    SessionLocal = get_session_local(engine)
+    SessionLocal = _get_session_factory()
     db = SessionLocal()
     try:
         yield db
+        # Lo que haya quedado sin confirmar al terminar el request se confirma aca
+        if db.in_transaction():
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
@@ -0,0 +1,45 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from settings import settings
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Devuelve el executor de la base del proceso; se crea una sola vez."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.DB_THREADPOOL_WORKERS,
+                    thread_name_prefix="db",
+                )
+    return _executor
+
+
+def cerrar_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+async def ejecutar_db(func, *args, **kwargs):
+    """
+    Ejecuta una llamada sincronica a la base (servicio o util) desde un endpoint async.
+    Con DB_EXECUTION_MODE="threadpool" corre en el executor para no bloquear el
+    event loop; en modo "inline" se llama directamente.
+    """
+    if settings.DB_EXECUTION_MODE != "threadpool":
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    # run_in_executor no copia el contexto: sin esto la medicion del request no ve las sentencias
+    contexto = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(contexto.run, func, *args, **kwargs))
@@ -0,0 +1,208 @@
+"""
+Registro de metricas en memoria del proceso, expuesto en /metrics con el
+formato de texto de Prometheus (sin servicios externos).
+
+Tipos: Contador (solo sube), Medidor (valor actual, fijado a mano o leido de
+una fuente al exponer), Histograma (buckets acumulados, suma y cantidad) y
+PorMinuto (eventos de los ultimos 60 segundos, se expone como medidor).
+Las etiquetas se pasan por nombre: `latencia.observar(0.2, ruta="/partidas")`.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_DESTINATARIOS = (0, 1, 2, 3, 4, 5, 6, 8, 12)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _numero(valor: float) -> str:
+    if valor == math.inf:
+        return "+Inf"
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+def _etiquetas(nombres: tuple, valores: tuple, extra: dict = None) -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    pares += [f'{n}="{_escapar(v)}"' for n, v in (extra or {}).items()]
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._valores = {}
+
+    def _clave(self, etiquetas: dict) -> tuple:
+        if set(etiquetas) != set(self.etiquetas):
+            raise ValueError(f"{self.nombre} espera las etiquetas {self.etiquetas}")
+        return tuple(str(etiquetas[n]) for n in self.etiquetas)
+
+    def _muestras(self):
+        """(sufijo, valores de etiquetas, etiquetas extra, valor) de cada serie."""
+        with self._lock:
+            return [("", clave, None, valor) for clave, valor in sorted(self._valores.items())]
+
+    def exponer(self) -> list[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        for sufijo, clave, extra, valor in self._muestras():
+            lineas.append(f"{self.nombre}{sufijo}{_etiquetas(self.etiquetas, clave, extra)} {_numero(valor)}")
+        return lineas
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def incrementar(self, valor: float = 1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def valor(self, **etiquetas) -> float:
+        with self._lock:
+            return self._valores.get(self._clave(etiquetas), 0)
+
+
+class Medidor(_Metrica):
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._fuente = None
+
+    def fijar(self, valor: float, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = valor
+
+    def usar_fuente(self, fuente):
+        """
+        fuente() se llama al exponer y devuelve el valor (sin etiquetas) o un
+        dict {valores de etiquetas: valor}; reemplaza a los valores fijados.
+        """
+        self._fuente = fuente
+
+    def _muestras(self):
+        if self._fuente is None:
+            return super()._muestras()
+        valores = self._fuente()
+        if not isinstance(valores, dict):
+            valores = {(): valores}
+        return [("", tuple(str(v) for v in (clave if isinstance(clave, tuple) else (clave,))), None, valor)
+                for clave, valor in sorted(valores.items())]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), buckets: tuple = BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor: float, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._valores.get(clave)
+            if serie is None:
+                serie = self._valores[clave] = {"buckets": [0] * len(self.buckets), "suma": 0.0, "cantidad": 0}
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie["buckets"][i] += 1
+            serie["suma"] += valor
+            serie["cantidad"] += 1
+
+    def cantidad(self, **etiquetas) -> int:
+        with self._lock:
+            serie = self._valores.get(self._clave(etiquetas))
+            return serie["cantidad"] if serie else 0
+
+    def _muestras(self):
+        muestras = []
+        with self._lock:
+            for clave, serie in sorted(self._valores.items()):
+                for limite, acumulado in zip(self.buckets, serie["buckets"]):
+                    muestras.append(("_bucket", clave, {"le": _numero(limite)}, acumulado))
+                muestras.append(("_bucket", clave, {"le": "+Inf"}, serie["cantidad"]))
+                muestras.append(("_sum", clave, None, serie["suma"]))
+                muestras.append(("_count", clave, None, serie["cantidad"]))
+        return muestras
+
+
+class PorMinuto(_Metrica):
+    """Cantidad de eventos en los ultimos 60 segundos (sin etiquetas)."""
+    tipo = "gauge"
+    VENTANA = 60.0
+
+    def __init__(self, nombre: str, ayuda: str):
+        super().__init__(nombre, ayuda)
+        self._eventos = deque()
+
+    def registrar(self, ahora: float = None):
+        with self._lock:
+            self._eventos.append(time.monotonic() if ahora is None else ahora)
+
+    def valor(self, ahora: float = None) -> int:
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._lock:
+            while self._eventos and self._eventos[0] <= ahora - self.VENTANA:
+                self._eventos.popleft()
+            return len(self._eventos)
+
+    def _muestras(self):
+        return [("", (), None, self.valor())]
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metricas = {}
+
+    def _registrar(self, metrica: _Metrica) -> _Metrica:
+        with self._lock:
+            if metrica.nombre in self._metricas:
+                raise ValueError(f"La metrica {metrica.nombre} ya esta registrada")
+            self._metricas[metrica.nombre] = metrica
+        return metrica
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: tuple = ()) -> Contador:
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre: str, ayuda: str, etiquetas: tuple = ()) -> Medidor:
+        return self._registrar(Medidor(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: tuple = (), buckets: tuple = BUCKETS_LATENCIA) -> Histograma:
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def por_minuto(self, nombre: str, ayuda: str) -> PorMinuto:
+        return self._registrar(PorMinuto(nombre, ayuda))
+
+    def exponer(self) -> str:
+        """Todas las metricas en formato de texto de Prometheus."""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas = []
+        for metrica in metricas:
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+metricas = RegistroMetricas()
+
+# Requests HTTP, por plantilla de ruta (/partidas/{id_partida}, no /partidas/7)
+latencia_http = metricas.histograma(
+    "http_request_duration_seconds", "Latencia de los requests HTTP", ("metodo", "ruta"))
+tiempo_db_http = metricas.histograma(
+    "http_request_db_seconds", "Tiempo en la base por request HTTP", ("metodo", "ruta"))
+consultas_http = metricas.contador(
+    "http_request_db_statements_total", "Sentencias SQL ejecutadas por los requests HTTP", ("metodo", "ruta"))
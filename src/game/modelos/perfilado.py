@@ -0,0 +1,72 @@
+"""
+Perfilado de un request a pedido (cProfile).
+
+Con PERFILAR_REQUESTS activado, un request con la cabecera `X-Perfilar: 1`
+o el parametro `?perfilar=1` corre bajo cProfile y el resultado se guarda
+en DIRECTORIO_PERFILES como .pstats (se abre con `python -m pstats`,
+snakeviz o `speedscope` via pyprof2calltree). La respuesta trae el nombre
+del archivo en la cabecera X-Perfil.
+
+Si el setting esta apagado el middleware ni se instala: no cuesta nada.
+
+cProfile mide el hilo del event loop, asi que con DB_EXECUTION_MODE
+"threadpool" las consultas aparecen como espera en ejecutar_db; para ver
+el detalle de la base conviene perfilar en modo "inline". Tambien entra lo
+que otros requests ejecuten en el loop mientras tanto, por eso se perfila
+un request por vez.
+"""
+import cProfile
+import os
+import re
+import threading
+import time
+
+CABECERA_PERFILAR = "X-Perfilar"
+PARAMETRO_PERFILAR = "perfilar"
+CABECERA_PERFIL = "X-Perfil"
+
+_VALORES_SI = ("1", "true", "si")
+_perfilando = threading.Lock()
+
+
+def pide_perfil(request) -> bool:
+    valor = request.headers.get(CABECERA_PERFILAR) or request.query_params.get(PARAMETRO_PERFILAR)
+    return valor is not None and valor.lower() in _VALORES_SI
+
+
+def nombre_de_perfil(metodo: str, ruta: str) -> str:
+    """20250101-120000-123-GET-partidas-id_partida.pstats"""
+    ahora = time.time()
+    marca = time.strftime("%Y%m%d-%H%M%S", time.localtime(ahora)) + f"-{int(ahora * 1000) % 1000:03d}"
+    slug = re.sub(r"[^A-Za-z0-9_]+", "-", ruta).strip("-") or "raiz"
+    return f"{marca}-{metodo}-{slug}.pstats"
+
+
+def instalar_perfilado(app, directorio: str):
+    """Agrega a la app el middleware que perfila los requests que lo piden."""
+
+    @app.middleware("http")
+    async def perfilar_request(request, call_next):
+        if not pide_perfil(request):
+            return await call_next(request)
+        if not _perfilando.acquire(blocking=False):
+            response = await call_next(request)
+            response.headers[CABECERA_PERFIL] = "ocupado"
+            return response
+        try:
+            perfil = cProfile.Profile()
+            perfil.enable()
+            try:
+                response = await call_next(request)
+            finally:
+                perfil.disable()
+            ruta = getattr(request.scope.get("route"), "path", request.url.path)
+            os.makedirs(directorio, exist_ok=True)
+            nombre = nombre_de_perfil(request.method, ruta)
+            perfil.dump_stats(os.path.join(directorio, nombre))
+        finally:
+            _perfilando.release()
+        response.headers[CABECERA_PERFIL] = nombre
+        return response
+
+    return perfilar_request
@@ -0,0 +1,136 @@
+"""
+Trazas de punta a punta: del request HTTP que hace una accion a cada
+mensaje de websocket que la avisa.
+
+El middleware de main.py abre una Traza por request (respeta X-Trace-Id si
+viene en el pedido y lo devuelve en la respuesta). ConnectionManager agrega
+el id como campo "traza" a los eventos que difunde o envia mientras la
+traza esta activa y registra el envio a cada destinatario: cuanto tardo el
+send_text y cuanto paso desde que llego el request.
+
+Los tramos quedan por partida en RegistroTrazas (acotado en partidas y en
+eventos por partida) y se exportan en el formato de eventos de Chrome
+(chrome://tracing, Perfetto): un proceso por partida, un hilo "http" para
+los requests y uno por jugador para las entregas.
+"""
+import contextvars
+import json
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from game.modelos.metricas import metricas
+
+CABECERA_TRAZA = "X-Trace-Id"
+
+MAX_PARTIDAS = 200
+MAX_EVENTOS_POR_PARTIDA = 5000
+
+_ID_VALIDO = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+entrega_ws = metricas.histograma(
+    "ws_entrega_seconds", "Tiempo desde que llega el request hasta que se entrega cada mensaje de websocket",
+    ("tipo",))
+
+
+def ahora_us() -> int:
+    """Marca de tiempo (microsegundos) en la misma base que los tramos."""
+    return time.perf_counter_ns() // 1000
+
+
+class Traza:
+    __slots__ = ("id", "inicio_us")
+
+    def __init__(self, id_traza: str = None):
+        # un id recibido del cliente se respeta solo si es razonable
+        self.id = id_traza if id_traza and _ID_VALIDO.match(id_traza) else uuid.uuid4().hex[:16]
+        self.inicio_us = ahora_us()
+
+
+_traza_actual: contextvars.ContextVar[Traza | None] = contextvars.ContextVar("traza", default=None)
+
+
+def traza_actual() -> Traza | None:
+    return _traza_actual.get()
+
+
+def iniciar_traza(id_traza: str = None):
+    """Abre una traza en el contexto actual; devuelve (traza, token para cerrarla)."""
+    traza = Traza(id_traza)
+    return traza, _traza_actual.set(traza)
+
+
+def cerrar_traza(token):
+    _traza_actual.reset(token)
+
+
+def agregar_traza(mensaje: str) -> str:
+    """Agrega "traza" a un evento JSON si hay una traza activa (y no la trae ya)."""
+    traza = _traza_actual.get()
+    if traza is None:
+        return mensaje
+    try:
+        evento = json.loads(mensaje)
+    except (TypeError, ValueError):
+        return mensaje
+    if not isinstance(evento, dict) or "traza" in evento:
+        return mensaje
+    evento["traza"] = traza.id
+    return json.dumps(evento)
+
+
+class RegistroTrazas:
+    """Tramos por partida, en el formato de eventos de Chrome."""
+    def __init__(self, max_partidas: int = MAX_PARTIDAS, max_eventos: int = MAX_EVENTOS_POR_PARTIDA):
+        self._lock = threading.Lock()
+        self._max_partidas = max_partidas
+        self._max_eventos = max_eventos
+        self._por_partida: OrderedDict[int, deque] = OrderedDict()
+
+    def _agregar(self, id_partida: int, evento: dict):
+        with self._lock:
+            eventos = self._por_partida.get(id_partida)
+            if eventos is None:
+                eventos = self._por_partida[id_partida] = deque(maxlen=self._max_eventos)
+                while len(self._por_partida) > self._max_partidas:
+                    self._por_partida.popitem(last=False)
+            else:
+                self._por_partida.move_to_end(id_partida)
+            eventos.append(evento)
+
+    def registrar_request(self, id_partida: int, traza: Traza, metodo: str, ruta: str, estado: int):
+        self._agregar(id_partida, {
+            "name": f"{metodo} {ruta}", "cat": "http", "ph": "X",
+            "ts": traza.inicio_us, "dur": ahora_us() - traza.inicio_us,
+            "pid": id_partida, "tid": "http",
+            "args": {"traza": traza.id, "estado": estado},
+        })
+
+    def registrar_entrega(self, id_partida: int, id_jugador, tipo: str, inicio_us: int):
+        """Un send_text a un destinatario; usa la traza activa (no hace nada sin traza)."""
+        traza = _traza_actual.get()
+        if traza is None:
+            return
+        fin = ahora_us()
+        desde_request = (fin - traza.inicio_us) / 1_000_000
+        entrega_ws.observar(desde_request, tipo=tipo)
+        self._agregar(id_partida, {
+            "name": f"ws {tipo}", "cat": "ws", "ph": "X",
+            "ts": inicio_us, "dur": fin - inicio_us,
+            "pid": id_partida, "tid": f"jugador-{id_jugador}" if id_jugador is not None else "ws",
+            "args": {"traza": traza.id, "desde_request_ms": round(desde_request * 1000, 3)},
+        })
+
+    def exportar(self, id_partida: int) -> dict:
+        """Trazas de la partida como JSON de eventos de Chrome."""
+        with self._lock:
+            eventos = list(self._por_partida.get(id_partida, ()))
+        return {"traceEvents": eventos, "displayTimeUnit": "ms"}
+
+    def descartar(self, id_partida: int):
+        with self._lock:
+            self._por_partida.pop(id_partida, None)
+
+
+registro_trazas = RegistroTrazas()
@@ -0,0 +1,126 @@
+"""
+Vigilancia del event loop: detecta llamadas que lo bloquean.
+
+Los endpoints async que llaman a la base sin pasar por ejecutar_db (o que
+hacen un time.sleep) frenan a todas las partidas. VigilanteEventLoop tiene
+dos partes:
+
+- una tarea en el loop que cada LOOP_LAG_INTERVALO duerme y mide cuanto
+  tarde la despertaron (el lag), lo exporta en event_loop_lag_seconds y
+  deja un latido;
+- un hilo que, si el latido tiene mas de LOOP_LAG_UMBRAL, captura la pila
+  del hilo del loop (lo que esta bloqueando en ese momento), la loguea con
+  la ruta del endpoint que aparece en la pila y suma en
+  event_loop_bloqueos_total{ruta}. Se reporta una vez por bloqueo.
+"""
+import asyncio
+import inspect
+import logging
+import sys
+import threading
+import time
+import traceback
+from game.modelos.metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+lag_event_loop = metricas.histograma(
+    "event_loop_lag_seconds", "Demora del event loop en atender una tarea que deberia despertar",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+bloqueos_event_loop = metricas.contador(
+    "event_loop_bloqueos_total", "Veces que el event loop estuvo bloqueado mas que el umbral", ("ruta",))
+
+RUTA_DESCONOCIDA = "desconocida"
+
+
+def rutas_por_codigo(app) -> dict:
+    """{codigo de la funcion del endpoint: "METODO /plantilla"} de las rutas de la app."""
+    rutas = {}
+    for ruta in app.routes:
+        endpoint = getattr(ruta, "endpoint", None)
+        if endpoint is None:
+            continue
+        metodos = ",".join(sorted(getattr(ruta, "methods", None) or ())) or "WS"
+        codigo = getattr(inspect.unwrap(endpoint), "__code__", None)
+        if codigo is not None:
+            rutas[codigo] = f"{metodos} {ruta.path}"
+    return rutas
+
+
+class VigilanteEventLoop:
+    def __init__(self, intervalo: float, umbral: float, rutas: dict = None):
+        self.intervalo = intervalo
+        self.umbral = umbral
+        self.rutas = rutas or {}
+        self.lag_max = 0.0
+        self.bloqueos = 0
+        self._ultimo_latido = time.monotonic()
+        self._reportado = False
+        self._id_hilo_loop = None
+        self._tarea = None
+        self._hilo = None
+        self._detener = threading.Event()
+
+    def iniciar(self):
+        """Arranca la tarea en el loop actual y el hilo vigilante."""
+        self._id_hilo_loop = threading.get_ident()
+        self._ultimo_latido = time.monotonic()
+        self._detener.clear()
+        self._tarea = asyncio.get_running_loop().create_task(self._latir())
+        self._hilo = threading.Thread(target=self._vigilar, name="vigilante-event-loop", daemon=True)
+        self._hilo.start()
+
+    async def detener(self):
+        self._detener.set()
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        if self._hilo is not None:
+            self._hilo.join(timeout=self.intervalo * 2)
+            self._hilo = None
+
+    async def _latir(self):
+        while True:
+            inicio = time.perf_counter()
+            await asyncio.sleep(self.intervalo)
+            lag = max(0.0, time.perf_counter() - inicio - self.intervalo)
+            lag_event_loop.observar(lag)
+            self.lag_max = max(self.lag_max, lag)
+            if lag >= self.umbral:
+                logger.warning("EVENT LOOP: estuvo bloqueado %.3fs", lag)
+            self._ultimo_latido = time.monotonic()
+            self._reportado = False
+
+    def _vigilar(self):
+        while not self._detener.wait(self.intervalo):
+            if self._reportado or time.monotonic() - self._ultimo_latido < self.umbral + self.intervalo:
+                continue
+            self._reportado = True
+            self.revisar_bloqueo()
+
+    def revisar_bloqueo(self) -> tuple[str, str] | None:
+        """Captura la pila del hilo del loop; devuelve (ruta, pila) y lo registra."""
+        frame = sys._current_frames().get(self._id_hilo_loop)
+        if frame is None:
+            return None
+        pila = traceback.extract_stack(frame)
+        ruta = self._ruta_en_pila(frame)
+        self.bloqueos += 1
+        bloqueos_event_loop.incrementar(ruta=ruta)
+        logger.warning(
+            "EVENT LOOP: bloqueado hace mas de %.3fs en %s\n%s",
+            self.umbral, ruta, "".join(traceback.format_list(pila[-15:])),
+        )
+        return ruta, pila
+
+    def _ruta_en_pila(self, frame) -> str:
+        while frame is not None:
+            ruta = self.rutas.get(frame.f_code)
+            if ruta is not None:
+                return ruta
+            frame = frame.f_back
+        return RUTA_DESCONOCIDA
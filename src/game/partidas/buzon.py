@@ -0,0 +1,212 @@
+"""
+Buzon por partida: serializa las acciones que modifican una misma partida.
+
+SQLite ignora SELECT ... FOR UPDATE, asi que dos Not So Fast, dos votos o un
+resolver-accion concurrentes sobre la misma partida podian intercalarse. Cada
+request que modifica una partida entra al buzon de esa partida y espera su
+turno: se atienden de a uno y en orden de llegada, mientras que partidas
+distintas siguen corriendo en paralelo.
+
+Una accion que tiene que esperar (la ventana para responder con un Not So
+Fast) lo hace con pausa_fuera_del_buzon: suelta el turno y despues vuelve
+a la cola, asi la espera no frena a las demas acciones de la partida.
+
+Cada request corre en su propia tarea (conserva su contexto) pero solo
+cuando le toca. Los buzones son por event loop, porque las primitivas de
+asyncio quedan atadas al loop en el que se usan por primera vez.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+from collections import deque
+from weakref import WeakKeyDictionary
+
+logger = logging.getLogger(__name__)
+
+# Avisar en el log si una accion espera mas que esto para entrar (segundos)
+ESPERA_LENTA = 1.0
+
+
+class BuzonPartida:
+    """Cola FIFO de acciones de una partida; atiende una por vez."""
+
+    def __init__(self, id_partida: int):
+        self.id_partida = id_partida
+        self.terminada = False
+        self._en_curso = False
+        self._esperando: deque[asyncio.Future] = deque()
+        self.atendidas = 0
+        self.profundidad_max = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    @property
+    def profundidad(self) -> int:
+        """Acciones en curso o esperando."""
+        return len(self._esperando) + (1 if self._en_curso else 0)
+
+    async def entrar(self):
+        inicio = time.perf_counter()
+        if self._en_curso or self._esperando:
+            turno = asyncio.get_running_loop().create_future()
+            self._esperando.append(turno)
+            self.profundidad_max = max(self.profundidad_max, self.profundidad)
+            try:
+                await turno
+            except asyncio.CancelledError:
+                if turno in self._esperando:
+                    self._esperando.remove(turno)
+                elif turno.done() and not turno.cancelled():
+                    # ya nos habian pasado el turno: se lo damos al siguiente
+                    self._pasar_turno()
+                raise
+        else:
+            self._en_curso = True
+            self.profundidad_max = max(self.profundidad_max, 1)
+
+        espera = time.perf_counter() - inicio
+        self.espera_total += espera
+        self.espera_max = max(self.espera_max, espera)
+        if espera >= ESPERA_LENTA:
+            logger.warning("BUZON: partida=%s espero %.3fs (en cola=%s)", self.id_partida, espera, len(self._esperando))
+
+    def salir(self):
+        self.atendidas += 1
+        self._pasar_turno()
+
+    def _pasar_turno(self):
+        # el siguiente hereda _en_curso=True
+        while self._esperando:
+            turno = self._esperando.popleft()
+            if not turno.done():
+                turno.set_result(None)
+                return
+        self._en_curso = False
+
+    def como_dict(self) -> dict:
+        return {
+            "en_cola": self.profundidad,
+            "en_cola_max": self.profundidad_max,
+            "atendidas": self.atendidas,
+            "espera_total_s": round(self.espera_total, 6),
+            "espera_max_s": round(self.espera_max, 6),
+            "espera_promedio_s": round(self.espera_total / self.atendidas, 6) if self.atendidas else 0.0,
+        }
+
+
+class RegistroBuzones:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_loop = WeakKeyDictionary()
+
+    def buzon(self, id_partida: int) -> BuzonPartida:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            buzones = self._por_loop.setdefault(loop, {})
+            buzon = buzones.get(id_partida)
+            if buzon is None:
+                buzon = buzones[id_partida] = BuzonPartida(id_partida)
+            return buzon
+
+    def descartar(self, id_partida: int):
+        """
+        Olvida el buzon de una partida terminada. Si todavia tiene acciones
+        pendientes (por ejemplo la que termino la partida) se olvida al vaciarse.
+        """
+        with self._lock:
+            for buzones in self._por_loop.values():
+                buzon = buzones.get(id_partida)
+                if buzon is not None:
+                    buzon.terminada = True
+                    if buzon.profundidad == 0:
+                        del buzones[id_partida]
+
+    def liberar(self, buzon: BuzonPartida):
+        if not (buzon.terminada and buzon.profundidad == 0):
+            return
+        with self._lock:
+            for buzones in self._por_loop.values():
+                if buzones.get(buzon.id_partida) is buzon:
+                    del buzones[buzon.id_partida]
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            salida = {}
+            for buzones in self._por_loop.values():
+                for id_partida, buzon in buzones.items():
+                    salida[id_partida] = buzon.como_dict()
+            return salida
+
+
+registro_buzones = RegistroBuzones()
+
+
+class en_buzon:
+    """`async with en_buzon(id_partida):` ejecuta el bloque cuando le toca a la partida."""
+
+    def __init__(self, id_partida: int):
+        self._id_partida = id_partida
+        self._buzon = None
+        self._dentro = False
+        self._token = None
+
+    async def __aenter__(self):
+        self._buzon = registro_buzones.buzon(self._id_partida)
+        await self._buzon.entrar()
+        self._dentro = True
+        self._token = _en_buzon_actual.set(self)
+        return self._buzon
+
+    async def __aexit__(self, exc_type, exc, tb):
+        _en_buzon_actual.reset(self._token)
+        if self._dentro:
+            self._buzon.salir()
+        registro_buzones.liberar(self._buzon)
+        return False
+
+    async def pausa(self, segundos: float):
+        """Suelta el turno mientras espera y despues vuelve a la cola."""
+        self._buzon.salir()
+        self._dentro = False
+        try:
+            await asyncio.sleep(segundos)
+        finally:
+            await self._buzon.entrar()
+            self._dentro = True
+
+
+_en_buzon_actual: contextvars.ContextVar[en_buzon | None] = contextvars.ContextVar("en_buzon", default=None)
+
+
+async def pausa_fuera_del_buzon(segundos: float):
+    """
+    Espera sin retener el buzon de la partida: mientras tanto se atienden las
+    demas acciones (por ejemplo un Not So Fast). Fuera de un buzon es un sleep.
+    """
+    actual = _en_buzon_actual.get()
+    if actual is None:
+        await asyncio.sleep(segundos)
+    else:
+        await actual.pausa(segundos)
+
+
+def serializar_por_partida(endpoint):
+    """
+    Decorador para endpoints async que modifican una partida: toma el
+    parametro `id_partida` y corre el endpoint dentro del buzon de esa partida.
+    """
+    firma = inspect.signature(endpoint)
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        id_partida = firma.bind_partial(*args, **kwargs).arguments.get("id_partida")
+        if id_partida is None:
+            return await endpoint(*args, **kwargs)
+        async with en_buzon(id_partida):
+            return await endpoint(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,124 @@
+"""
+Contexto de partida por request y perfiles de carga.
+
+Las validaciones de una accion (jugar_carta_evento, validar_accion_evento,
+jugar_not_so_fast, iniciar_accion_cancelable, verif_send_card,
+enviar_mensaje) consultan la partida, el jugador, el objetivo, la mano, los
+secretos y si ya se jugo un evento en el turno. cargar_contexto trae todo eso
+de una vez con carga ansiosa y lo deja en la sesion (una sesion = un request):
+los servicios (PartidaService.obtener_por_id, JugadorService.obtener_jugador,
+CartaService.obtener_mano_jugador...) responden desde el contexto en lugar de
+volver a consultar.
+
+El contexto es una foto del momento en que se cargo. Vale mientras la sesion
+no tenga cambios propios (igual que el estado en memoria, ver
+game.partidas.estado) y se descarta en cada commit o rollback.
+
+Perfiles de carga sobre Partida:
+    LOBBY     partida y jugadores (sala de espera, listar jugadores)
+    EN_JUEGO  partida, jugadores y las cartas de cada jugador (mano, secretos,
+              evento jugado): dos consultas
+    CIERRE    partida, jugadores y todas las cartas de la partida (archivar y
+              eliminar una partida terminada)
+"""
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from game.modelos.db import cache_de_sesion
+from game.partidas.models import Partida
+from game.partidas.estado import _tiene_cambios
+from game.jugadores.models import Jugador
+from game.cartas.models import Carta
+
+LOBBY = "lobby"
+EN_JUEGO = "en_juego"
+CIERRE = "cierre"
+
+PERFILES = {
+    LOBBY: (selectinload(Partida.jugadores),),
+    EN_JUEGO: (joinedload(Partida.jugadores).selectinload(Jugador.cartas),),
+    CIERRE: (selectinload(Partida.jugadores), selectinload(Partida.cartas)),
+}
+
+
+def opciones_de_carga(perfil: str | None) -> tuple:
+    """Opciones de carga del perfil (ninguna si perfil es None)."""
+    if perfil is None:
+        return ()
+    return PERFILES[perfil]
+
+
+class ContextoPartida:
+    """Partida, jugadores y cartas de los jugadores cargados para un request."""
+    __slots__ = ("partida", "jugadores", "perfil")
+
+    def __init__(self, partida: Partida, perfil: str):
+        self.partida = partida
+        self.jugadores = {jugador.id: jugador for jugador in partida.jugadores}
+        self.perfil = perfil
+
+    @property
+    def con_cartas(self) -> bool:
+        return self.perfil == EN_JUEGO
+
+    def jugador(self, id_jugador: int) -> Jugador | None:
+        return self.jugadores.get(id_jugador)
+
+    def _cartas(self, id_jugador: int, ubicacion: str) -> list[Carta]:
+        jugador = self.jugadores.get(id_jugador)
+        if jugador is None:
+            return []
+        return [c for c in jugador.cartas if c.ubicacion == ubicacion and c.partida_id == self.partida.id]
+
+    def mano(self, id_jugador: int) -> list[Carta]:
+        return self._cartas(id_jugador, "mano")
+
+    def secretos(self, id_jugador: int) -> list[Carta]:
+        return self._cartas(id_jugador, "mesa")
+
+    def carta_de_mano(self, id_jugador: int, id_carta: int) -> Carta | None:
+        return next((c for c in self.mano(id_jugador) if c.id_carta == id_carta), None)
+
+    def evento_jugado(self, id_jugador: int) -> bool:
+        return bool(self._cartas(id_jugador, "evento_jugado"))
+
+
+def cargar_contexto(db, id_partida: int, perfil: str = EN_JUEGO) -> ContextoPartida | None:
+    """
+    Carga (una vez por request) la partida con el perfil LOBBY o EN_JUEGO y la
+    deja disponible para los servicios. None si la partida no existe, si la
+    sesion ya tiene cambios propios o si db no es una sesion (tests con la
+    base simulada).
+    """
+    if not isinstance(db, Session) or _tiene_cambios(db):
+        return None
+    contextos = cache_de_sesion(db, "contexto_partida")
+    contexto = contextos.get(id_partida)
+    if id_partida in contextos and (contexto is None or contexto.con_cartas or perfil == LOBBY):
+        return contexto
+    partida = db.execute(
+        select(Partida).where(Partida.id == id_partida).options(*PERFILES[perfil])
+        # sin cambios pendientes: refrescar lo que ya estaba en la sesion es seguro
+        .execution_options(populate_existing=True)
+    ).unique().scalar_one_or_none()
+    contextos[id_partida] = contexto = ContextoPartida(partida, perfil) if partida is not None else None
+    return contexto
+
+
+def contexto_vigente(db, id_partida: int = None, id_jugador: int = None) -> ContextoPartida | None:
+    """
+    Contexto con las cartas de los jugadores ya cargado en la sesion que sigue
+    valiendo (la sesion no escribio nada desde entonces), por partida o por
+    jugador. No consulta la base.
+    """
+    if not isinstance(db, Session) or _tiene_cambios(db):
+        return None
+    contextos = db.info.get("cache", {}).get("contexto_partida")
+    if not contextos:
+        return None
+    if id_partida is not None:
+        contexto = contextos.get(id_partida)
+        return contexto if contexto is not None and contexto.con_cartas else None
+    for contexto in contextos.values():
+        if contexto is not None and contexto.con_cartas and id_jugador in contexto.jugadores:
+            return contexto
+    return None
@@ -11,10 +11,17 @@ from game.partidas.schemas import *
 #from game.partidas.services import PartidaService
 from game.jugadores.models import Jugador
 from game.cartas.models import Carta
+from game.cartas.catalogo import es_comodin, id_de
 from game.jugadores.schemas import JugadorData, JugadorResponse, JugadorOut
 #from game.jugadores.services import JugadorService
 #from game.cartas.services import CartaService
-from game.modelos.db import get_db
+from game.modelos.db import get_db, unidad_de_trabajo, ConflictoDeVersion
+from game.partidas.version import agregar_version
+from game.partidas.victoria import mensaje_fin_partida
+from game.modelos.ejecucion import ejecutar_db
+from game.modelos.metricas import metricas, BUCKETS_DESTINATARIOS
+from game.modelos.trazas import agregar_traza, ahora_us, registro_trazas
+from game.partidas.buzon import serializar_por_partida, registro_buzones, pausa_fuera_del_buzon
 from game.partidas.utils import *
 from game.cartas.utils import *
 import game.partidas.utils as partidas_utils
@@ -25,20 +32,35 @@ import json
 import traceback
 #from game.partidas.utils import *
 import logging
-from time import sleep
 from fastapi import Request
 
 import asyncio
+import time
 
 
 partidas_router = APIRouter()
 logger = logging.getLogger(__name__)
 
+conexiones_ws = metricas.medidor(
+    "ws_conexiones_activas", "Websockets conectados por partida", ("partida",))
+destinatarios_broadcast = metricas.histograma(
+    "ws_broadcast_destinatarios", "Conexiones a las que se envia cada broadcast", buckets=BUCKETS_DESTINATARIOS)
+latencia_broadcast = metricas.histograma(
+    "ws_broadcast_duration_seconds", "Tiempo en enviar un broadcast a todas las conexiones de la partida")
+partidas_en_curso = metricas.medidor("partidas_en_curso", "Partidas iniciadas que todavia no terminaron")
+partidas_iniciadas = metricas.contador("partidas_iniciadas_total", "Partidas iniciadas desde que arranco el proceso")
+partidas_iniciadas_minuto = metricas.por_minuto("partidas_iniciadas_ultimo_minuto", "Partidas iniciadas en el ultimo minuto")
+partidas_terminadas = metricas.contador("partidas_terminadas_total", "Partidas terminadas desde que arranco el proceso")
+partidas_terminadas_minuto = metricas.por_minuto("partidas_terminadas_ultimo_minuto", "Partidas terminadas en el ultimo minuto")
+
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: dict[int, list[WebSocket]] = defaultdict(list)
         self.active_connections_personal: dict[int, list[WebSocket]] = defaultdict(list)
+        # para atribuir cada entrega a un jugador y una partida en las trazas
+        self.jugador_de_conexion: dict[WebSocket, int] = {}
+        self.partida_de_jugador: dict[int, int] = {}
         self.lock = asyncio.Lock()
 
     async def connect(self, websocket: WebSocket, id_partida: int, id_jugador: int):
@@ -50,6 +72,8 @@ class ConnectionManager:
         
         if websocket not in self.active_connections_personal[id_jugador]:
             self.active_connections_personal[id_jugador].append(websocket)
+        self.jugador_de_conexion[websocket] = id_jugador
+        self.partida_de_jugador[id_jugador] = id_partida
     
     async def disconnect(self, websocket: WebSocket, id_partida: int, id_jugador: int):
         async with self.lock:
@@ -59,27 +83,45 @@ class ConnectionManager:
             if id_jugador in self.active_connections_personal:
                 if websocket in self.active_connections_personal[id_jugador]:
                     self.active_connections_personal[id_jugador].remove(websocket)
+            self.jugador_de_conexion.pop(websocket, None)
                     
             if not self.active_connections_personal[id_jugador]:
                 del self.active_connections_personal[id_jugador]
+                self.partida_de_jugador.pop(id_jugador, None)
+
+    def conexiones_por_partida(self) -> dict[int, int]:
+        return {id_partida: len(conexiones) for id_partida, conexiones in self.active_connections.items()}
 
     async def broadcast(self, id_partida: int, message: str):
+        message = agregar_traza(agregar_version(id_partida, message))
         logger.debug("WS broadcast partida=%s payload=%s", id_partida, message)
-        for connection in list(self.active_connections[id_partida]):
+        conexiones = list(self.active_connections[id_partida])
+        inicio = time.perf_counter()
+        for connection in conexiones:
             try:
+                inicio_envio = ahora_us()
                 await connection.send_text(message)
+                registro_trazas.registrar_entrega(
+                    id_partida, self.jugador_de_conexion.get(connection), "broadcast", inicio_envio)
             except WebSocketDisconnect:
                 self.active_connections[id_partida].remove(connection)
             except Exception as e:
                 logger.exception("WS broadcast error: %s", e)
                 continue
+        latencia_broadcast.observar(time.perf_counter() - inicio)
+        destinatarios_broadcast.observar(len(conexiones))
     
     async def send_personal_message(self, id_jugador: int, message: str):
+        message = agregar_traza(message)
         websockets = self.active_connections_personal.get(id_jugador, [])
+        id_partida = self.partida_de_jugador.get(id_jugador)
         for websocket in websockets:
             try:
                 logger.debug("WS personal jugador=%s payload=%s", id_jugador, message)
+                inicio_envio = ahora_us()
                 await websocket.send_text(message)
+                if id_partida is not None:
+                    registro_trazas.registrar_entrega(id_partida, id_jugador, "personal", inicio_envio)
             except Exception as e:
                 logger.warning("Error enviando WS a jugador %s: %s", id_jugador, e)
 
@@ -94,6 +136,10 @@ class ConnectionManager:
                     except Exception as e:
                         print(f"[manager] websocket ya cerrado o error: {ws}, {e}")
             conexiones = self.active_connections.pop(id_partida, [])
+            registro_buzones.descartar(id_partida)
+            registro_trazas.descartar(id_partida)
+            for ws in conexiones:
+                self.jugador_de_conexion.pop(ws, None)
 
             jugadores_a_borrar = []
             for id_jugador, websockets in list(self.active_connections_personal.items()):
@@ -102,16 +148,37 @@ class ConnectionManager:
 
             for id_jugador in jugadores_a_borrar:
                 del self.active_connections_personal[id_jugador]
+                self.partida_de_jugador.pop(id_jugador, None)
 
             logger.info(f"Limpieza WS completa de partida {id_partida} ({len(conexiones)} sockets cerrados)")
     
 
 manager = ConnectionManager()
+conexiones_ws.usar_fuente(manager.conexiones_por_partida)
     
 def get_manager():
     return manager
 
 
+async def terminar_si_corresponde(id_partida: int, db, conexiones=None) -> bool:
+    """
+    Evalua una sola vez, con la accion ya confirmada, si la partida termino
+    (ver game.partidas.victoria). Si termino difunde "fin-partida", cierra las
+    conexiones y elimina la partida. Devuelve True si la partida termino.
+    """
+    conexiones = conexiones or manager
+    fin = await ejecutar_db(evaluar_fin_partida, id_partida, db)
+    if fin is None:
+        return False
+    logger.info("FIN PARTIDA: partida=%s motivo=%s ganadores=%s", id_partida, fin.motivo, fin.ganadores)
+    partidas_terminadas.incrementar()
+    partidas_terminadas_minuto.registrar()
+    await conexiones.broadcast(id_partida, json.dumps(mensaje_fin_partida(fin)))
+    await conexiones.clean_connections(id_partida)
+    await ejecutar_db(eliminarPartida, id_partida, db)
+    return True
+
+
 # Endpoint crear partida
 @partidas_router.post(path="", status_code=status.HTTP_201_CREATED)
 async def crear_partida(partida_info: PartidaData, db=Depends(get_db)
@@ -131,7 +198,7 @@ async def crear_partida(partida_info: PartidaData, db=Depends(get_db)
         Respuesta con los datos de la partida creada
     """
     
-    response = crearPartida(partida_info, db)
+    response = await ejecutar_db(crearPartida, partida_info, db)
     manager.active_connections.update({response.id_partida: []})
     return response
 
@@ -153,7 +220,7 @@ async def obtener_datos_partida(id_partida: int, db=Depends(get_db)) -> PartidaO
         Datos de la partida obtenida
     """
     try:
-        partida_obtenida = PartidaService(db).obtener_por_id(id_partida)
+        partida_obtenida = await ejecutar_db(PartidaService(db).obtener_por_id, id_partida, LOBBY)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -165,7 +232,7 @@ async def obtener_datos_partida(id_partida: int, db=Depends(get_db)) -> PartidaO
             detail=f"No se encontró la partida con ID {id_partida}"
         )
     else:
-        listaJ = listar_jugadores(partida_obtenida)
+        listaJ = await ejecutar_db(listar_jugadores, partida_obtenida)
 
         return PartidaOut(
             nombre_partida=partida_obtenida.nombre,
@@ -191,7 +258,7 @@ async def listar_partidas(db=Depends(get_db)) -> List[PartidaListar]:
         Respuesta con la lista de las partidas.
     """
 
-    partidas_listadas = PartidaService(db).listar()
+    partidas_listadas = await ejecutar_db(PartidaService(db).listar)
     return [
         PartidaListar(
             id=p.id,
@@ -207,6 +274,7 @@ async def listar_partidas(db=Depends(get_db)) -> List[PartidaListar]:
 
 # Endpoint unir jugador a partida dado el ID
 @partidas_router.post(path="/{id_partida}", status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def unir_jugador_a_partida(id_partida: int, jugador_info: JugadorData, db=Depends(get_db), manager=Depends(get_manager)
 ) -> JugadorOut:
 
@@ -224,7 +292,7 @@ async def unir_jugador_a_partida(id_partida: int, jugador_info: JugadorData, db=
         Datos de la partida actualizada con el jugador unido
     """
     try:
-        jugador_unido = unir_a_partida(id_partida, jugador_info, db)
+        jugador_unido = await ejecutar_db(unir_a_partida, id_partida, jugador_info, db)
         await manager.broadcast(id_partida, json.dumps({
                     "evento": "union-jugador", 
                     "id_jugador": jugador_unido.id_jugador, 
@@ -244,6 +312,7 @@ async def unir_jugador_a_partida(id_partida: int, jugador_info: JugadorData, db=
 
 # Endpoint iniciar partida
 @partidas_router.put(path="/{id_partida}")
+@serializar_por_partida
 async def iniciar_partida(id_partida: int, data: IniciarPartidaData, db=Depends(get_db)):
     """
     Inicia una partida si el jugador es el anfitrión y se cumplen las condiciones.
@@ -261,7 +330,9 @@ async def iniciar_partida(id_partida: int, data: IniciarPartidaData, db=Depends(
     """
     
     try:
-        iniciarPartida(id_partida, data, db)
+        await ejecutar_db(iniciarPartida, id_partida, data, db)
+        partidas_iniciadas.incrementar()
+        partidas_iniciadas_minuto.registrar()
         await manager.broadcast(id_partida, json.dumps({"evento": "iniciar-partida"}))
         return {"detail": "Partida iniciada correctamente."}
     
@@ -286,7 +357,7 @@ async def obtener_orden_turnos(id_partida: int, db=Depends(get_db)) -> List[int]
         Lista con el orden de turnos (IDs de jugadores)
     """
     try:
-        partida = PartidaService(db).obtener_por_id(id_partida)
+        partida = await ejecutar_db(PartidaService(db).obtener_por_id, id_partida)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -318,13 +389,13 @@ async def websocket_endpoint(websocket: WebSocket, id_partida: int, id_jugador:
             partida_service = PartidaService(db)
             jugador_service = JugadorService(db)
             
-            jugador = jugador_service.obtener_jugador(id_jugador) 
-            partida = partida_service.obtener_por_id(id_partida)
+            jugador = await ejecutar_db(jugador_service.obtener_jugador, id_jugador)
+            partida = await ejecutar_db(partida_service.obtener_por_id, id_partida)
 
             if partida and jugador and not partida.iniciada:
-                partida.cantJugadores -= 1
-                db.delete(jugador)
-                db.commit()
+                async with unidad_de_trabajo(db):
+                    partida.cantJugadores -= 1
+                    await ejecutar_db(jugador_service.eliminar_jugador, jugador)
                 
                 await manager.broadcast(id_partida, json.dumps({
                     "evento": "desconexion-jugador",
@@ -348,7 +419,7 @@ async def obtener_mano(id_partida: int, id_jugador: int, db=Depends(get_db)):
     Obtiene la mano inicial de un jugador específico para una partida.
     """
     try:
-        mano_jugador = CartaService(db).obtener_mano_jugador(id_jugador, id_partida)
+        mano_jugador = await ejecutar_db(CartaService(db).obtener_mano_jugador, id_jugador, id_partida)
 
         if not mano_jugador:
             return []
@@ -368,6 +439,7 @@ async def obtener_mano(id_partida: int, id_jugador: int, db=Depends(get_db)):
 
 
 @partidas_router.put(path='/{id_partida}/descarte')
+@serializar_por_partida
 async def descarte_cartas(id_partida: int, id_jugador: int, cartas_descarte: list[int]= Body(...), db=Depends(get_db), manager=Depends(get_manager)):
     try:
 
@@ -376,7 +448,7 @@ async def descarte_cartas(id_partida: int, id_jugador: int, cartas_descarte: lis
             id_partida, id_jugador, len(cartas_descarte), cartas_descarte,
         )
 
-        partida = PartidaService(db).obtener_por_id(id_partida)
+        partida = await ejecutar_db(PartidaService(db).obtener_por_id, id_partida)
         if partida is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                 detail="No se encontró la partida"
@@ -385,15 +457,16 @@ async def descarte_cartas(id_partida: int, id_jugador: int, cartas_descarte: lis
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                                 detail="No es tu turno"
                                 )
-        desgracia_social = determinar_desgracia_social(id_partida, id_jugador, db)
-        if desgracia_social and (len(cartas_descarte) != 1):
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                    detail="El jugador esta en desgracia social, solo puede descartar una carta."
-                    )
-
-        CartaService(db).descartar_cartas(id_jugador, cartas_descarte)
-        # Emitimos actualización del mazo (por si alguna lógica futura mueve entre mazos)
-        cantidad_restante = CartaService(db).obtener_cantidad_mazo(id_partida)
+        async with unidad_de_trabajo(db):
+            desgracia_social = await ejecutar_db(determinar_desgracia_social, id_partida, id_jugador, db)
+            if desgracia_social and (len(cartas_descarte) != 1):
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                        detail="El jugador esta en desgracia social, solo puede descartar una carta."
+                        )
+
+            await ejecutar_db(CartaService(db).descartar_cartas, id_jugador, cartas_descarte)
+            # Emitimos actualización del mazo (por si alguna lógica futura mueve entre mazos)
+            cantidad_restante = await ejecutar_db(CartaService(db).obtener_cantidad_mazo, id_partida)
         evento = {
             "evento": "actualizacion-mazo",
             "cantidad-restante-mazo": cantidad_restante,
@@ -436,13 +509,13 @@ async def descarte_cartas(id_partida: int, id_jugador: int, cartas_descarte: lis
 
 @partidas_router.get(path='/{id_partida}/mazo')
 async def obtener_cartas_restantes(id_partida, db=Depends(get_db), manager=Depends(get_manager)):
-    cantidad_restante = CartaService(db).obtener_cantidad_mazo(id_partida)
+    cantidad_restante = await ejecutar_db(CartaService(db).obtener_cantidad_mazo, id_partida)
     return cantidad_restante
 
 
 @partidas_router.get(path='/{id_partida}/turno')
 async def obtener_turno_actual(id_partida, db=Depends(get_db), manager=Depends(get_manager)):
-    turno = PartidaService(db).obtener_turno_actual(id_partida)
+    turno = await ejecutar_db(PartidaService(db).obtener_turno_actual, id_partida)
     evento = {
         "evento": "turno-actual",
         "turno-actual": turno
@@ -453,18 +526,19 @@ async def obtener_turno_actual(id_partida, db=Depends(get_db), manager=Depends(g
 
 # Endpoint robar/reponer cartas
 @partidas_router.post(path='/{id_partida}/robar', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def robar_cartas(id_partida: int, id_jugador: int, cantidad: int = 1, db=Depends(get_db), manager=Depends(get_manager)):
     try:
         # Validar turno actual
-        turno_actual = PartidaService(db).obtener_turno_actual(id_partida)
+        turno_actual = await ejecutar_db(PartidaService(db).obtener_turno_actual, id_partida)
         if turno_actual != id_jugador:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No es tu turno")
 
         # Calcular cuántas cartas faltan para llegar a 6
-        mano = CartaService(db).obtener_mano_jugador(id_jugador, id_partida)
+        mano = await ejecutar_db(CartaService(db).obtener_mano_jugador, id_jugador, id_partida)
         faltantes = max(0, 6 - len(mano))
         # Capear por faltantes y por cartas disponibles en el mazo
-        disponibles = CartaService(db).obtener_cantidad_mazo(id_partida)
+        disponibles = await ejecutar_db(CartaService(db).obtener_cantidad_mazo, id_partida)
         a_robar = min(cantidad, faltantes, disponibles) if faltantes > 0 else 0
         logger.info(
             "ROBAR: partida=%s jugador=%s solicitadas=%s faltantes=%s disponibles=%s a_robar=%s",
@@ -474,41 +548,40 @@ async def robar_cartas(id_partida: int, id_jugador: int, cantidad: int = 1, db=D
             # Nada que robar, simplemente retornar
             return []
 
-        cartas = CartaService(db).robar_cartas(id_partida=id_partida, id_jugador=id_jugador, cantidad=a_robar)
-        logger.info(
-            "ROBAR OK: partida=%s jugador=%s robadas=%s detalle=%s",
-            id_partida, id_jugador, len(cartas), cartas,
-        )
-        
+        # robar, y si corresponde pasar el turno y reponer el draft, se confirma junto
+        nuevo_turno = None
+        async with unidad_de_trabajo(db):
+            cartas = await ejecutar_db(CartaService(db).robar_cartas, id_partida=id_partida, id_jugador=id_jugador, cantidad=a_robar)
+            logger.info(
+                "ROBAR OK: partida=%s jugador=%s robadas=%s detalle=%s",
+                id_partida, id_jugador, len(cartas), cartas,
+            )
+            cantidad_restante = await ejecutar_db(CartaService(db).obtener_cantidad_mazo, id_partida)
+
+            # Si la mano quedó en 6 tras robar (o no hay mas mazo), avanzar turno
+            mano_final = await ejecutar_db(CartaService(db).obtener_mano_jugador, id_jugador, id_partida)
+            if len(mano_final) >= 6 or cantidad_restante == 0:
+                nuevo_turno = await ejecutar_db(PartidaService(db).avanzar_turno, id_partida)
+                logger.info(
+                    "TURNO AVANZA POR ROBAR: partida=%s nuevo_turno=%s",
+                    id_partida, nuevo_turno,
+                )
+                await ejecutar_db(CartaService(db).actualizar_mazo_draft, id_partida)
+
         # Notificar actualización del mazo
-        cantidad_restante = CartaService(db).obtener_cantidad_mazo(id_partida)
         await manager.broadcast(id_partida, json.dumps({
             "evento": "actualizacion-mazo",
             "cantidad-restante-mazo": cantidad_restante,
         }))
-        # Si el mazo queda en 0, emitir fin de partida
-        if cantidad_restante == 0:
-            fin_payload = {
-                "evento": "fin-partida",
-                "payload": {"ganadores": [], "asesinoGano": True}
-            }
-            await manager.broadcast(id_partida, json.dumps(fin_payload))
-            await manager.clean_connections(id_partida)
-            eliminarPartida(id_partida, db)
-
-        # Si la mano quedó en 6 tras robar, avanzar turno
-        mano_final = CartaService(db).obtener_mano_jugador(id_jugador, id_partida)
-        if len(mano_final) >= 6 or cantidad_restante == 0:
-            nuevo_turno = PartidaService(db).avanzar_turno(id_partida)
-            logger.info(
-                "TURNO AVANZA POR ROBAR: partida=%s nuevo_turno=%s",
-                id_partida, nuevo_turno,
-            )
+        # Si el mazo queda en 0 la partida termina
+        if await terminar_si_corresponde(id_partida, db, manager):
+            return cartas
+
+        if nuevo_turno is not None:
             await manager.broadcast(id_partida, json.dumps({
                 "evento": "turno-actual",
                 "turno-actual": nuevo_turno,
             }))
-            CartaService(db).actualizar_mazo_draft(id_partida)
 
         return cartas
     except HTTPException:
@@ -529,7 +602,7 @@ async def mazo_draft(id_partida: int, db=Depends(get_db)):
     Devuelve una lista de cartas que componen el mazo de draft.
     """
     try:
-        mazo_draft = mostrar_mazo_draft(id_partida, db)
+        mazo_draft = await ejecutar_db(mostrar_mazo_draft, id_partida, db)
         return mazo_draft
     
     except Exception as e:
@@ -541,7 +614,7 @@ async def obtener_sets_jugados(id_partida: int, db=Depends(get_db)):
     """Devuelve los sets jugados en la partida agrupados por jugador."""
     from game.cartas.services import CartaService
     try:
-        sets = CartaService(db).obtener_sets_jugados(id_partida)
+        sets = await ejecutar_db(CartaService(db).obtener_sets_jugados, id_partida)
         return sets
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -553,7 +626,7 @@ async def obtener_secretos(id_partida: int, id_jugador: int, db=Depends(get_db))
     Obtiene los secretos de un jugador específico para una partida.
     """
     try:
-        secretos_jugador = CartaService(db).obtener_secretos_jugador(id_jugador, id_partida)
+        secretos_jugador = await ejecutar_db(CartaService(db).obtener_secretos_jugador, id_jugador, id_partida)
 
         if not secretos_jugador:
             return []
@@ -578,7 +651,7 @@ async def obtener_asesino_complice(id_partida: int, db=Depends(get_db)):
     Obtiene los IDs del asesino y el cómplice de una partida específica.
     """
     try:
-        asesino_complice = ids_asesino_complice(db, id_partida)
+        asesino_complice = await ejecutar_db(ids_asesino_complice, db, id_partida)
 
         if not asesino_complice:
             return []
@@ -599,7 +672,7 @@ async def mazo_descarte(id_partida: int, id_jugador: int, cantidad: int = 1, db=
     devuelve lista de cartas que componen el mazo de desarte.
     """
     try:
-        cartas_descarte = mostrar_cartas_descarte(id_partida, id_jugador, cantidad, db)
+        cartas_descarte = await ejecutar_db(mostrar_cartas_descarte, id_partida, id_jugador, cantidad, db)
         carta_top = cartas_descarte[0] if cartas_descarte else None
         if cantidad == 1:
             await manager.broadcast(id_partida, json.dumps({
@@ -618,6 +691,7 @@ async def mazo_descarte(id_partida: int, id_jugador: int, cantidad: int = 1, db=
 
 
 @partidas_router.patch(path="/{id_partida}/revelacion", status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def revelar_secreto(id_partida: int, id_jugador_turno: int, id_unico_secreto: int, db=Depends(get_db)):
     """
     Revela el secreto de un jugador de la partida.
@@ -626,18 +700,19 @@ async def revelar_secreto(id_partida: int, id_jugador_turno: int, id_unico_secre
     un secreto de otro jugador, y el ID de la carta a revelar.
     """
     try:
-        id_jugador_afectado = obtener_jugador_por_id_carta(id_partida, id_unico_secreto, db)
-        desgraciaSocial_aux = DESGRACIA_SOCIAL_0
-        desgracia_social = determinar_desgracia_social(id_partida, id_jugador_afectado, db)
-        if not desgracia_social:
-            desgraciaSocial_aux = DESGRACIA_SOCIAL_1
+        async with unidad_de_trabajo(db):
+            id_jugador_afectado = await ejecutar_db(obtener_jugador_por_id_carta, id_partida, id_unico_secreto, db)
+            desgraciaSocial_aux = DESGRACIA_SOCIAL_0
+            desgracia_social = await ejecutar_db(determinar_desgracia_social, id_partida, id_jugador_afectado, db)
+            if not desgracia_social:
+                desgraciaSocial_aux = DESGRACIA_SOCIAL_1
 
-        secreto_revelado = revelarSecreto(id_partida, id_jugador_turno, id_unico_secreto, db)
-        secretoID = secreto_revelado.id
-        if not secreto_revelado:
-            return None
-        
-        secretos_actuales = CartaService(db).obtener_secretos_jugador(secreto_revelado.jugador_id, id_partida)
+            secreto_revelado = await ejecutar_db(revelarSecreto, id_partida, id_jugador_turno, id_unico_secreto, db)
+            secretoID = secreto_revelado.id
+            if not secreto_revelado:
+                return None
+
+            secretos_actuales = await ejecutar_db(CartaService(db).obtener_secretos_jugador, secreto_revelado.jugador_id, id_partida)
         print(f'secretos del jugador: {[{"id_carta": s.id, "bocaArriba": s.bocaArriba} for s in secretos_actuales]}')
         await manager.broadcast(id_partida, json.dumps({
             "evento": "actualizacion-secreto",
@@ -645,31 +720,15 @@ async def revelar_secreto(id_partida: int, id_jugador_turno: int, id_unico_secre
             "lista-secretos": [{"revelado": s.bocaArriba} for s in secretos_actuales]
         }))
 
-        esAsesino = CartaService(db).es_asesino(id_unico_secreto)
-        if esAsesino:
-            logger.info("ES EL ASESINO, POR HACER EL BROADCAST")
-            await manager.broadcast(id_partida, json.dumps({
-            "evento": "fin-partida",
-            "jugador-perdedor-id": secreto_revelado.jugador_id,
-            "payload": {"ganadores": [], "asesinoGano": False}
-            }))
-            await manager.clean_connections(id_partida)
-            eliminarPartida(id_partida, db)
-        else:
-            desgracia_social = determinar_desgracia_social(id_partida, id_jugador_afectado, db)
-            if (not desgraciaSocial_aux) and (desgracia_social):
-                print("Entro en desgracia social")
-                await manager.broadcast(id_partida, json.dumps({
-                    "desgracia_social": DESGRACIA_SOCIAL_0,
-                    "Jugador": id_jugador_afectado
-                }))
-        ganador = ganar_por_desgracia_social(id_partida, db)
-        if ganador:
+        desgracia_social = await ejecutar_db(determinar_desgracia_social, id_partida, id_jugador_afectado, db)
+        if (not desgraciaSocial_aux) and (desgracia_social):
+            print("Entro en desgracia social")
             await manager.broadcast(id_partida, json.dumps({
-            "evento": "fin-partida", "ganadores": [], "asesinoGano": True
+                "desgracia_social": DESGRACIA_SOCIAL_0,
+                "Jugador": id_jugador_afectado
             }))
-            await manager.clean_connections(id_partida)
-            eliminarPartida(id_partida, db)
+        # Secreto del asesino revelado o todos en desgracia social menos el asesino/complice
+        await terminar_si_corresponde(id_partida, db)
 
         return {"id-secreto": secretoID}
         
@@ -702,6 +761,7 @@ async def revelar_secreto(id_partida: int, id_jugador_turno: int, id_unico_secre
 
 
 @partidas_router.put("/{id_partida}/jugador/{id_jugador}/recoger", status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def accion_recoger_cartas(
     id_partida: int,
     id_jugador: int,
@@ -711,9 +771,11 @@ async def accion_recoger_cartas(
 ):
     try:
         # Llamar al servicio para manejar la acción de recoger cartas
-        resultado = PartidaService(db).manejar_accion_recoger(
-            id_partida, id_jugador, payload.cartas_draft
-        )
+        async with unidad_de_trabajo(db):
+            resultado = await ejecutar_db(
+                PartidaService(db).manejar_accion_recoger,
+                id_partida, id_jugador, payload.cartas_draft
+            )
 
         # Extraer datos del resultado
         nuevas_cartas_para_jugador = resultado["nuevas_cartas"]
@@ -734,12 +796,7 @@ async def accion_recoger_cartas(
             "evento": "turno-actual",
             "turno-actual": nuevo_turno_id
         }))
-        if cantidad_final_mazo == 0:
-            await manager.broadcast(id_partida, json.dumps({
-                "evento": "fin-partida", "ganadores": [], "asesinoGano": True
-            }))
-            await manager.clean_connections(id_partida)
-            eliminarPartida(id_partida, db)
+        await terminar_si_corresponde(id_partida, db, manager)
         return nuevas_cartas_para_jugador
         
     except HTTPException:
@@ -755,7 +812,7 @@ async def obtener_secretos_otro_jugador(id_partida: int, id_jugador: int, db=Dep
     Obtiene los secretos de un jugador específico para una partida.
     """
     try:
-        cartas_a_enviar = CartaService(db).obtener_secretos_ajenos(id_jugador, id_partida)
+        cartas_a_enviar = await ejecutar_db(CartaService(db).obtener_secretos_ajenos, id_jugador, id_partida)
         return cartas_a_enviar
     
     except Exception as e:
@@ -763,6 +820,7 @@ async def obtener_secretos_otro_jugador(id_partida: int, id_jugador: int, db=Dep
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
 @partidas_router.patch(path="/{id_partida}/ocultamiento", status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def ocultar_secreto(id_partida: int, id_jugador_turno: int, id_unico_secreto: int,db=Depends(get_db)):
     """
     Oculta el secreto de un jugador de la partida.
@@ -771,17 +829,17 @@ async def ocultar_secreto(id_partida: int, id_jugador_turno: int, id_unico_secre
     un secreto de otro jugador, y el ID de la carta a ocultar.
     """
     try:
-        id_jugador_afectado = obtener_jugador_por_id_carta(id_partida, id_unico_secreto, db)
+        id_jugador_afectado = await ejecutar_db(obtener_jugador_por_id_carta, id_partida, id_unico_secreto, db)
         desgraciaSocial_aux = DESGRACIA_SOCIAL_1
-        desgracia_social = determinar_desgracia_social(id_partida, id_jugador_afectado, db)
+        desgracia_social = await ejecutar_db(determinar_desgracia_social, id_partida, id_jugador_afectado, db)
         if desgracia_social:
             desgraciaSocial_aux = DESGRACIA_SOCIAL_0
-        secreto_ocultado = ocultarSecreto(id_partida, id_jugador_turno, id_unico_secreto, db)
+        secreto_ocultado = await ejecutar_db(ocultarSecreto, id_partida, id_jugador_turno, id_unico_secreto, db)
         
         if not secreto_ocultado:
             return None
         
-        secretos_actuales = CartaService(db).obtener_secretos_jugador(secreto_ocultado.jugador_id, id_partida)
+        secretos_actuales = await ejecutar_db(CartaService(db).obtener_secretos_jugador, secreto_ocultado.jugador_id, id_partida)
         print(f'secretos del jugador: {[{"id_carta": s.id, "bocaArriba": s.bocaArriba} for s in secretos_actuales]}')
         await manager.broadcast(id_partida, json.dumps({
             "evento": "actualizacion-secreto",
@@ -789,7 +847,7 @@ async def ocultar_secreto(id_partida: int, id_jugador_turno: int, id_unico_secre
             "lista-secretos": [{"revelado": s.bocaArriba} for s in secretos_actuales]
         }))
 
-        desgracia_social = determinar_desgracia_social(id_partida, id_jugador_afectado, db)
+        desgracia_social = await ejecutar_db(determinar_desgracia_social, id_partida, id_jugador_afectado, db)
         if desgraciaSocial_aux and (not desgracia_social):
             await manager.broadcast(id_partida, json.dumps({
                 "desgracia_social": DESGRACIA_SOCIAL_1,
@@ -827,27 +885,28 @@ async def ocultar_secreto(id_partida: int, id_jugador_turno: int, id_unico_secre
 
 
 @partidas_router.patch(path="/{id_partida}/robo-secreto", status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def robar_secreto_otro_jugador(id_partida: int, id_jugador_turno: int, id_jugador_destino: int, id_unico_secreto: int, db=Depends(get_db)):
     """
     Roba el secreto de un jugador dado su ID, el ID del jugador del turno, el ID de la carta y el de la partida.
     """
     try:
         desgraciaSocial_aux = DESGRACIA_SOCIAL_1
-        desgracia_social = determinar_desgracia_social(id_partida, id_jugador_destino, db)
+        desgracia_social = await ejecutar_db(determinar_desgracia_social, id_partida, id_jugador_destino, db)
         if desgracia_social:
             desgraciaSocial_aux = DESGRACIA_SOCIAL_0
 
         # Obtener el jugador víctima antes de robar
-        secreto_antes = CartaService(db).obtener_carta_por_id(id_unico_secreto)
+        secreto_antes = await ejecutar_db(CartaService(db).obtener_carta_por_id, id_unico_secreto)
         id_jugador_victima = secreto_antes.jugador_id if secreto_antes else None
 
-        secreto_robado = robar_secreto(id_partida, id_jugador_turno, id_jugador_destino, id_unico_secreto, db)
+        secreto_robado = await ejecutar_db(robar_secreto, id_partida, id_jugador_turno, id_jugador_destino, id_unico_secreto, db)
 
         if not secreto_robado:
             return None
         
         # Actualizar secretos del jugador que recibe el secreto robado
-        secretos_actuales = CartaService(db).obtener_secretos_jugador(id_jugador_destino, id_partida)
+        secretos_actuales = await ejecutar_db(CartaService(db).obtener_secretos_jugador, id_jugador_destino, id_partida)
         print(f'secretos del jugador: {[{"id_carta": s.id, "bocaArriba": s.bocaArriba} for s in secretos_actuales]}')
         await manager.broadcast(id_partida, json.dumps({
             "evento": "actualizacion-secreto",
@@ -857,27 +916,21 @@ async def robar_secreto_otro_jugador(id_partida: int, id_jugador_turno: int, id_
 
         # Actualizar secretos del jugador victima (al que le robaron el secreto)
         if id_jugador_victima and id_jugador_victima != id_jugador_destino:
-            secretos_victima = CartaService(db).obtener_secretos_jugador(id_jugador_victima, id_partida)
+            secretos_victima = await ejecutar_db(CartaService(db).obtener_secretos_jugador, id_jugador_victima, id_partida)
             await manager.broadcast(id_partida, json.dumps({
                 "evento": "actualizacion-secreto",
                 "jugador-id": id_jugador_victima,
                 "lista-secretos": [{"revelado": s.bocaArriba} for s in secretos_victima]
             }))
 
-        desgracia_social = determinar_desgracia_social(id_partida, id_jugador_destino, db)
+        desgracia_social = await ejecutar_db(determinar_desgracia_social, id_partida, id_jugador_destino, db)
         if desgraciaSocial_aux and (not desgracia_social):
             print(f"desgracia social: El jugador {id_jugador_destino} salio de desgracia social")
             await manager.broadcast(id_partida, json.dumps({
                 "desgracia_social": DESGRACIA_SOCIAL_1,
                 "Jugador": id_jugador_destino
             }))
-        ganador = ganar_por_desgracia_social(id_partida, db)
-        if ganador:
-            await manager.broadcast(id_partida, json.dumps({
-            "evento": "fin-partida", "ganadores": [], "asesinoGano": True
-            }))
-            await manager.clean_connections(id_partida)
-            eliminarPartida(id_partida, db)
+        await terminar_si_corresponde(id_partida, db)
         return secreto_robado
         
     except ValueError as e:
@@ -910,6 +963,7 @@ async def robar_secreto_otro_jugador(id_partida: int, id_jugador_turno: int, id_
 
 #Endpoint Jugar set 
 @partidas_router.post(path='/{id_partida}/Jugar-set', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def jugar_set(id_partida: int, id_jugador: int,set_destino_id: int, set_cartas: list[int], db=Depends(get_db), manager=Depends(get_manager)):
     """ Juega un set de cartas si es el turno del jugador y las cartas son las correctas.
     Parameters ----------
@@ -920,24 +974,20 @@ async def jugar_set(id_partida: int, id_jugador: int,set_destino_id: int, set_ca
         Status 200 OK si el set se puede jugar correctamente, de lo contrario lanza una excepción HTTP. 
     """ 
     from game.cartas.services import CartaService
-    cartas_jugadas = jugar_set_detective(id_partida, id_jugador, set_destino_id, set_cartas, db)
-    if set_cartas[0] == ARIADNE_OLIVER:
-        carta = CartaService(db).jugar_ariadne_oliver(id_partida, set_destino_id)
-        return carta
-    # Persist and broadcast the played set
-    try:
-        cs = CartaService(db)
-        registro = cs.registrar_set_jugado(id_partida, id_jugador, cartas_jugadas)
-        payload = {
-            "evento": "jugar-set",
-            "jugador_id": id_jugador,
-            "representacion_id": next((c.id_carta for c in cartas_jugadas if c.id_carta != 14), cartas_jugadas[0].id_carta if cartas_jugadas else 1),
-            "cartas_ids": [c.id_carta for c in cartas_jugadas],
-        }
-        await manager.broadcast(id_partida, json.dumps(payload))
-    except Exception:
-        # do not block on logging/persist issues
-        pass
+    # bajar las cartas y registrar el set es una sola accion: se confirma junto
+    async with unidad_de_trabajo(db):
+        cartas_jugadas = await ejecutar_db(jugar_set_detective, id_partida, id_jugador, set_destino_id, set_cartas, db)
+        if set_cartas[0] == ARIADNE_OLIVER:
+            carta = await ejecutar_db(CartaService(db).jugar_ariadne_oliver, id_partida, set_destino_id)
+            return carta
+        await ejecutar_db(CartaService(db).registrar_set_jugado, id_partida, id_jugador, cartas_jugadas)
+    payload = {
+        "evento": "jugar-set",
+        "jugador_id": id_jugador,
+        "representacion_id": next((c.id_carta for c in cartas_jugadas if not es_comodin(c.id_carta)), cartas_jugadas[0].id_carta if cartas_jugadas else 1),
+        "cartas_ids": [c.id_carta for c in cartas_jugadas],
+    }
+    await manager.broadcast(id_partida, json.dumps(payload))
     try:
         resumen = ", ".join([f"{c.id_carta}:{c.nombre}" for c in cartas_jugadas])
         logger = logging.getLogger(__name__)
@@ -957,7 +1007,7 @@ async def obtener_secretos_otro_jugador(id_partida: int, id_jugador: int, db=Dep
     Obtiene los secretos de un jugador específico para una partida.
     """
     try:
-        cartas_a_enviar = CartaService(db).obtener_secretos_ajenos(id_jugador, id_partida)
+        cartas_a_enviar = await ejecutar_db(CartaService(db).obtener_secretos_ajenos, id_jugador, id_partida)
         return cartas_a_enviar
     
     except Exception as e:
@@ -967,17 +1017,19 @@ async def obtener_secretos_otro_jugador(id_partida: int, id_jugador: int, db=Dep
 
 
 @partidas_router.patch(path="/{id_partida}/ocultamiento", status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def ocultar_secreto(id_partida: int, id_jugador: int, id_unico_secreto: int,db=Depends(get_db)):
     """
     Oculta el secreto de un jugador dado su ID, el ID de la carta y el de la partida.
     """
     try:
-        secreto_ocultado = CartaService(db).ocultar_secreto(id_partida, id_jugador, id_unico_secreto)
-        
-        if not secreto_ocultado:
-            return None
-        
-        secretos_actuales = CartaService(db).obtener_secretos_jugador(id_jugador, id_partida)
+        async with unidad_de_trabajo(db):
+            secreto_ocultado = await ejecutar_db(CartaService(db).ocultar_secreto, id_partida, id_jugador, id_unico_secreto)
+
+            if not secreto_ocultado:
+                return None
+
+            secretos_actuales = await ejecutar_db(CartaService(db).obtener_secretos_jugador, id_jugador, id_partida)
         print(f'secretos del jugador: {[{"id_carta": s.id, "bocaArriba": s.bocaArriba} for s in secretos_actuales]}')
         await manager.broadcast(id_partida, json.dumps({
             "evento": "actualizacion-secreto",
@@ -987,6 +1039,8 @@ async def ocultar_secreto(id_partida: int, id_jugador: int, id_unico_secreto: in
 
         return secreto_ocultado
         
+    except ConflictoDeVersion:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -995,22 +1049,24 @@ async def ocultar_secreto(id_partida: int, id_jugador: int, id_unico_secreto: in
 
 
 @partidas_router.put(path='/{id_partida}/evento/CardsTable', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def cards_off_the_table(id_partida: int, id_jugador: int, id_objetivo: int, id_carta: int, db=Depends(get_db)):
     """
     Se juega el evento Cards off the table(descarta los Not so fast de la mano de un jugador)
     """
     try:
         if verif_evento("Cards off the table", id_carta):
-            verif_jugador_objetivo(id_partida, id_jugador, id_objetivo, db)
-            jugar_carta_evento(id_partida, id_jugador, id_carta, db)
+            await ejecutar_db(verif_jugador_objetivo, id_partida, id_jugador, id_objetivo, db)
+            await ejecutar_db(jugar_carta_evento, id_partida, id_jugador, id_carta, db)
             await manager.broadcast(id_partida, json.dumps({
                 "evento": "se-jugo-cards-off-the-table",
                 "jugador_id": id_jugador,
                 "objetivo_id": id_objetivo
             }))
-            sleep(3)
+            await pausa_fuera_del_buzon(3)
             
-            CartaService(db).jugar_cards_off_the_table(id_partida, id_jugador, id_objetivo)
+            async with unidad_de_trabajo(db):
+                await ejecutar_db(CartaService(db).jugar_cards_off_the_table, id_partida, id_jugador, id_objetivo)
             
             evento= {
                 "evento": "carta-descartada", 
@@ -1023,7 +1079,7 @@ async def cards_off_the_table(id_partida: int, id_jugador: int, id_objetivo: int
             await manager.broadcast(id_partida, json.dumps(evento))
 
             for jugador in [id_jugador, id_objetivo]:
-                mano_jugador = CartaService(db).obtener_mano_jugador(jugador, id_partida)
+                mano_jugador = await ejecutar_db(CartaService(db).obtener_mano_jugador, jugador, id_partida)
                 cartas_a_enviar = [{"id": carta.id_carta, "nombre": carta.nombre, "id_instancia": carta.id} for carta in mano_jugador]
 
                 await manager.send_personal_message(
@@ -1076,6 +1132,7 @@ async def cards_off_the_table(id_partida: int, id_jugador: int, id_objetivo: int
 
 
 @partidas_router.put(path='/{id_partida}/evento/OneMore', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def one_more(id_partida: int, id_jugador: int, id_carta: int,
                    payload: OneMorePayload,
                    db=Depends(get_db)):
@@ -1095,11 +1152,11 @@ async def one_more(id_partida: int, id_jugador: int, id_carta: int,
         # Para OneMore permitimos que la fuente sea el mismo jugador en turno (mover su propio secreto).
         # Sólo validamos existencia y que destino sea distinto a fuente.
         # Validar primero el jugador destino (tests esperan este mensaje prioritario)
-        jugador_destino = partidas_utils.JugadorService(db).obtener_jugador(payload.id_destino)
+        jugador_destino = await ejecutar_db(partidas_utils.JugadorService(db).obtener_jugador, payload.id_destino)
         if jugador_destino is None:
             raise ValueError(f"No se encontró el jugador destino {payload.id_destino}.")
 
-        jugador_fuente = partidas_utils.JugadorService(db).obtener_jugador(payload.id_fuente)
+        jugador_fuente = await ejecutar_db(partidas_utils.JugadorService(db).obtener_jugador, payload.id_fuente)
         if jugador_fuente is None:
             raise ValueError(f"No se encontró el jugador fuente {payload.id_fuente}.")
 
@@ -1110,30 +1167,33 @@ async def one_more(id_partida: int, id_jugador: int, id_carta: int,
         # Se permite mover el secreto al mismo jugador (queda oculto en destino)
         
         # jugar carta de evento (marca evento_jugado y valida turno/mano)
-        jugar_carta_evento(id_partida, id_jugador, id_carta, db)
-
-        # Verificar secreto y moverlo al destino oculto
-        from game.cartas.services import CartaService
-        cs = CartaService(db)
-        secreto = cs.obtener_carta_por_id(payload.id_unico_secreto)
-        if secreto is None:
-            raise HTTPException(status_code=404, detail="Secreto no encontrado")
-        if secreto.partida_id != id_partida or secreto.tipo != "secreto":
-            raise HTTPException(status_code=400, detail="Secreto inválido para esta partida")
-        if not secreto.bocaArriba:
-            raise HTTPException(status_code=400, detail="El secreto seleccionado no está revelado")
-        if secreto.jugador_id != payload.id_fuente:
-            raise HTTPException(status_code=400, detail="El secreto no pertenece al jugador fuente")
-
-        cs.robar_secreto(secreto, payload.id_destino)
-
-        # Descartar la carta de evento jugada y avisar
-        carta_jugada = db.query(Carta).filter_by(partida_id=id_partida,
-                                                 jugador_id=id_jugador,
-                                                 ubicacion="evento_jugado",
-                                                 nombre="And then there was one more...").first()
-        if carta_jugada:
-            cs.descartar_cartas(id_jugador, [carta_jugada.id_carta])
+        async with unidad_de_trabajo(db):
+            await ejecutar_db(jugar_carta_evento, id_partida, id_jugador, id_carta, db)
+
+            # Verificar secreto y moverlo al destino oculto
+            from game.cartas.services import CartaService
+            cs = CartaService(db)
+            secreto = await ejecutar_db(cs.obtener_carta_por_id, payload.id_unico_secreto)
+            if secreto is None:
+                raise HTTPException(status_code=404, detail="Secreto no encontrado")
+            if secreto.partida_id != id_partida or secreto.tipo != "secreto":
+                raise HTTPException(status_code=400, detail="Secreto inválido para esta partida")
+            if not secreto.bocaArriba:
+                raise HTTPException(status_code=400, detail="El secreto seleccionado no está revelado")
+            if secreto.jugador_id != payload.id_fuente:
+                raise HTTPException(status_code=400, detail="El secreto no pertenece al jugador fuente")
+
+            await ejecutar_db(cs.robar_secreto, secreto, payload.id_destino)
+
+            # Descartar la carta de evento jugada y avisar
+            carta_jugada = await ejecutar_db(
+                db.query(Carta).filter_by(partida_id=id_partida,
+                                          jugador_id=id_jugador,
+                                          ubicacion="evento_jugado",
+                                          id_carta=id_de("And then there was one more...")).first
+            )
+            if carta_jugada:
+                await ejecutar_db(cs.descartar_cartas, id_jugador, [carta_jugada.id_carta])
 
         await manager.broadcast(id_partida, json.dumps({
             "evento": "se-jugo-one-more",
@@ -1143,13 +1203,13 @@ async def one_more(id_partida: int, id_jugador: int, id_carta: int,
         }))
 
         # Actualizar contadores de secretos para fuente y destino
-        secretos_fuente = cs.obtener_secretos_jugador(payload.id_fuente, id_partida)
+        secretos_fuente = await ejecutar_db(cs.obtener_secretos_jugador, payload.id_fuente, id_partida)
         await manager.broadcast(id_partida, json.dumps({
             "evento": "actualizacion-secreto",
             "jugador-id": payload.id_fuente,
             "lista-secretos": [{"revelado": s.bocaArriba} for s in secretos_fuente]
         }))
-        secretos_destino = cs.obtener_secretos_jugador(payload.id_destino, id_partida)
+        secretos_destino = await ejecutar_db(cs.obtener_secretos_jugador, payload.id_destino, id_partida)
         await manager.broadcast(id_partida, json.dumps({
             "evento": "actualizacion-secreto",
             "jugador-id": payload.id_destino,
@@ -1194,6 +1254,7 @@ async def one_more(id_partida: int, id_jugador: int, id_carta: int,
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
 @partidas_router.put(path='/{id_partida}/evento/AnotherVictim', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def another_victim(id_partida: int, id_jugador: int, id_carta: int, 
                              payload: AnotherVictimPayload, 
                              db=Depends(get_db)):
@@ -1213,10 +1274,10 @@ async def another_victim(id_partida: int, id_jugador: int, id_carta: int,
     """
     try:
         if verif_evento("Another Victim", id_carta):
-            verif_jugador_objetivo(id_partida, id_jugador, payload.id_objetivo, db)
-            jugar_carta_evento(id_partida, id_jugador, id_carta, db)
-            
-            CartaService(db).robar_set(id_partida, id_jugador, payload.id_objetivo, payload.id_representacion_carta, payload.ids_cartas)
+            await ejecutar_db(verif_jugador_objetivo, id_partida, id_jugador, payload.id_objetivo, db)
+            async with unidad_de_trabajo(db):
+                await ejecutar_db(jugar_carta_evento, id_partida, id_jugador, id_carta, db)
+                await ejecutar_db(CartaService(db).robar_set, id_partida, id_jugador, payload.id_objetivo, payload.id_representacion_carta, payload.ids_cartas)
             
             await manager.broadcast(id_partida, json.dumps({
                 "evento": "se-jugo-another-victim",
@@ -1271,6 +1332,7 @@ async def another_victim(id_partida: int, id_jugador: int, id_carta: int,
         raise HTTPException(status_code=500, detail="Error interno del servidor") 
 
 @partidas_router.patch(path="/{id_partida}/revelacion-propia", status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def revelar_secreto_propio(id_partida: int, id_jugador: int, id_unico_secreto: int, db=Depends(get_db)):
     """
     Revela el secreto de un jugador de la partida.
@@ -1281,16 +1343,17 @@ async def revelar_secreto_propio(id_partida: int, id_jugador: int, id_unico_secr
     try:
 
         desgraciaSocial_aux = DESGRACIA_SOCIAL_0
-        desgracia_social = determinar_desgracia_social(id_partida, id_jugador, db)
-        if not desgracia_social:
-            desgraciaSocial_aux = DESGRACIA_SOCIAL_1
+        async with unidad_de_trabajo(db):
+            desgracia_social = await ejecutar_db(determinar_desgracia_social, id_partida, id_jugador, db)
+            if not desgracia_social:
+                desgraciaSocial_aux = DESGRACIA_SOCIAL_1
 
-        secreto_revelado = revelarSecretoPropio(id_partida, id_jugador, id_unico_secreto, db)
-        secretoID = secreto_revelado.id
-        if not secreto_revelado:
-            return None
-        
-        secretos_actuales = CartaService(db).obtener_secretos_jugador(secreto_revelado.jugador_id, id_partida)
+            secreto_revelado = await ejecutar_db(revelarSecretoPropio, id_partida, id_jugador, id_unico_secreto, db)
+            secretoID = secreto_revelado.id
+            if not secreto_revelado:
+                return None
+
+            secretos_actuales = await ejecutar_db(CartaService(db).obtener_secretos_jugador, secreto_revelado.jugador_id, id_partida)
         print(f'secretos del jugador: {[{"id_carta": s.id, "bocaArriba": s.bocaArriba} for s in secretos_actuales]}')
         await manager.broadcast(id_partida, json.dumps({
             "evento": "actualizacion-secreto",
@@ -1298,29 +1361,13 @@ async def revelar_secreto_propio(id_partida: int, id_jugador: int, id_unico_secr
             "lista-secretos": [{"revelado": s.bocaArriba} for s in secretos_actuales]
         }))
 
-        esAsesino = CartaService(db).es_asesino(id_unico_secreto)
-        if esAsesino:
-            await manager.broadcast(id_partida, json.dumps({
-            "evento": "fin-partida",
-            "jugador-perdedor-id": secreto_revelado.jugador_id,
-            "payload": {"ganadores": [], "asesinoGano": False}
-            }))
-            await manager.clean_connections(id_partida)
-            eliminarPartida(id_partida, db)
-        else:
-            desgracia_social = determinar_desgracia_social(id_partida, id_jugador, db)
-            if (not desgraciaSocial_aux) and (desgracia_social):
-                await manager.broadcast(id_partida, json.dumps({
-                    "desgracia_social": DESGRACIA_SOCIAL_0,
-                    "Jugador": id_jugador
-                }))
-        ganador = ganar_por_desgracia_social(id_partida, db)
-        if ganador:
+        desgracia_social = await ejecutar_db(determinar_desgracia_social, id_partida, id_jugador, db)
+        if (not desgraciaSocial_aux) and (desgracia_social):
             await manager.broadcast(id_partida, json.dumps({
-            "evento": "fin-partida", "ganadores": [], "asesinoGano": True
+                "desgracia_social": DESGRACIA_SOCIAL_0,
+                "Jugador": id_jugador
             }))
-            await manager.clean_connections(id_partida)
-            eliminarPartida(id_partida, db)
+        await terminar_si_corresponde(id_partida, db)
 
         return {"id-secreto": secretoID}
         
@@ -1365,11 +1412,11 @@ async def solicitar_revelacion(
     Usado por efectos como Lady Eileen "Bundle" Brent, donde el objetivo elige el secreto a revelar.
     """
     try:
-        partida = PartidaService(db).obtener_por_id(id_partida)
+        partida = await ejecutar_db(PartidaService(db).obtener_por_id, id_partida)
         if partida is None:
             raise HTTPException(status_code=404, detail="Partida no encontrada")
 
-        jugador_obj = JugadorService(db).obtener_jugador(id_jugador_objetivo)
+        jugador_obj = await ejecutar_db(JugadorService(db).obtener_jugador, id_jugador_objetivo)
         if jugador_obj is None or jugador_obj.partida_id != id_partida:
             raise HTTPException(status_code=404, detail="Jugador objetivo no válido para esta partida")
 
@@ -1387,24 +1434,26 @@ async def solicitar_revelacion(
         raise HTTPException(status_code=500, detail=str(e))
 
 @partidas_router.put(path='/{id_partida}/evento/DelayMurderer', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def delay_the_murderer_escape(id_partida: int, id_jugador: int, id_carta: int, cantidad: int, db=Depends(get_db)):
     """
     Se juega el evento delay_the_murderer_escape(agrega hasta 5 cartas del mazo de descarte al de robo)
     """
     try:
         if verif_evento("Delay the murderer's escape!", id_carta):
-            verif_cantidad(id_partida, cantidad, db)
-            jugar_carta_evento(id_partida, id_jugador, id_carta, db)
+            await ejecutar_db(verif_cantidad, id_partida, cantidad, db)
+            await ejecutar_db(jugar_carta_evento, id_partida, id_jugador, id_carta, db)
             await manager.broadcast(id_partida, json.dumps({
                 "evento": "se-jugo-delay-escape"
             }, default=str))
-            CartaService(db).jugar_delay_the_murderer_escape(id_partida, id_jugador, cantidad)
-            cantidad_restante = CartaService(db).obtener_cantidad_mazo(id_partida)
+            async with unidad_de_trabajo(db):
+                await ejecutar_db(CartaService(db).jugar_delay_the_murderer_escape, id_partida, id_jugador, cantidad)
+                cantidad_restante = await ejecutar_db(CartaService(db).obtener_cantidad_mazo, id_partida)
             await manager.broadcast(id_partida, json.dumps({
                 "evento": "actualizacion-mazo",
                 "cantidad-restante-mazo": cantidad_restante
             }, default=str))
-            nueva_carta_tope = CartaService(db).obtener_cartas_descarte(id_partida, 1)
+            nueva_carta_tope = await ejecutar_db(CartaService(db).obtener_cartas_descarte, id_partida, 1)
             await manager.broadcast(id_partida, json.dumps({
                 "evento": "carta-descartada", 
                 "payload": [{"id": c.id_carta} for c in nueva_carta_tope]
@@ -1449,6 +1498,7 @@ async def delay_the_murderer_escape(id_partida: int, id_jugador: int, id_carta:
 
 
 @partidas_router.put(path='/{id_partida}/evento/LookIntoTheAshes', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def look_into_the_ashes(id_partida: int, id_jugador: int, db=Depends(get_db), id_carta: int = None, id_carta_objetivo: int = None):
     """
     Se juega el evento Look Into The Ashes.
@@ -1456,12 +1506,12 @@ async def look_into_the_ashes(id_partida: int, id_jugador: int, db=Depends(get_d
     if id_carta != None and id_carta_objetivo == None:
         try:
             if verif_evento("Look into the ashes", id_carta):
-                carta_evento = jugar_carta_evento(id_partida, id_jugador, id_carta, db)
+                carta_evento = await ejecutar_db(jugar_carta_evento, id_partida, id_jugador, id_carta, db)
                 await manager.broadcast(id_partida, json.dumps({
                     "evento": "se-jugo-look-into-the-ashes",
                     "jugador_id": id_jugador
                 }))
-                await asyncio.sleep(3)
+                await pausa_fuera_del_buzon(3)
         
             else:
                 raise HTTPException(
@@ -1492,7 +1542,7 @@ async def look_into_the_ashes(id_partida: int, id_jugador: int, db=Depends(get_d
             
     elif id_carta == None and id_carta_objetivo != None:
         try:
-            jugar_look_into_ashes(id_partida, id_jugador, id_carta_objetivo, db)
+            await ejecutar_db(jugar_look_into_ashes, id_partida, id_jugador, id_carta_objetivo, db)
             evento2= {
             "evento": "carta-descartada", 
             "payload": {
@@ -1501,6 +1551,8 @@ async def look_into_the_ashes(id_partida: int, id_jugador: int, db=Depends(get_d
                     } 
                 }
             await manager.broadcast(id_partida, json.dumps(evento2))
+        except ConflictoDeVersion:
+            raise
         except Exception as e:
             msg = str(e)
         
@@ -1518,6 +1570,7 @@ async def look_into_the_ashes(id_partida: int, id_jugador: int, db=Depends(get_d
     
 # Endpoint abandonar partida
 @partidas_router.post(path="/{id_partida}/abandonar", status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def abandonar_partida(id_partida: int, id_jugador: int, db=Depends(get_db), manager=Depends(get_manager)):
 
     """
@@ -1534,7 +1587,7 @@ async def abandonar_partida(id_partida: int, id_jugador: int, db=Depends(get_db)
     
     """
     try:
-        jugador_abandona = abandonarPartida(id_partida, id_jugador, db)
+        jugador_abandona = await ejecutar_db(abandonarPartida, id_partida, id_jugador, db)
         if jugador_abandona["rol"] == "invitado":
             await manager.broadcast(id_partida, json.dumps({
                         "evento": "abandono-jugador", 
@@ -1574,6 +1627,7 @@ async def abandonar_partida(id_partida: int, id_jugador: int, db=Depends(get_db)
             )
             
 @partidas_router.put(path='/{id_partida}/evento/EarlyTrain', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def early_train_to_paddington(id_partida: int, id_jugador: int, id_carta: int, db=Depends(get_db)):
     """
     Se juega o descarta el evento Early Train To Paddington.
@@ -1581,30 +1635,21 @@ async def early_train_to_paddington(id_partida: int, id_jugador: int, id_carta:
     """
     try:
         if verif_evento("Early train to paddington", id_carta):
-            jugar_carta_evento(id_partida, id_jugador, id_carta, db)
-            CartaService(db).jugar_early_train_to_paddington(id_partida, id_jugador)
+            async with unidad_de_trabajo(db):
+                await ejecutar_db(jugar_carta_evento, id_partida, id_jugador, id_carta, db)
+                await ejecutar_db(CartaService(db).jugar_early_train_to_paddington, id_partida, id_jugador)
 
             await manager.broadcast(id_partida, json.dumps({
                 "evento": "se-jugo-early-train"
             }))
 
-            cantidad_mazo_robo = CartaService(db).obtener_cantidad_mazo(id_partida)
+            cantidad_mazo_robo = await ejecutar_db(CartaService(db).obtener_cantidad_mazo, id_partida)
             await manager.broadcast(id_partida, json.dumps({
                 "evento": "actualizacion-mazo",
                 "cantidad-restante-mazo": cantidad_mazo_robo
             }))
-            cantidad_restante = CartaService(db).obtener_cantidad_mazo(id_partida)
-
-            if cantidad_restante == 0:
-                fin_payload = {
-                    "evento": "fin-partida",
-                    "payload": {"ganadores": [], "asesinoGano": True}
-                }
-                await manager.broadcast(id_partida, json.dumps(fin_payload))
-                await manager.clean_connections(id_partida)
-                eliminarPartida(id_partida, db)
-            else:
-                nueva_carta_tope = CartaService(db).obtener_cartas_descarte(id_partida, 1)
+            if not await terminar_si_corresponde(id_partida, db):
+                nueva_carta_tope = await ejecutar_db(CartaService(db).obtener_cartas_descarte, id_partida, 1)
                 id_carta: int = nueva_carta_tope[0].id_carta if nueva_carta_tope else None
                 await manager.broadcast(id_partida, json.dumps({
                     "evento": "carta-descartada", 
@@ -1654,17 +1699,18 @@ async def early_train_to_paddington(id_partida: int, id_jugador: int, id_carta:
 
 
 @partidas_router.put(path='/{id_partida}/evento/PointYourSuspicions', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def point_your_suspicions(id_partida: int, id_jugador: int, id_carta: int, db=Depends(get_db)):
     
     try:
         if verif_evento("Point your suspicions", id_carta):
-            carta_evento = jugar_carta_evento(id_partida, id_jugador, id_carta, db)
+            carta_evento = await ejecutar_db(jugar_carta_evento, id_partida, id_jugador, id_carta, db)
             await manager.broadcast(id_partida, json.dumps({
                 "evento": "se-jugo-point-your-suspicions",
                 "jugador_id": id_jugador
             }))
             
-            votacion_activada(id_partida, db)
+            await ejecutar_db(votacion_activada, id_partida, db)
     
         else:
             raise HTTPException(
@@ -1699,10 +1745,11 @@ async def point_your_suspicions(id_partida: int, id_jugador: int, id_carta: int,
         
 
 @partidas_router.put(path='/{id_partida}/evento/PointYourSuspicions/votacion', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def resolver_point_your_suspicions(id_partida: int, id_jugador: int, id_votante: int, id_votado: int, db=Depends(get_db)):
     
     try:
-        sospechoso = jugar_point_your_suspicions(id_partida, id_jugador, id_votante, id_votado, db)
+        sospechoso = await ejecutar_db(jugar_point_your_suspicions, id_partida, id_jugador, id_votante, id_votado, db)
         await manager.broadcast(id_partida, json.dumps({
             "evento": "voto-registrado",
             "votante_id": id_votante,
@@ -1732,6 +1779,7 @@ async def resolver_point_your_suspicions(id_partida: int, id_jugador: int, id_vo
         
             
 @partidas_router.post(path='/{id_partida}/iniciar-accion', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def iniciar_accion_generica(id_partida: int, id_jugador: int,
                                   accion: AccionGenericaPayload,
                                   db=Depends(get_db)) -> dict:
@@ -1758,7 +1806,7 @@ async def iniciar_accion_generica(id_partida: int, id_jugador: int,
         correspondiente a la acción ejecutada y abrir la ventana para jugar una NSF
     """
     try:
-        accion_context, mensaje = iniciar_accion_cancelable(id_partida, id_jugador, accion, db)
+        accion_context, mensaje = await ejecutar_db(iniciar_accion_cancelable, id_partida, id_jugador, accion, db)
 
         await manager.broadcast(id_partida, json.dumps({
             "evento": "accion-en-progreso",
@@ -1795,6 +1843,7 @@ async def iniciar_accion_generica(id_partida: int, id_jugador: int,
     
 
 @partidas_router.put(path='/{id_partida}/respuesta/not_so_fast', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def not_so_fast(id_partida: int, id_jugador: int, id_carta: int, db=Depends(get_db)):
     """
     (Fase 2 NSF) Juega una carta "Not So Fast" en respuesta a una acción en progreso.
@@ -1820,7 +1869,7 @@ async def not_so_fast(id_partida: int, id_jugador: int, id_carta: int, db=Depend
         if not verif_evento("Not so fast", id_carta):
              raise HTTPException(status_code=400, detail="La carta no es Not So Fast.")
           
-        accion_context = jugar_not_so_fast(id_partida, id_jugador, id_carta, db)
+        accion_context = await ejecutar_db(jugar_not_so_fast, id_partida, id_jugador, id_carta, db)
 
         # Notifica al frontend que reinicie el timer
         await manager.broadcast(id_partida, json.dumps({
@@ -1855,6 +1904,7 @@ async def not_so_fast(id_partida: int, id_jugador: int, id_carta: int, db=Depend
 
 
 @partidas_router.post(path='/{id_partida}/resolver-accion', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def resolver_accion(id_partida: int, db=Depends(get_db)):
     """
     (Fase 3 NSF) Determina si la acción se ejecuta o se cancela, y limpia la pila.
@@ -1873,7 +1923,7 @@ async def resolver_accion(id_partida: int, db=Depends(get_db)):
         Si se ejecuta la acción, luego el frontend llama al endpoint correspondiente.
     """
     try:
-        resolucion = resolver_accion_turno(id_partida, db)
+        resolucion = await ejecutar_db(resolver_accion_turno, id_partida, db)
         if resolucion == "Acción ejecutada":
             # Avisa al frontend que ejecute el endpoint original
             mensaje = "Acción aprobada. Ejecutando..."
@@ -1927,7 +1977,9 @@ async def resolver_accion(id_partida: int, db=Depends(get_db)):
 
 
 @partidas_router.post(path='/{id_partida}/agregar-a-set', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def agregar_a_set( 
+    id_partida: int,
     payload: AgregarCartaSetPayload, 
     db=Depends(get_db)
 ):
@@ -1936,10 +1988,12 @@ async def agregar_a_set(
     """
     try:
 
-        set_actualizado = actualizar_set(payload, db)
+        set_actualizado = await ejecutar_db(actualizar_set, id_partida, payload, db)
 
         return {"detail": "Carta agregada al set", "set_id": set_actualizado.id}
 
+    except ConflictoDeVersion:
+        raise
     except Exception as e:
         # Manejo de error simple
         raise HTTPException(status_code=400, detail=str(e))
@@ -1949,7 +2003,7 @@ async def agregar_a_set(
 @partidas_router.post("/{id_partida}/envio-mensaje")
 async def enviar_mensaje_chat(id_partida: int, id_jugador: int, mensaje: Mensaje, db=Depends(get_db)):
     try:
-        enviar_mensaje(id_partida, id_jugador, mensaje, db)
+        await ejecutar_db(enviar_mensaje, id_partida, id_jugador, mensaje, db)
         
         evento = {
             "evento": "nuevo-mensaje",
@@ -1996,6 +2050,7 @@ async def enviar_mensaje_chat(id_partida: int, id_jugador: int, mensaje: Mensaje
 
 
 @partidas_router.post(path='/{id_partida}/evento/CardTrade', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def card_trade(id_partida: int, id_jugador: int, id_carta: int, id_objetivo: int, db=Depends(get_db)):
     """
     se juega la carta: Card trade
@@ -2007,9 +2062,9 @@ async def card_trade(id_partida: int, id_jugador: int, id_carta: int, id_objetiv
         id_objetivo: id del jugador con el que se quiere realizar el intercambio
     """
     try:
-        id_tipo = obtener_id_de_tipo(id_carta, db)
+        id_tipo = await ejecutar_db(obtener_id_de_tipo, id_carta, db)
         if verif_evento("Card trade", id_tipo):
-            jugar_carta_evento(id_partida, id_jugador, id_tipo, db)
+            await ejecutar_db(jugar_carta_evento, id_partida, id_jugador, id_tipo, db)
             
             payload = {
                 "evento": "se-jugo-card-trade",
@@ -2059,6 +2114,7 @@ async def card_trade(id_partida: int, id_jugador: int, id_carta: int, id_objetiv
         raise HTTPException(status_code=500, detail="Error interno del servidor")
     
 @partidas_router.post(path='/{id_partida}/evento/sendCard', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def send_card(id_partida: int, id_jugador: int, id_objetivo: int, id_carta: int, db=Depends(get_db)): 
     """
     endpoint encargado de enviar una carta a un jugador objetivo
@@ -2073,10 +2129,10 @@ async def send_card(id_partida: int, id_jugador: int, id_objetivo: int, id_carta
     """
 
     try:
-        if verif_send_card(id_partida, id_carta, id_jugador, id_objetivo, db):
-            enviar_carta(id_carta, id_objetivo, db)
+        if await ejecutar_db(verif_send_card, id_partida, id_carta, id_jugador, id_objetivo, db):
+            await ejecutar_db(enviar_carta, id_carta, id_objetivo, db)
            
-            mano_jugador = CartaService(db).obtener_mano_jugador(id_objetivo, id_partida)
+            mano_jugador = await ejecutar_db(CartaService(db).obtener_mano_jugador, id_objetivo, id_partida)
             cartas_a_enviar = [
                 {
                     "id": carta.id_carta,
@@ -2092,7 +2148,7 @@ async def send_card(id_partida: int, id_jugador: int, id_objetivo: int, id_carta
                     "data": cartas_a_enviar
                 })
             )
-            tipo_carta = obtener_id_de_tipo(id_carta, db)
+            tipo_carta = await ejecutar_db(obtener_id_de_tipo, id_carta, db)
             print(f"[DEBUG] Verificando tipo_carta: {tipo_carta}")
             if (tipo_carta == 27 or tipo_carta == 26):
                 print(f"[DEBUG] Es carta tipo 27 (Devius), preparando broadcast")
@@ -2135,6 +2191,7 @@ async def send_card(id_partida: int, id_jugador: int, id_objetivo: int, id_carta
         
 
 @partidas_router.post(path='/{id_partida}/evento/DeadCardFolly', status_code=status.HTTP_200_OK)
+@serializar_por_partida
 async def dead_card_folly(id_partida: int, id_jugador: int, id_carta: int, direccion: str, db=Depends(get_db)):
     """
     se juega la carta: Dead Card Folly
@@ -2146,11 +2203,11 @@ async def dead_card_folly(id_partida: int, id_jugador: int, id_carta: int, direc
         direccion: str  (string que indica si la ronda va hacia la izquierda o la derecha)
     """
     try:
-        id_tipo = obtener_id_de_tipo(id_carta, db)
+        id_tipo = await ejecutar_db(obtener_id_de_tipo, id_carta, db)
         if verif_evento("Dead card folly", id_tipo):
-            jugar_carta_evento(id_partida, id_jugador, id_tipo, db)
+            await ejecutar_db(jugar_carta_evento, id_partida, id_jugador, id_tipo, db)
             
-            orden_turnos = obtener_turnos(id_partida, db)
+            orden_turnos = await ejecutar_db(obtener_turnos, id_partida, db)
 
             await manager.broadcast(id_partida,
                                      json.dumps({
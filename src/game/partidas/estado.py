@@ -0,0 +1,241 @@
+"""
+Estado en memoria de las partidas en curso.
+
+Una partida viva tiene menos de 100 cartas y a lo sumo 6 jugadores, asi que
+entra entera en memoria. EstadoPartida es una foto compacta (registros con
+__slots__ y pilas ya ordenadas) de lo ultimo que se confirmo en la base;
+las lecturas (turno, mazo, descarte, draft) la consultan en lugar de volver
+a armar la partida con varias consultas por request.
+
+La base sigue siendo la fuente de verdad: las escrituras pasan por el ORM y
+se confirman de a una accion por vez (ver unidad_de_trabajo). Cada commit
+que toca una partida invalida su foto, que se vuelve a armar desde la base
+en la siguiente lectura (lo mismo pasa al reiniciar el proceso). Mientras
+una sesion tiene cambios sin confirmar, sus lecturas van directo a la base
+para ver sus propias escrituras.
+
+Las validaciones de reglas no usan la foto: necesitan la partida, el
+jugador y sus cartas como objetos de la sesion y las resuelve el contexto
+por request (ver game.partidas.contexto), que no depende de este setting.
+
+Supone un unico proceso escribiendo en la base (ya es asi por el manejo de
+websockets), por eso ESTADO_EN_MEMORIA viene apagado: se prende solo en
+un despliegue de un proceso. Apagado, los listeners de abajo solo marcan
+que la sesion escribio (lo usa el contexto), sin averiguar que partidas
+toco ni invalidar fotos.
+"""
+import json
+import threading
+from weakref import WeakKeyDictionary
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from settings import settings
+from game.partidas.models import Partida, VotacionEvento
+from game.jugadores.models import Jugador
+from game.cartas.models import Carta, SetJugado
+
+
+class CartaEstado:
+    __slots__ = ("id", "id_carta", "nombre", "tipo", "ubicacion", "jugador_id",
+                 "bocaArriba", "orden_mazo", "orden_descarte")
+
+    def __init__(self, fila):
+        for campo in self.__slots__:
+            setattr(self, campo, getattr(fila, campo))
+
+
+class JugadorEstado:
+    __slots__ = ("id", "nombre", "desgracia_social")
+
+    def __init__(self, fila):
+        for campo in self.__slots__:
+            setattr(self, campo, getattr(fila, campo))
+
+
+class EstadoPartida:
+    """Foto inmutable de una partida tal como quedo en el ultimo commit."""
+    __slots__ = ("id", "nombre", "iniciada", "cantJugadores", "turno_id", "orden_turnos",
+                 "accion_en_progreso", "cartas_mazo_robo", "jugadores", "cartas", "mazo_robo", "descarte",
+                 "draft")
+
+    @classmethod
+    def cargar(cls, db, id_partida: int):
+        """Arma el estado con tres consultas; devuelve None si la partida no existe."""
+        partida = db.execute(
+            select(Partida.id, Partida.nombre, Partida.iniciada, Partida.cantJugadores,
+                   Partida.turno_id, Partida.ordenTurnos, Partida.accion_en_progreso,
+                   Partida.cartas_mazo_robo)
+            .where(Partida.id == id_partida)
+        ).first()
+        if partida is None:
+            return None
+        jugadores = db.execute(
+            select(Jugador.id, Jugador.nombre, Jugador.desgracia_social)
+            .where(Jugador.partida_id == id_partida)
+        ).all()
+        cartas = db.execute(
+            select(*(getattr(Carta, campo) for campo in CartaEstado.__slots__))
+            .where(Carta.partida_id == id_partida)
+        ).all()
+
+        estado = cls()
+        estado.id = partida.id
+        estado.nombre = partida.nombre
+        estado.iniciada = partida.iniciada
+        estado.cantJugadores = partida.cantJugadores
+        estado.turno_id = partida.turno_id
+        estado.orden_turnos = tuple(json.loads(partida.ordenTurnos)) if partida.ordenTurnos else ()
+        estado.accion_en_progreso = partida.accion_en_progreso
+        estado.cartas_mazo_robo = partida.cartas_mazo_robo
+        estado.jugadores = {j.id: JugadorEstado(j) for j in jugadores}
+        estado.cartas = {c.id: CartaEstado(c) for c in cartas}
+
+        por_ubicacion = {}
+        for carta in estado.cartas.values():
+            por_ubicacion.setdefault(carta.ubicacion, []).append(carta)
+        estado.mazo_robo = tuple(sorted(por_ubicacion.get("mazo_robo", ()), key=lambda c: (c.orden_mazo is None, c.orden_mazo, c.id)))
+        # el tope del descarte primero, como obtener_cartas_descarte
+        estado.descarte = tuple(sorted(por_ubicacion.get("descarte", ()), key=lambda c: c.orden_descarte or 0, reverse=True))
+        estado.draft = tuple(sorted(por_ubicacion.get("draft", ()), key=lambda c: c.id))
+        return estado
+
+    def cantidad_mazo(self) -> int:
+        # contador de la partida (ver game.partidas.pilas)
+        return self.cartas_mazo_robo or 0
+
+    def tope_descarte(self, cantidad: int) -> list[CartaEstado]:
+        return list(self.descarte[:cantidad])
+
+
+_TODAS = None  # marca de "no se sabe que partida se toco"
+
+
+class RegistroEstados:
+    """
+    Fotos de partidas por engine (cada engine es una base distinta) y por id.
+    Lleva una generacion por partida para no guardar una foto armada antes
+    de un commit que la invalido mientras se estaba leyendo.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_engine = WeakKeyDictionary()
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+
+    def _datos(self, engine) -> dict:
+        datos = self._por_engine.get(engine)
+        if datos is None:
+            datos = self._por_engine[engine] = {"estados": {}, "generacion": {}, "global": 0}
+        return datos
+
+    def obtener(self, db, id_partida: int):
+        """Devuelve el EstadoPartida o None si hay que leer de la base."""
+        if not settings.ESTADO_EN_MEMORIA or not isinstance(db, Session) or _tiene_cambios(db):
+            return None
+        engine = db.get_bind()
+        with self._lock:
+            datos = self._datos(engine)
+            estado = datos["estados"].get(id_partida)
+            if estado is not None:
+                self.aciertos += 1
+                return estado
+            self.fallos += 1
+            generacion = (datos["global"], datos["generacion"].get(id_partida, 0))
+
+        estado = EstadoPartida.cargar(db, id_partida)
+        if estado is not None:
+            with self._lock:
+                if (datos["global"], datos["generacion"].get(id_partida, 0)) == generacion:
+                    datos["estados"][id_partida] = estado
+        return estado
+
+    def invalidar(self, engine, ids_partidas=_TODAS):
+        with self._lock:
+            datos = self._datos(engine)
+            self.invalidaciones += 1
+            if ids_partidas is _TODAS:
+                datos["estados"].clear()
+                datos["global"] += 1
+                return
+            for id_partida in ids_partidas:
+                datos["estados"].pop(id_partida, None)
+                datos["generacion"][id_partida] = datos["generacion"].get(id_partida, 0) + 1
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "partidas_en_memoria": sum(len(d["estados"]) for d in self._por_engine.values()),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "invalidaciones": self.invalidaciones,
+            }
+
+
+registro_estados = RegistroEstados()
+
+
+def obtener_estado(db, id_partida: int):
+    """Atajo para registro_estados.obtener."""
+    return registro_estados.obtener(db, id_partida)
+
+
+# --- seguimiento de las partidas modificadas por cada sesion ---
+
+def _tiene_cambios(db) -> bool:
+    return "partidas_modificadas" in db.info or bool(db.new or db.dirty or db.deleted)
+
+
+def _marcar(session, ids):
+    actuales = session.info.get("partidas_modificadas", set())
+    if actuales is _TODAS or ids is _TODAS:
+        session.info["partidas_modificadas"] = _TODAS
+    else:
+        session.info["partidas_modificadas"] = actuales | set(ids)
+
+
+def partidas_de(obj) -> set:
+    """Partidas a las que afecta un cambio sobre este objeto del ORM."""
+    if isinstance(obj, Partida):
+        return {obj.id}
+    if isinstance(obj, (Carta, Jugador, SetJugado, VotacionEvento)):
+        # una carta o un jugador pueden cambiar de partida: contar la de antes tambien
+        historial = inspect(obj).attrs.partida_id.history
+        return {i for i in (*historial.added, *historial.unchanged, *historial.deleted) if i is not None}
+    return set()
+
+
+@event.listens_for(Session, "before_flush")
+def _registrar_cambios_orm(session, flush_context, instances):
+    if not settings.ESTADO_EN_MEMORIA:
+        if session.new or session.dirty or session.deleted:
+            _marcar(session, _TODAS)
+        return
+    ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        ids |= partidas_de(obj)
+    if ids:
+        _marcar(session, ids)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _registrar_sentencias_masivas(orm_execute_state):
+    # INSERT/UPDATE/DELETE masivos no pasan por el flush; si no dicen a que
+    # partidas afectan (execution_options(partidas=...)) se invalidan todas
+    if not orm_execute_state.is_select:
+        partidas = orm_execute_state.execution_options.get("partidas", _TODAS) if settings.ESTADO_EN_MEMORIA else _TODAS
+        _marcar(orm_execute_state.session, partidas)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_al_confirmar(session):
+    if "partidas_modificadas" not in session.info:
+        return
+    ids = session.info.pop("partidas_modificadas")
+    if settings.ESTADO_EN_MEMORIA:
+        registro_estados.invalidar(session.get_bind(), ids)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_al_revertir(session, previous_transaction):
+    session.info.pop("partidas_modificadas", None)
@@ -1,7 +1,8 @@
 """Modelo Partida"""
-from sqlalchemy import Column, Integer, String, Boolean, JSON, ForeignKey, PrimaryKeyConstraint
+from sqlalchemy import Column, Integer, String, Boolean, JSON, ForeignKey, PrimaryKeyConstraint, DateTime, LargeBinary
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from typing import List
+from datetime import datetime
 from game.modelos.db import Base
  
 class Partida(Base):
@@ -23,6 +24,25 @@ class Partida(Base):
     
     votacion_activa: Mapped[bool] = mapped_column(Boolean, default=False)
 
+    # Version optimista: se incrementa una vez por cada transaccion que modifica
+    # la partida (ver game.partidas.version) y el UPDATE verifica la anterior
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
+
+    # Contadores de las pilas y ordenes del tope, mantenidos en la misma
+    # transaccion que cada movimiento de cartas (ver game.partidas.pilas).
+    # cartas_mazo_robo queda en None hasta que se arma el mazo: None es "no se sabe", no "vacio"
+    cartas_mazo_robo: Mapped[int] = mapped_column(Integer, nullable=True)
+    cartas_descarte: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    orden_tope_mazo: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")  # <= menor orden_mazo
+    orden_tope_descarte: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")  # >= mayor orden_descarte
+
+    # Quien tiene el secreto del asesino y el del complice y si ya se revelaron,
+    # mantenidos al mover esos secretos (ver game.partidas.victoria)
+    asesino_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    complice_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    asesino_revelado: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, server_default="0")
+    complice_revelado: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, server_default="0")
+
     # Relación de 1 a muchos con Jugador
     jugadores: Mapped[List["Jugador"]] = relationship("Jugador", back_populates="partida")
 
@@ -34,6 +54,8 @@ class Partida(Base):
                                                         back_populates="partida",
                                                         cascade="all, delete-orphan"
                                                                     )
+
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
     
 class VotacionEvento(Base):
     __tablename__ = "votaciones_evento"
@@ -46,4 +68,20 @@ class VotacionEvento(Base):
 
     __table_args__ = (
         PrimaryKeyConstraint('partida_id', 'votante_id', name='pk_votacion_evento'),
-    )
\ No newline at end of file
+    )
+
+
+class PartidaHistorial(Base):
+    """
+    Resumen archivado de una partida terminada. El estado final (jugadores, cartas,
+    sets) se guarda como JSON comprimido con zlib para que no ocupe las tablas de juego.
+    """
+    __tablename__ = "partidas_historial"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    partida_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    nombre: Mapped[str] = mapped_column(String, nullable=False)
+    finalizada_en: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    asesino_gano: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    ganadores: Mapped[list] = mapped_column(JSON, nullable=False)  # ids de los jugadores ganadores
+    estado_final: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
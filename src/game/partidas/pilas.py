@@ -0,0 +1,175 @@
+"""
+Contadores del mazo de robo y del descarte guardados en la fila de la partida.
+
+Partida lleva la cantidad de cartas de cada pila y los ordenes del tope
+(orden_tope_mazo es menor o igual que cualquier orden_mazo, y
+orden_tope_descarte mayor o igual que cualquier orden_descarte). Asi, poner
+una carta arriba de una pila o contar sus cartas no necesita MAX/MIN/COUNT
+sobre cartas: alcanza con la partida, que casi siempre ya esta en la sesion.
+
+Los contadores se actualizan en el before_flush, en la misma transaccion
+que el movimiento, mirando el historial de ubicacion de cada Carta que
+cambia. Las cartas insertadas con un INSERT masivo (preparar_cartas_partida)
+no pasan por el flush: quien las inserta fija los contadores, igual que
+mover_cartas para los UPDATE masivos.
+"""
+from sqlalchemy import case, event, inspect, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from game.partidas.models import Partida
+from game.cartas.models import Carta
+from game.cartas.enums import UbicacionCarta
+
+MAZO_ROBO = "mazo_robo"
+DESCARTE = "descarte"
+_CONTADORES = {MAZO_ROBO: "cartas_mazo_robo", DESCARTE: "cartas_descarte"}
+_SEGUIDOS = ("partida_id", "ubicacion", "orden_mazo", "orden_descarte")
+
+
+def reservar_orden_descarte(db, id_partida: int, cantidad: int = 1) -> range:
+    """
+    Ordenes para `cantidad` cartas que se apilan arriba del descarte, de la
+    primera que se apoya a la que queda en el tope.
+    """
+    partida = db.get(Partida, id_partida)
+    inicio = partida.orden_tope_descarte + 1
+    partida.orden_tope_descarte += cantidad
+    return range(inicio, inicio + cantidad)
+
+
+def reservar_orden_tope_mazo(db, id_partida: int, cantidad: int = 1) -> range:
+    """
+    Ordenes para `cantidad` cartas que se ponen arriba del mazo de robo, de la
+    primera que se apoya a la que queda en el tope (se roba primero).
+    """
+    partida = db.get(Partida, id_partida)
+    inicio = partida.orden_tope_mazo - 1
+    partida.orden_tope_mazo -= cantidad
+    return range(inicio, inicio - cantidad, -1)
+
+
+def mover_cartas(db, cartas: list[Carta], ubicacion: str = None, **columnas) -> int:
+    """
+    Actualiza varias cartas con un unico UPDATE ... WHERE id IN (...).
+
+    Cada valor de `columnas` es comun a todas las cartas o un dict
+    id de carta -> valor (se arma un CASE sobre el id). Ajusta los contadores
+    de pilas de las partidas afectadas y deja las cartas de la sesion con los
+    valores nuevos, sin volver a leerlas. Devuelve la cantidad de cartas.
+    """
+    if not cartas:
+        return 0
+    if ubicacion is not None:
+        columnas["ubicacion"] = UbicacionCarta(ubicacion)
+    # cambios pendientes de estas cartas se escriben antes que el UPDATE
+    db.flush()
+
+    def valor_de(carta, nombre):
+        valor = columnas[nombre]
+        return valor.get(carta.id) if isinstance(valor, dict) else valor
+
+    movimientos = {}
+    partidas = set()
+    for carta in cartas:
+        antes = (carta.partida_id, carta.ubicacion)
+        ahora = (valor_de(carta, "partida_id") if "partida_id" in columnas else carta.partida_id,
+                 columnas["ubicacion"] if ubicacion is not None else carta.ubicacion)
+        partidas.update(p for p in (antes[0], ahora[0]) if p)
+        if antes != ahora:
+            for (id_partida, pila), delta in ((antes, -1), (ahora, +1)):
+                if id_partida and pila in _CONTADORES:
+                    movimientos[(id_partida, pila)] = movimientos.get((id_partida, pila), 0) + delta
+
+    valores = {
+        nombre: case(valor, value=Carta.id, else_=getattr(Carta, nombre)) if isinstance(valor, dict) else valor
+        for nombre, valor in columnas.items()
+    }
+    db.execute(
+        update(Carta)
+        .where(Carta.id.in_([carta.id for carta in cartas]))
+        .values(**valores)
+        .execution_options(synchronize_session=False, partidas=frozenset(partidas))
+    )
+    for carta in cartas:
+        for nombre in columnas:
+            set_committed_value(carta, nombre, valor_de(carta, nombre))
+
+    for (id_partida, pila), delta in movimientos.items():
+        partida = db.get(Partida, id_partida)
+        if partida is not None and delta:
+            atributo = _CONTADORES[pila]
+            setattr(partida, atributo, (getattr(partida, atributo) or 0) + delta)
+    return len(cartas)
+
+
+def _anterior_y_actual(estado, atributo):
+    historial = estado.attrs[atributo].history
+    if not historial.has_changes():
+        valor = estado.attrs[atributo].value
+        return valor, valor
+    anterior = historial.deleted[0] if historial.deleted else None
+    return anterior, historial.added[0] if historial.added else None
+
+
+def _partida_en_sesion(session, id_partida, nuevas):
+    if id_partida in nuevas:
+        return nuevas[id_partida]
+    partida = session.get(Partida, id_partida)
+    if partida is None or partida in session.deleted:
+        return None
+    return partida
+
+
+@event.listens_for(Session, "before_flush")
+def _actualizar_contadores(session, flush_context, instances):
+    movimientos = {}  # (id_partida, pila) -> delta
+    ordenes = {}      # id_partida -> [ordenes_mazo, ordenes_descarte] asignados
+
+    def mover(id_partida, ubicacion, delta):
+        if id_partida and ubicacion in _CONTADORES:
+            clave = (id_partida, ubicacion)
+            movimientos[clave] = movimientos.get(clave, 0) + delta
+
+    for carta in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(carta, Carta):
+            continue
+        estado = inspect(carta)
+        if carta in session.new:
+            partida_antes = ubicacion_antes = None
+            partida_ahora, ubicacion_ahora = carta.partida_id, carta.ubicacion
+        elif carta in session.deleted:
+            partida_antes, ubicacion_antes = carta.partida_id, carta.ubicacion
+            partida_ahora = ubicacion_ahora = None
+        elif any(estado.attrs[a].history.has_changes() for a in _SEGUIDOS):
+            partida_antes, partida_ahora = _anterior_y_actual(estado, "partida_id")
+            ubicacion_antes, ubicacion_ahora = _anterior_y_actual(estado, "ubicacion")
+        else:
+            continue  # cambio en otras columnas (bocaArriba, jugador_id...)
+        if (partida_antes, ubicacion_antes) != (partida_ahora, ubicacion_ahora):
+            mover(partida_antes, ubicacion_antes, -1)
+            mover(partida_ahora, ubicacion_ahora, +1)
+        if partida_ahora:
+            # ordenes puestos a mano (tests) tambien corren el tope
+            asignados = ordenes.setdefault(partida_ahora, ([], []))
+            if carta.orden_mazo is not None:
+                asignados[0].append(carta.orden_mazo)
+            if carta.orden_descarte is not None:
+                asignados[1].append(carta.orden_descarte)
+
+    if not movimientos and not ordenes:
+        return
+    nuevas = {p.id: p for p in session.new if isinstance(p, Partida) and p.id is not None}
+    with session.no_autoflush:
+        for (id_partida, ubicacion), delta in movimientos.items():
+            partida = _partida_en_sesion(session, id_partida, nuevas)
+            if partida is not None and delta:
+                atributo = _CONTADORES[ubicacion]
+                setattr(partida, atributo, (getattr(partida, atributo) or 0) + delta)
+        for id_partida, (ordenes_mazo, ordenes_descarte) in ordenes.items():
+            partida = _partida_en_sesion(session, id_partida, nuevas)
+            if partida is None:
+                continue
+            if ordenes_mazo and min(ordenes_mazo) < (partida.orden_tope_mazo or 0):
+                partida.orden_tope_mazo = min(ordenes_mazo)
+            if ordenes_descarte and max(ordenes_descarte) > (partida.orden_tope_descarte or 0):
+                partida.orden_tope_descarte = max(ordenes_descarte)
@@ -0,0 +1,152 @@
+"""
+Cache de quien es el asesino y quien el complice en cada partida.
+
+Los roles quedan fijos en el reparto y solo cambian cuando se mueve uno de
+esos dos secretos (robar_secreto, And then there was one more...). La cache
+se llena al confirmar el reparto (preparar_cartas_partida) y cada commit que
+cambia el dueño de un secreto de rol, o que elimina la partida, descarta la
+entrada de esa partida; la siguiente consulta la rearma leyendo
+Partida.asesino_id / complice_id (ver game.partidas.victoria), sin buscar
+cartas. Revelar u ocultar un secreto no cambia los roles.
+
+Como el estado en memoria, supone un unico proceso escribiendo en la base y
+solo se usa con ESTADO_EN_MEMORIA; apagado, cada consulta lee las columnas
+de la partida (y cuenta como fallo).
+"""
+import threading
+from weakref import WeakKeyDictionary
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from settings import settings
+from game.partidas.models import Partida
+from game.cartas.models import Carta
+from game.cartas.catalogo import IDS_ROLES_ASESINOS
+from game.partidas.estado import _tiene_cambios
+
+_SEGUIDOS = ("id_carta", "partida_id", "jugador_id", "ubicacion")
+
+
+def _roles(asesino_id, complice_id) -> dict:
+    return {"asesino-id": asesino_id, "complice-id": complice_id}
+
+
+def _leer(db, id_partida: int) -> dict | None:
+    partida = db.get(Partida, id_partida)
+    return _roles(partida.asesino_id, partida.complice_id) if partida is not None else None
+
+
+class RegistroRoles:
+    """Roles por engine y por partida, con contadores de aciertos."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_engine = WeakKeyDictionary()
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+
+    def _datos(self, engine) -> dict:
+        datos = self._por_engine.get(engine)
+        if datos is None:
+            datos = self._por_engine[engine] = {"roles": {}, "generacion": {}}
+        return datos
+
+    def obtener(self, db, id_partida: int) -> dict | None:
+        """{"asesino-id", "complice-id"} de la partida, o None si no existe."""
+        if not settings.ESTADO_EN_MEMORIA:
+            with self._lock:
+                self.fallos += 1
+            return _leer(db, id_partida)
+        if not isinstance(db, Session) or _tiene_cambios(db):
+            return _leer(db, id_partida)
+        engine = db.get_bind()
+        with self._lock:
+            datos = self._datos(engine)
+            roles = datos["roles"].get(id_partida)
+            if roles is not None:
+                self.aciertos += 1
+                return dict(roles)
+            self.fallos += 1
+            generacion = datos["generacion"].get(id_partida, 0)
+
+        roles = _leer(db, id_partida)
+        if roles is None:
+            return None
+        with self._lock:
+            if datos["generacion"].get(id_partida, 0) == generacion:
+                datos["roles"][id_partida] = roles
+        return dict(roles)
+
+    def guardar(self, engine, id_partida: int, roles: dict):
+        with self._lock:
+            self._datos(engine)["roles"][id_partida] = dict(roles)
+
+    def invalidar(self, engine, ids_partidas):
+        with self._lock:
+            datos = self._datos(engine)
+            self.invalidaciones += 1
+            for id_partida in ids_partidas:
+                datos["roles"].pop(id_partida, None)
+                datos["generacion"][id_partida] = datos["generacion"].get(id_partida, 0) + 1
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "partidas_en_cache": sum(len(d["roles"]) for d in self._por_engine.values()),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else None,
+                "invalidaciones": self.invalidaciones,
+            }
+
+
+registro_roles = RegistroRoles()
+
+
+def roles_partida(db, id_partida: int) -> dict | None:
+    """Atajo para registro_roles.obtener."""
+    return registro_roles.obtener(db, id_partida)
+
+
+def publicar_roles(db, id_partida: int, asesino_id: int, complice_id: int | None):
+    """Roles del reparto; entran en la cache cuando se confirma la transaccion."""
+    db.info.setdefault("roles_repartidos", {})[id_partida] = _roles(asesino_id, complice_id)
+
+
+def invalidar_roles(db, id_partida: int):
+    """Descarta los roles de la partida cuando se confirme la transaccion."""
+    db.info.setdefault("roles_modificados", set()).add(id_partida)
+
+
+@event.listens_for(Session, "before_flush")
+def _registrar_movimientos_de_roles(session, flush_context, instances):
+    for carta in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(carta, Carta) or carta.id_carta not in IDS_ROLES_ASESINOS:
+            continue
+        estado = inspect(carta)
+        if carta in session.dirty and not any(estado.attrs[a].history.has_changes() for a in _SEGUIDOS):
+            continue  # solo se revelo u oculto
+        historial = estado.attrs.partida_id.history
+        for id_partida in (*historial.added, *historial.unchanged, *historial.deleted):
+            if id_partida:
+                invalidar_roles(session, id_partida)
+
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_al_confirmar(session):
+    modificados = session.info.pop("roles_modificados", set())
+    repartidos = session.info.pop("roles_repartidos", {})
+    if not settings.ESTADO_EN_MEMORIA:
+        return
+    engine = session.get_bind()
+    if modificados:
+        registro_roles.invalidar(engine, modificados)
+    for id_partida, roles in repartidos.items():
+        if id_partida not in modificados:
+            registro_roles.guardar(engine, id_partida, roles)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_al_revertir(session, previous_transaction):
+    session.info.pop("roles_modificados", None)
+    session.info.pop("roles_repartidos", None)
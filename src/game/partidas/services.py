@@ -1,19 +1,26 @@
 from typing import List, Optional
 from fastapi import HTTPException, status
 from game.partidas.dtos import PartidaDTO
-from game.partidas.models import Partida, VotacionEvento
+from game.partidas.models import Partida, VotacionEvento, PartidaHistorial
 from game.jugadores.models import Jugador
 from game.jugadores.schemas import JugadorDTO
 import random
 from game.cartas.services import CartaService
-from game.cartas.models import Carta
+from game.cartas.models import Carta, SetJugado, SetJugadoCarta
+from game.cartas.catalogo import ID_ASESINO, IDS_ROLES_ASESINOS
+from game.partidas.estado import obtener_estado
+from game.partidas.victoria import ASESINO_GANA, evaluar
+from game.partidas.roles import invalidar_roles
+from game.partidas.version import olvidar_version
+from game.partidas.contexto import opciones_de_carga
 from game.cartas.services import JugadorService
 from typing import List, Dict, Any
 import logging
 from sqlalchemy.orm.attributes import flag_modified
 from datetime import date
 import json
-from sqlalchemy import func
+import zlib
+from sqlalchemy import func, or_, select
 
 
 logger = logging.getLogger(__name__)
@@ -49,7 +56,6 @@ class PartidaService:
         )
         self._db.add(nueva_partida)
         self._db.flush()
-        self._db.commit()
         self._db.refresh(nueva_partida)
         return nueva_partida
 
@@ -57,11 +63,11 @@ class PartidaService:
     def asignar_anfitrion(self, partida: Partida, id_jugador: int):
         partida.anfitrionId = id_jugador
         partida.cantJugadores += 1
-        self._db.commit()
+        self._db.flush()
         self._db.refresh(partida)
 
 
-    def obtener_por_id(self, id_partida: int) -> Partida:
+    def obtener_por_id(self, id_partida: int, perfil: str = None) -> Partida:
         """
         Obtiene una partida por su ID.
         
@@ -69,13 +75,18 @@ class PartidaService:
         ----------
         id_partida: int
             ID de la partida a obtener
+
+        perfil: str
+            Perfil de carga de sus relaciones (LOBBY, EN_JUEGO o CIERRE, ver
+            game.partidas.contexto); por defecto se cargan a demanda
         
         Returns
         -------
         Partida
             La partida obtenida
         """
-        partida = self._db.query(Partida).filter(Partida.id == id_partida).first()
+        # si ya esta en la sesion (p. ej. cargada por el contexto del request) no consulta
+        partida = self._db.get(Partida, id_partida, options=opciones_de_carga(perfil))
         if not partida:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -99,6 +110,20 @@ class PartidaService:
                 .all())
 
 
+    def contar_en_curso(self) -> int:
+        """
+        Cuenta las partidas iniciadas (las terminadas se eliminan).
+
+        Returns
+        -------
+        int
+            cantidad de partidas en curso
+        """
+        return self._db.execute(
+            select(func.count(Partida.id)).where(Partida.iniciada == True)
+        ).scalar_one()
+
+
     # servicio unir jugador a partida
     def unir_jugador(self, id_partida, jugador_creado: Jugador):
         """
@@ -117,7 +142,7 @@ class PartidaService:
             # uso crear jugador del servicio jugador
             self._db.add(jugador)
             partida.cantJugadores += 1
-            self._db.commit()
+            self._db.flush()
             self._db.refresh(partida)
         else:
             raise HTTPException(
@@ -158,12 +183,15 @@ class PartidaService:
                 )
             
         partida.iniciada = True
-        self._db.commit()
+        self._db.flush()
         self._db.refresh(partida)
         return partida
 
 
     def obtener_turno_actual(self, id_partida) -> int:
+        estado = obtener_estado(self._db, id_partida)
+        if estado is not None:
+            return estado.turno_id
         partida = PartidaService(self._db).obtener_por_id(id_partida)
         if not partida:
             raise HTTPException(
@@ -177,7 +205,7 @@ class PartidaService:
     def set_turno_actual(self, id_partida: int, id_jugador: int):
         partida = self.obtener_por_id(id_partida)
         partida.turno_id = id_jugador
-        self._db.commit()
+        self._db.flush()
         self._db.refresh(partida)
         return id_jugador
 
@@ -244,7 +272,7 @@ class PartidaService:
         for jugador in jugadores_copy:
             orden_de_turnos.append(jugador.id)
         partida.ordenTurnos = json.dumps(orden_de_turnos)
-        self._db.commit()
+        self._db.flush()
         self._db.refresh(partida)
         return orden_de_turnos
 
@@ -287,7 +315,7 @@ class PartidaService:
                 # Pasar una copia para evitar que el método mutile la lista que usamos para responder
                 ids_para_respuesta = list(ids_a_tomar)
                 carta_service.tomar_cartas_draft(id_partida, id_jugador, list(ids_a_tomar))
-                cartas_del_draft_objs = [carta_service.obtener_carta(cid) for cid in ids_para_respuesta]
+                cartas_del_draft_objs = [carta_service.obtener_carta(cid, id_partida) for cid in ids_para_respuesta]
                 logger.info(
                     "RECOGER DRAFT: partida=%s jugador=%s tomados=%s",
                     id_partida, id_jugador, ids_para_respuesta,
@@ -306,11 +334,9 @@ class PartidaService:
             )
         
         #Descarto la carta de evento jugada en el turno (si la hay, sino no hago nada).
-        CartaService(self._db).descartar_eventos(id_partida, id_jugador)
+        carta_service.descartar_eventos(id_partida, id_jugador)
         
         # Actualizo el turno y el draft
-        CartaService(self._db).descartar_eventos(id_partida, id_jugador)
-        
         nuevo_turno_id = self.avanzar_turno(id_partida)
         carta_service.actualizar_mazo_draft(id_partida)
 
@@ -334,32 +360,20 @@ class PartidaService:
         }
 
 
-    def desgracia_social(self, id_jugador: int, secretos: list[Carta]) -> bool:
-        if all(secreto.bocaArriba for secreto in secretos):
-                id_jugador.desgracia_social = True
-                self._db.commit()
-                self._db.refresh(id_jugador)
-        if any((secreto.bocaArriba == False) for secreto in secretos):
-                id_jugador.desgracia_social = False
-                self._db.commit()
-                self._db.refresh(id_jugador)
-        return id_jugador.desgracia_social
+    def desgracia_social(self, jugador: Jugador) -> bool:
+        """
+        Lectura sin efectos: el flag se mantiene al revelar, ocultar o mover
+        secretos (ver game.jugadores.secretos).
+        """
+        return jugador.desgracia_social
 
     def ganar_desgracia_social(self, partida: Partida) -> bool:
-        jugadores_en_desgracia = [jugador for jugador in partida.jugadores if jugador.desgracia_social]
-        if len(jugadores_en_desgracia) == len(partida.jugadores) - 1:
-            jugadores_no_desgracia = [jugador for jugador in partida.jugadores if not jugador.desgracia_social]
-
-            if len(jugadores_no_desgracia) == 1:
-                jugador_exento = jugadores_no_desgracia[0]
-                
-                secretos = CartaService(self._db).obtener_secretos_jugador(jugador_exento.id, partida.id)
-                for secreto in secretos:
-                    revelado = secreto.bocaArriba
-                    if (revelado is False) and (CartaService(self._db).es_asesino(secreto.id) or CartaService(self._db).es_complice(secreto.id)):
-                        return True
-
-        return False
+        """
+        True si todos los jugadores menos uno estan en desgracia social y ese
+        tiene oculto el secreto del asesino o del complice (ver game.partidas.victoria).
+        """
+        fin = evaluar(partida)
+        return fin is not None and fin.motivo == ASESINO_GANA
     
     def eliminar_partida(self, partida: Partida):
         """
@@ -371,13 +385,100 @@ class PartidaService:
                 Objeto Partida a ser eliminada de la base de datos
         """
         try:
+            invalidar_roles(self._db, partida.id)
+            olvidar_version(self._db, partida.id)
             self._db.delete(partida)
-            self._db.commit()
+            self._db.flush()
         except Exception as e:
-            self._db.rollback()
             raise ValueError(f"Error al eliminar la partida: {str(e)}")
 
 
+    def eliminar_partida_en_bloque(self, id_partida: int):
+        """
+        Borra una partida con sus jugadores, cartas, sets y votaciones usando
+        DELETEs por conjunto (una sentencia por tabla) en lugar de objeto por objeto.
+
+        Parameters
+        ----------
+            id_partida: int
+                ID de la partida a eliminar
+        """
+        self._db.flush()
+        invalidar_roles(self._db, id_partida)
+        olvidar_version(self._db, id_partida)
+
+        def en_bloque(modelo):
+            # solo esta partida: no invalida el estado en memoria de las demas
+            return self._db.query(modelo).execution_options(partidas=frozenset({id_partida}))
+
+        ids_jugadores = select(Jugador.id).where(Jugador.partida_id == id_partida).scalar_subquery()
+        en_bloque(VotacionEvento).filter(VotacionEvento.partida_id == id_partida).delete(synchronize_session="fetch")
+        ids_sets = select(SetJugado.id).where(SetJugado.partida_id == id_partida).scalar_subquery()
+        en_bloque(SetJugadoCarta).filter(SetJugadoCarta.set_id.in_(ids_sets)).delete(synchronize_session="fetch")
+        en_bloque(SetJugado).filter(SetJugado.partida_id == id_partida).delete(synchronize_session="fetch")
+        # Incluye las cartas que quedaron a nombre de un jugador fuera de la partida (partida_id=0)
+        en_bloque(Carta).filter(
+            or_(Carta.partida_id == id_partida, Carta.jugador_id.in_(ids_jugadores))
+        ).delete(synchronize_session="fetch")
+        en_bloque(Jugador).filter(Jugador.partida_id == id_partida).delete(synchronize_session="fetch")
+        en_bloque(Partida).filter(Partida.id == id_partida).delete(synchronize_session="fetch")
+
+
+    def archivar_partida(self, partida: Partida) -> PartidaHistorial:
+        """
+        Guarda en partidas_historial el estado final de una partida terminada
+        (jugadores, cartas y sets) como JSON comprimido, junto con los ganadores.
+
+        Los ganadores se deducen del estado final: si el secreto del asesino quedo
+        revelado ganan los detectives, si no ganan el asesino y su complice.
+        """
+        cartas = partida.cartas  # cargadas con el perfil CIERRE (ver eliminarPartida)
+        sets = self._db.query(SetJugado).filter(SetJugado.partida_id == partida.id).all()
+
+        ids_asesinos = {c.jugador_id for c in cartas if c.id_carta in IDS_ROLES_ASESINOS}
+        asesino_revelado = any(c.bocaArriba for c in cartas if c.id_carta == ID_ASESINO)
+        asesino_gano = not asesino_revelado
+        ganadores = [j.id for j in partida.jugadores if (j.id in ids_asesinos) == asesino_gano]
+
+        estado = {
+            "partida": {"id": partida.id, "nombre": partida.nombre, "anfitrionId": partida.anfitrionId,
+                        "ordenTurnos": partida.ordenTurnos, "turno_id": partida.turno_id},
+            "jugadores": [{"id": j.id, "nombre": j.nombre, "fecha_nacimiento": j.fecha_nacimiento.isoformat(),
+                           "desgracia_social": j.desgracia_social} for j in partida.jugadores],
+            "cartas": [{"id_carta": c.id_carta, "nombre": c.nombre, "tipo": c.tipo, "ubicacion": c.ubicacion,
+                        "jugador_id": c.jugador_id, "bocaArriba": c.bocaArriba} for c in cartas],
+            "sets": [{"jugador_id": s.jugador_id, "representacion_id_carta": s.representacion_id_carta,
+                      "cartas_ids": s.cartas_ids} for s in sets],
+        }
+        historial = PartidaHistorial(
+            partida_id=partida.id,
+            nombre=partida.nombre,
+            asesino_gano=asesino_gano,
+            ganadores=ganadores,
+            estado_final=zlib.compress(json.dumps(estado, separators=(",", ":")).encode("utf-8")),
+        )
+        self._db.add(historial)
+        self._db.flush()
+        return historial
+
+
+    def obtener_historial(self, id_partida: int) -> Optional[dict]:
+        """
+        Devuelve la partida archivada con su estado final descomprimido, o None.
+        """
+        historial = self._db.query(PartidaHistorial).filter(PartidaHistorial.partida_id == id_partida).first()
+        if historial is None:
+            return None
+        return {
+            "partida_id": historial.partida_id,
+            "nombre": historial.nombre,
+            "finalizada_en": historial.finalizada_en,
+            "asesino_gano": historial.asesino_gano,
+            "ganadores": historial.ganadores,
+            "estado_final": json.loads(zlib.decompress(historial.estado_final)),
+        }
+
+
     def actualizar_cant_jugadores(self, id_partida: int) -> int:
         """
         Método para actualizar la cantidad de jugadores una partida dado su ID.
@@ -397,8 +498,10 @@ class PartidaService:
             if not partida:
                 raise ValueError("No se encontró la partida con ese ID")
             
-            partida.cantJugadores = len(partida.jugadores)
-            self._db.commit()
+            partida.cantJugadores = self._db.scalar(
+                select(func.count(Jugador.id)).where(Jugador.partida_id == id_partida)
+            )
+            self._db.flush()
 
             return partida.cantJugadores
         
@@ -409,7 +512,8 @@ class PartidaService:
     def obtener_partida_con_bloqueo(self, id_partida: int) -> Partida:
         """
         Obtiene una partida y la bloquea a nivel de BBDD (SELECT ... FOR UPDATE)
-        hasta que la transacción termine. Previene 'race conditions'.
+        hasta que la transacción termine. SQLite ignora el bloqueo: ahi las
+        acciones concurrentes de una partida las ordena el buzon (game.partidas.buzon).
         """
         partida = (
             self._db.query(Partida)
@@ -443,7 +547,7 @@ class PartidaService:
         if partida.accion_en_progreso:
             raise ValueError("Ya hay una acción en progreso.")
         partida.accion_en_progreso = accion_context
-        self._db.commit()
+        self._db.flush()
 
 
     def obtener_accion_en_progreso(self, id_partida: int) -> dict:
@@ -473,7 +577,7 @@ class PartidaService:
         accion_context["pila_respuestas"].append(carta_respuesta)
         partida.accion_en_progreso = accion_context
         flag_modified(partida, "accion_en_progreso")
-        self._db.commit()
+        self._db.flush()
         
         
     def limpiar_accion_en_progreso(self, id_partida: int):
@@ -483,13 +587,13 @@ class PartidaService:
         """
         partida = self.obtener_partida_con_bloqueo(id_partida)
         partida.accion_en_progreso = None
-        self._db.commit()
+        self._db.flush()
         
         
     def inicia_votacion(self, id_partida: int):
         partida = self.obtener_por_id(id_partida)
         partida.votacion_activa = True
-        self._db.commit()
+        self._db.flush()
         
         
     def registrar_voto(self, id_partida: int, id_votante: int, id_votado: int):
@@ -506,7 +610,7 @@ class PartidaService:
                               votado_id = id_votado
                               ) 
         self._db.add(voto)
-        self._db.commit()
+        self._db.flush()
         
     def numero_de_votos(self, id_partida: int):
         total_votos = self._db.query(VotacionEvento).filter_by(partida_id=id_partida).count()
@@ -529,10 +633,10 @@ class PartidaService:
     def borrar_votacion(self, id_partida: int):
         # Limpiar tabla de votos
         self._db.query(VotacionEvento).filter_by(partida_id=id_partida).delete()
-        self._db.commit()
+        self._db.flush()
     
     
     def fin_votacion(self, id_partida: int):
         partida = self.obtener_por_id(id_partida)
         partida.votacion_activa = False
-        self._db.commit()
\ No newline at end of file
+        self._db.flush()
\ No newline at end of file
@@ -2,17 +2,23 @@ from game.partidas.models import Partida, VotacionEvento
 from game.jugadores.models import Jugador
 from game.cartas.models import Carta, SetJugado
 from game.cartas.constants import *
+from game.cartas.catalogo import ID_ASESINO, ID_COMPLICE, es_carta
+from game.partidas.estado import obtener_estado
 from game.jugadores.schemas import JugadorOut
 from game.partidas.schemas import *
 from game.partidas.services import PartidaService
+from game.partidas.victoria import FinPartida, evaluar
+from game.partidas.roles import roles_partida
+from game.partidas.contexto import CIERRE, LOBBY, cargar_contexto
 from game.partidas.dtos import *
 from game.cartas.services import CartaService
 from game.jugadores.services import JugadorService
 from game.jugadores.services import *
 from fastapi import HTTPException, status
-from game.modelos.db import get_db
+from game.modelos.db import get_db, transaccional
 from datetime import date
 import json
+from settings import settings
 
 
 def listar_jugadores(partida: Partida) -> list[JugadorOut]:
@@ -35,6 +41,7 @@ def distancia_fechas(fecha: date) -> int:
     return dias_distancia
 
 
+@transaccional
 def crearPartida(partida_info: PartidaData, db) -> PartidaResponse:
     """
     Metodo para crear una partida
@@ -70,18 +77,12 @@ def crearPartida(partida_info: PartidaData, db) -> PartidaResponse:
         return PartidaResponse(id_partida=partida_creada.id, id_jugador=jugador_creado.id, id_Anfitrion=jugador_creado.id)
 
 
+@transaccional
 def iniciarPartida(id_partida: int, data: IniciarPartidaData, db):
     
     partida = PartidaService(db).iniciar(id_partida, data.id_jugador)
     try:
-        mazo_partida = CartaService(db).crear_mazo_inicial(id_partida)
-        
-        CartaService(db).repartir_cartas_iniciales(mazo_partida, partida.jugadores)
-        
-        CartaService(db).actualizar_mazo_draft(id_partida)
-        
-        secretos = CartaService(db).crear_secretos(id_partida)
-        CartaService(db).repartir_secretos(secretos, partida.jugadores)
+        CartaService(db).preparar_cartas_partida(id_partida, partida.jugadores)
         turnos = PartidaService(db).orden_turnos(id_partida, partida.jugadores)
         PartidaService(db).set_turno_actual(id_partida, turnos[0])
         
@@ -92,6 +93,7 @@ def iniciarPartida(id_partida: int, data: IniciarPartidaData, db):
         )
 
 
+@transaccional
 def unir_a_partida(id_partida: int, jugador_info, db) -> JugadorOut:
     partida = PartidaService(db).obtener_por_id(id_partida)
     if partida is None:
@@ -151,7 +153,9 @@ def mostrar_cartas_descarte(id_partida: int, id_jugador: int, cantidad:  int,  d
         )
         
     try:    
-        desde_mazo_descarte = CartaService(db).obtener_cartas_descarte(id_partida, cantidad)            
+        estado = obtener_estado(db, id_partida)
+        desde_mazo_descarte = (estado.tope_descarte(cantidad) if estado is not None
+                               else CartaService(db).obtener_cartas_descarte(id_partida, cantidad))
         cartas_de_descarte = [
             {"id": carta.id_carta, "nombre": carta.nombre}
             for carta in desde_mazo_descarte
@@ -166,7 +170,8 @@ def mostrar_cartas_descarte(id_partida: int, id_jugador: int, cantidad:  int,  d
 
 def mostrar_mazo_draft(id_partida: int, db):
     try:    
-        mazo_descarte = CartaService(db).obtener_mazo_draft(id_partida)            
+        estado = obtener_estado(db, id_partida)
+        mazo_descarte = estado.draft if estado is not None else CartaService(db).obtener_mazo_draft(id_partida)
         cartas = [
             {"id": carta.id_carta, "nombre": carta.nombre}
             for carta in mazo_descarte
@@ -198,22 +203,17 @@ def ids_asesino_complice(db, id_partida: int):
             Diccionario con ID de asesino y ID de cómplice en caso de 5 ó 6 jugadores
             {"asesino-id": id_asesino}  / {"asesino-id": id_asesino, "complice-id": id_complice} 
     """
-    partida = PartidaService(db).obtener_por_id(id_partida)
-    if partida.cantJugadores >=5:
-        carta_asesino = db.query(Carta).filter_by(partida_id=id_partida, tipo="secreto", nombre="murderer").first()
-        asesino_id = carta_asesino.jugador_id
-        carta_complice = db.query(Carta).filter_by(partida_id=id_partida, tipo="secreto", nombre="accomplice").first()
-        complice_id = carta_complice.jugador_id
-    
-        return {"asesino-id": asesino_id, "complice-id": complice_id}
-    
-    else:
-        carta_asesino = db.query(Carta).filter_by(partida_id=id_partida, tipo="secreto", nombre="murderer").first()
-        asesino_id = carta_asesino.jugador_id
-    
-        return {"asesino-id": asesino_id}
+    roles = roles_partida(db, id_partida)
+    if roles is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="No se encontró la partida con el ID proporcionado.")
+    # solo las partidas de 5 o 6 jugadores tienen complice
+    if roles["complice-id"] is not None:
+        return roles
+    return {"asesino-id": roles["asesino-id"]}
 
 
+@transaccional
 def robar_secreto(id_partida: int, id_jugador_turno: int, id_jugador_destino:  int, id_unico_secreto: int, db) -> dict:
     """
     Roba el secreto revelado de un jugador en una partida específica,
@@ -265,6 +265,7 @@ def robar_secreto(id_partida: int, id_jugador_turno: int, id_jugador_destino:  i
     return secreto_robado
 
 
+@transaccional
 def revelarSecreto(id_partida: int, id_jugador_turno: int, id_unico_secreto: int, db) -> Carta:
     """
     Revela el secreto de un jugador en una partida específica
@@ -306,6 +307,7 @@ def revelarSecreto(id_partida: int, id_jugador_turno: int, id_unico_secreto: int
     return secreto_revelado
 
 
+@transaccional
 def ocultarSecreto(id_partida: int, id_jugador_turno: int, id_unico_secreto: int, db) -> Carta:
     """
     Oculta el secreto de un jugador en una partida específica
@@ -349,8 +351,10 @@ def ocultarSecreto(id_partida: int, id_jugador_turno: int, id_unico_secreto: int
     return secreto_ocultado
 
 
+@transaccional
 def jugar_carta_evento(id_partida: int, id_jugador: int, id_carta: int, db) -> Carta:
-    
+    # partida, jugadores y sus cartas en dos consultas (ver game.partidas.contexto)
+    cargar_contexto(db, id_partida)
     partida = PartidaService(db).obtener_por_id(id_partida)
     if partida is None:
         raise ValueError(f"No se ha encontrado la partida con el ID:{id_partida}")
@@ -368,35 +372,16 @@ def jugar_carta_evento(id_partida: int, id_jugador: int, id_carta: int, db) -> C
     if jugador.partida_id != id_partida:
         raise ValueError(f"El jugador con ID {id_jugador} no pertenece a la partida {id_partida}.")
     
-    
-    if partida.iniciada == False:
-        raise ValueError(f"Partida no iniciada")
-    
-    jugador = JugadorService(db).obtener_jugador(id_jugador)
-    if jugador is None:
-        raise ValueError(f"No se encontro el jugador {id_jugador}.")
-    
-    if jugador.partida_id != id_partida:
-        raise ValueError(f"El jugador con ID {id_jugador} no pertenece a la partida {id_partida}.")
-    
-    if partida.turno_id != id_jugador:
-        raise ValueError(f"El jugador no esta en turno.")
-    
     desgracia_social = determinar_desgracia_social(id_partida, id_jugador, db)
     if desgracia_social:
         raise ValueError(f"El jugador {id_jugador} esta en desgracia social")
 
     cartas_mano = CartaService(db).obtener_mano_jugador(id_jugador, id_partida)
     
-    no_mas_eventos = CartaService(db).evento_jugado_en_turno(id_jugador)
-    
-    if no_mas_eventos == True:
-        raise ValueError(f"Solo se puede jugar una carta de evento por turno.")
+    no_mas_eventos = CartaService(db).evento_jugado_en_turno(id_jugador, id_partida)
     
-    print("Se verifica que no haya otro evento jugado en turno")
     if no_mas_eventos == True:
         raise ValueError(f"Solo se puede jugar una carta de evento por turno.")
-    print("Se verifico que no hay eventos jugados en el turno")
             
     en_mano = False
     for c in cartas_mano:
@@ -405,7 +390,7 @@ def jugar_carta_evento(id_partida: int, id_jugador: int, id_carta: int, db) -> C
     if en_mano == False:
         raise ValueError(f"La carta no se encuentra en la mano del jugador.")
     
-    carta_evento = CartaService(db).obtener_carta_de_mano(id_carta, id_jugador)
+    carta_evento = CartaService(db).obtener_carta_de_mano(id_carta, id_jugador, id_partida)
     
     if carta_evento.partida_id != id_partida:
         raise ValueError(f"La carta seleccionada no pertence a la partida")
@@ -415,7 +400,7 @@ def jugar_carta_evento(id_partida: int, id_jugador: int, id_carta: int, db) -> C
     else:
         carta_evento.ubicacion = "evento_jugado"
         carta_evento.bocaArriba = True
-        db.commit()
+        db.flush()
     db.refresh(carta_evento)
     
     return carta_evento
@@ -434,10 +419,7 @@ def verif_evento(evento: str, id_carta: int) -> bool:
         ID de representación de la carta
         (es decir, no el ID único, sino el usado para representar a todas las cartas del mismo tipo)
     """
-    carta = next((v for v in cartasDict.values() if v["id"] == id_carta), None)
-    if carta is None:
-        return False
-    return (evento == carta["carta"])
+    return es_carta(evento, id_carta)
 
 def verif_jugador_objetivo(id_partida: int, id_jugador: int, id_objetivo: int, db):
     jugador_objetivo = JugadorService(db).obtener_jugador(id_objetivo)
@@ -449,6 +431,7 @@ def verif_jugador_objetivo(id_partida: int, id_jugador: int, id_objetivo: int, d
         raise ValueError(f"El jugador al que se quiere aplicar el evento no pertence a la partida.")
     
 
+@transaccional
 def jugar_look_into_ashes(id_partida: int, id_jugador: int, id_carta_objetivo: int, db):
 
     carta_evento_jugada = CartaService(db).obtener_cartas_jugadas(id_partida,
@@ -479,6 +462,7 @@ def jugar_look_into_ashes(id_partida: int, id_jugador: int, id_carta_objetivo: i
         raise ValueError(f"No se puede aplicar el efecto.")
 
 
+@transaccional
 def revelarSecretoPropio(id_partida: int, id_jugador: int, id_unico_secreto: int, db) -> Carta:
     """
     Revela el secreto de un jugador en una partida específica
@@ -522,6 +506,7 @@ def revelarSecretoPropio(id_partida: int, id_jugador: int, id_unico_secreto: int
     return secreto_revelado
 
 
+@transaccional
 def abandonarPartida(id_partida: int, id_jugador: int, db) -> dict:
     """
     Se elimina el jugador de una partida dado su ID y el ID de la partida.
@@ -591,14 +576,20 @@ def abandonarPartida(id_partida: int, id_jugador: int, db) -> dict:
         raise ValueError(f"Hubo un error al abandonar la partida: {str(e)}")
 
 
-def eliminarPartida(id_partida: int, db):
-    partida = PartidaService(db).obtener_por_id(id_partida)
-    db.query(SetJugado).filter(SetJugado.partida_id == id_partida).delete()
-    for jugador in partida.jugadores:
-        JugadorService(db).eliminar_jugador(jugador)
-    for carta in partida.cartas:
-        CartaService(db).eliminar_carta(carta)
-    PartidaService(db).eliminar_partida(partida)
+@transaccional
+def eliminarPartida(id_partida: int, db, archivar: bool = None):
+    """
+    Elimina una partida terminada con todo lo que le pertenece. Si archivar
+    (por defecto settings.ARCHIVAR_PARTIDAS) y la partida estaba iniciada,
+    antes guarda su estado final en el historial.
+    """
+    if archivar is None:
+        archivar = settings.ARCHIVAR_PARTIDAS
+    # para archivar se recorren jugadores y cartas: se traen con la partida
+    partida = PartidaService(db).obtener_por_id(id_partida, perfil=CIERRE if archivar else None)
+    if archivar and partida.iniciada:
+        PartidaService(db).archivar_partida(partida)
+    PartidaService(db).eliminar_partida_en_bloque(id_partida)
 
 def verif_cantidad(id_partida: int, cantidad: int, db):
     if cantidad < 1 or cantidad > 5:
@@ -613,6 +604,7 @@ def validar_accion_evento(id_partida: int, id_jugador: int, id_carta: int, db) -
     Copia de 'jugar_carta_evento' que SÓLO VALIDA y no modifica la BBDD.
     Retorna el objeto Carta si es válido, o lanza ValueError si no.
     """
+    cargar_contexto(db, id_partida)
     partida = PartidaService(db).obtener_por_id(id_partida)
     if partida is None:
         raise ValueError(f"No se ha encontrado la partida con el ID:{id_partida}")
@@ -636,7 +628,7 @@ def validar_accion_evento(id_partida: int, id_jugador: int, id_carta: int, db) -
 
     cartas_mano = CartaService(db).obtener_mano_jugador(id_jugador, id_partida)
     
-    no_mas_eventos = CartaService(db).evento_jugado_en_turno(id_jugador)
+    no_mas_eventos = CartaService(db).evento_jugado_en_turno(id_jugador, id_partida)
     
     if no_mas_eventos == True:
         raise ValueError(f"Solo se puede jugar una carta de evento por turno.")
@@ -648,7 +640,7 @@ def validar_accion_evento(id_partida: int, id_jugador: int, id_carta: int, db) -
     if en_mano == False:
         raise ValueError(f"La carta no se encuentra en la mano del jugador.")
     
-    carta_evento = CartaService(db).obtener_carta_de_mano(id_carta, id_jugador)
+    carta_evento = CartaService(db).obtener_carta_de_mano(id_carta, id_jugador, id_partida)
     
     if carta_evento.partida_id != id_partida:
         raise ValueError(f"La carta seleccionada no pertence a la partida")
@@ -660,10 +652,12 @@ def validar_accion_evento(id_partida: int, id_jugador: int, id_carta: int, db) -
     return carta_evento
 
     
+@transaccional
 def votacion_activada(id_partida: int, db):
     PartidaService(db).inicia_votacion(id_partida)
 
     
+@transaccional
 def jugar_point_your_suspicions(id_partida: int, id_jugador: int, id_votante: int, id_votado: int, db): 
     ps = PartidaService(db)
     js = JugadorService(db)
@@ -710,6 +704,7 @@ def jugar_point_your_suspicions(id_partida: int, id_jugador: int, id_votante: in
         ps.borrar_votacion(id_partida)
         return sospechoso
 
+@transaccional
 def iniciar_accion_cancelable(id_partida: int, id_jugador: int, accion: AccionGenericaPayload, db):
     """
     Método encargado de guardar el estado de contexto de la partida,
@@ -739,6 +734,8 @@ def iniciar_accion_cancelable(id_partida: int, id_jugador: int, accion: AccionGe
          haberlo hecho sobre otro jugador, sobre qué otro jugador
 
     """
+    # el jugador y el objetivo salen del contexto, sin consultas aparte
+    cargar_contexto(db, id_partida, LOBBY)
     partida = PartidaService(db).obtener_por_id(id_partida)
     
     if partida is None:
@@ -799,6 +796,7 @@ def iniciar_accion_cancelable(id_partida: int, id_jugador: int, accion: AccionGe
     return accion_context, mensaje
 
 
+@transaccional
 def jugar_not_so_fast(id_partida: int, id_jugador: int, id_carta: int, db) -> dict:
     """
     Se encarga de jugar la carta Not So Fast.
@@ -820,7 +818,7 @@ def jugar_not_so_fast(id_partida: int, id_jugador: int, id_carta: int, db) -> di
     accion_context: dict
         diccionario con el contexto de acción de la partida. Lo más importante es la pila de cartas NSF
     """
-    
+    cargar_contexto(db, id_partida)
     partida = PartidaService(db).obtener_por_id(id_partida)
     
     if partida is None:
@@ -862,6 +860,7 @@ def jugar_not_so_fast(id_partida: int, id_jugador: int, id_carta: int, db) -> di
     return accion_context
 
 
+@transaccional
 def resolver_accion_turno(id_partida: int, db):
     """
     Resuelve la acción (o no) llevada a cabo en el turno en una partida específica
@@ -933,8 +932,8 @@ def resolver_accion_turno(id_partida: int, db):
 
 def determinar_desgracia_social(id_partida: int, id_jugador: int, db) -> bool:
     """
-    Recorre los secretos de un jugador y lo saca de estado de desgracia social o lo 
-    agrega al mismo.
+    Indica si un jugador esta en desgracia social. Solo lee: el estado se
+    actualiza cuando cambian sus secretos.
     
     Parameters
     ----------
@@ -953,22 +952,19 @@ def determinar_desgracia_social(id_partida: int, id_jugador: int, db) -> bool:
     jugador = JugadorService(db).obtener_jugador(id_jugador)
     if jugador is None:
         raise ValueError(f"No se ha encontrado al jugador con id:{id_jugador}")
-    secretos = CartaService(db).obtener_secretos_jugador(id_jugador, id_partida)
-    if secretos is None:
-        raise ValueError(f"No se ha encontrado los secretos del jugador{id_jugador} y la partida:{id_partida}")
-    desgracia_social = PartidaService(db).desgracia_social(jugador, secretos)
+    desgracia_social = PartidaService(db).desgracia_social(jugador)
     return desgracia_social
 
 
 def ganar_por_desgracia_social(id_partida: int, db) -> bool:
     """
-    Recorre todos los secretos de todos los jugadores vindo el estado de bocaArriba para
-    determinar el resultado.
+    Determina si el asesino gano por desgracia social: todos los jugadores menos
+    uno estan en desgracia social y ese tiene oculto el secreto del asesino o del complice.
     
     Parameters
 
     id_partida: int
-        ID de la partida para la cual se obtiene los secretos.
+        ID de la partida.
     
     Returns
     -------
@@ -980,6 +976,26 @@ def ganar_por_desgracia_social(id_partida: int, db) -> bool:
     return resultado
 
 
+def evaluar_fin_partida(id_partida: int, db) -> FinPartida | None:
+    """
+    Evalua las condiciones de fin de la partida despues de una accion confirmada:
+    secreto del asesino revelado, desgracia social de todos menos el asesino o su
+    complice, o mazo de robo agotado. Lee solo la partida y sus jugadores.
+
+    Parameters
+    ----------
+    id_partida: int
+        ID de la partida.
+
+    Returns
+    -------
+    FinPartida | None
+        Motivo, ganadores y si gano el asesino; None si la partida sigue
+        (o ya no existe).
+    """
+    return evaluar(db.get(Partida, id_partida))
+
+
 def obtener_jugador_por_id_carta(id_partida: int, id_carta: int, db) -> int:
     """
     Determina el id de un jugador mediante una carta dada.
@@ -1007,7 +1023,11 @@ def obtener_jugador_por_id_carta(id_partida: int, id_carta: int, db) -> int:
     return jugador
 
 
-def actualizar_set(payload: AgregarCartaSetPayload, db):
+@transaccional
+def actualizar_set(id_partida: int, payload: AgregarCartaSetPayload, db):
+        jugador = JugadorService(db).obtener_jugador(payload.id_jugador_set)
+        if jugador is None or jugador.partida_id != id_partida:
+            raise ValueError(f"El jugador con ID {payload.id_jugador_set} no pertenece a la partida {id_partida}.")
         set_actualizado = CartaService(db).agregar_carta_a_set(
                     id_jugador_set=payload.id_jugador_set, 
                     id_tipo_set=payload.id_tipo_set,
@@ -1020,6 +1040,7 @@ def actualizar_set(payload: AgregarCartaSetPayload, db):
 def enviar_mensaje(id_partida: int, id_jugador: int, mensaje: Mensaje, db):
     # try/except porque el servicio levanta una excepcion HTTP
     # y si lo cambio fallan tests
+    cargar_contexto(db, id_partida, LOBBY)
     try:
         partida = PartidaService(db).obtener_por_id(id_partida)
     except Exception as e:
@@ -1045,6 +1066,7 @@ def enviar_mensaje(id_partida: int, id_jugador: int, mensaje: Mensaje, db):
         raise ValueError("El nombre del jugador no coincide con el nombre del mensaje")
     
     return True
+@transaccional
 def enviar_carta(id_carta: int, id_objetivo: int, db):
     """
     funcion que llama al servicio para mover la carta
@@ -1077,7 +1099,7 @@ def verif_send_card(id_partida: int, id_carta: int, id_jugador: int, id_objetivo
 
 
     se_puede_enviar = False
-    
+    cargar_contexto(db, id_partida)
     partida = PartidaService(db).obtener_por_id(id_partida)
     if partida is None:
         raise ValueError(f"No se ha encontrado la partida con el ID:{id_partida}")
@@ -0,0 +1,94 @@
+"""
+Control de concurrencia optimista sobre Partida.
+
+Cada transaccion que toca una partida (la partida misma, sus cartas,
+jugadores, sets o votos) incrementa Partida.version una sola vez. Como
+`version` es el version_id_col del mapper, el UPDATE se emite con
+`WHERE id = ? AND version = <leida>`: si otro proceso confirmo antes, no
+actualiza ninguna fila, el ORM lanza StaleDataError y unidad_de_trabajo
+lo convierte en ConflictoDeVersion (409, reintentable).
+
+La ultima version confirmada de cada partida viaja en la cabecera
+X-Partida-Version de las respuestas y en el campo "version" de los
+eventos que se difunden por websocket.
+"""
+import json
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from game.partidas.models import Partida
+from game.partidas.estado import partidas_de
+
+CABECERA_VERSION = "X-Partida-Version"
+
+# id_partida -> ultima version confirmada por este proceso
+versiones_confirmadas: dict[int, int] = {}
+
+
+def version_conocida(id_partida) -> int | None:
+    try:
+        return versiones_confirmadas.get(int(id_partida))
+    except (TypeError, ValueError):
+        return None
+
+
+def agregar_version(id_partida: int, mensaje: str) -> str:
+    """Agrega "version" a un evento JSON de la partida (si no la trae ya)."""
+    version = version_conocida(id_partida)
+    if version is None:
+        return mensaje
+    try:
+        evento = json.loads(mensaje)
+    except (TypeError, ValueError):
+        return mensaje
+    if not isinstance(evento, dict) or "version" in evento:
+        return mensaje
+    evento["version"] = version
+    return json.dumps(evento)
+
+
+def _incrementar(session, tocadas):
+    incrementadas = session.info.setdefault("versiones_incrementadas", {})
+    with session.no_autoflush:
+        for id_partida in set(tocadas) - incrementadas.keys():
+            if not id_partida:
+                continue
+            partida = session.get(Partida, id_partida)
+            if partida is None or partida in session.new or partida in session.deleted:
+                continue
+            partida.version = (partida.version or 0) + 1
+            incrementadas[id_partida] = partida.version
+
+
+@event.listens_for(Session, "before_flush")
+def _incrementar_version(session, flush_context, instances):
+    tocadas = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tocadas |= partidas_de(obj)
+    _incrementar(session, tocadas)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _incrementar_version_masiva(orm_execute_state):
+    # los UPDATE masivos (ver pilas.mover_cartas) dicen a que partidas afectan
+    if not orm_execute_state.is_select:
+        _incrementar(orm_execute_state.session, orm_execute_state.execution_options.get("partidas", ()))
+
+
+def olvidar_version(db, id_partida: int):
+    """La partida se elimina: su version se olvida cuando se confirme la transaccion."""
+    info = getattr(db, "info", None)
+    if isinstance(info, dict):
+        info.setdefault("versiones_eliminadas", set()).add(id_partida)
+
+
+@event.listens_for(Session, "after_commit")
+def _registrar_versiones(session):
+    versiones_confirmadas.update(session.info.pop("versiones_incrementadas", {}))
+    for id_partida in session.info.pop("versiones_eliminadas", ()):
+        versiones_confirmadas.pop(id_partida, None)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_versiones(session, previous_transaction):
+    session.info.pop("versiones_incrementadas", None)
+    session.info.pop("versiones_eliminadas", None)
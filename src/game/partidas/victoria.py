@@ -0,0 +1,107 @@
+"""
+Condiciones de fin de partida.
+
+Partida guarda quien tiene el secreto del asesino y el del complice y si ya
+se revelaron (asesino_id, complice_id, asesino_revelado, complice_revelado).
+Se ajustan en el before_flush, en la misma transaccion en que esos secretos
+se revelan, se ocultan o cambian de dueño. Junto con Jugador.desgracia_social
+(game.jugadores.secretos) y Partida.cartas_mazo_robo (game.partidas.pilas)
+alcanza para decidir si la partida termino recorriendo solo sus jugadores,
+sin leer cartas.
+
+evaluar se llama una vez por accion confirmada; si devuelve un FinPartida el
+endpoint difunde mensaje_fin_partida, cierra las conexiones y elimina la
+partida. El reparto inicial entra con un INSERT masivo que no pasa por el
+flush: preparar_cartas_partida fija los roles.
+"""
+from dataclasses import dataclass
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from game.partidas.models import Partida
+from game.cartas.models import Carta
+from game.cartas.catalogo import ID_ASESINO, ID_COMPLICE
+
+ASESINO_GANA = "asesino-gana"          # todos menos uno en desgracia social y ese es asesino o complice
+DETECTIVES_GANAN = "detectives-ganan"  # se revelo el secreto del asesino
+MAZO_AGOTADO = "mazo-agotado"          # se termino el mazo de robo: gana el asesino
+
+_ROLES = {ID_ASESINO: ("asesino_id", "asesino_revelado"), ID_COMPLICE: ("complice_id", "complice_revelado")}
+_SEGUIDOS = ("id_carta", "partida_id", "jugador_id", "ubicacion", "bocaArriba")
+
+
+@dataclass(frozen=True)
+class FinPartida:
+    motivo: str
+    asesino_gano: bool
+    ganadores: list[int]
+    perdedor_id: int | None = None
+
+
+def fijar_rol(partida: Partida, id_carta: int, jugador_id: int | None, revelado: bool = False):
+    """Registra quien tiene el secreto de un rol (asesino o complice) y si esta revelado."""
+    columna_jugador, columna_revelado = _ROLES[id_carta]
+    setattr(partida, columna_jugador, jugador_id or None)
+    setattr(partida, columna_revelado, bool(revelado) if jugador_id else False)
+
+
+def _rol_oculto(partida: Partida, id_jugador: int) -> bool:
+    return ((partida.asesino_id == id_jugador and not partida.asesino_revelado)
+            or (partida.complice_id == id_jugador and not partida.complice_revelado))
+
+
+def evaluar(partida: Partida) -> FinPartida | None:
+    """
+    Decide si la partida termino a partir de sus contadores. Recorre una sola
+    vez los jugadores de la partida y no consulta cartas.
+    """
+    if partida is None or not partida.iniciada:
+        return None
+    jugadores = partida.jugadores
+    asesinos = {partida.asesino_id, partida.complice_id} - {None}
+
+    def fin(motivo, asesino_gano, perdedor_id=None):
+        ganadores = [j.id for j in jugadores if (j.id in asesinos) == asesino_gano]
+        return FinPartida(motivo, asesino_gano, ganadores, perdedor_id)
+
+    if partida.asesino_revelado:
+        return fin(DETECTIVES_GANAN, False, partida.asesino_id)
+    libres = [j for j in jugadores if not j.desgracia_social]
+    if len(jugadores) > 1 and len(libres) == 1 and _rol_oculto(partida, libres[0].id):
+        return fin(ASESINO_GANA, True)
+    if partida.cartas_mazo_robo is not None and partida.cartas_mazo_robo == 0:
+        return fin(MAZO_AGOTADO, True)
+    return None
+
+
+def mensaje_fin_partida(fin: FinPartida) -> dict:
+    """
+    Evento "fin-partida". El resultado va en el nivel superior y en "payload",
+    que son las dos formas que ya recibian los clientes.
+    """
+    resultado = {"ganadores": fin.ganadores, "asesinoGano": fin.asesino_gano}
+    mensaje = {"evento": "fin-partida", "motivo": fin.motivo, **resultado, "payload": resultado}
+    if fin.perdedor_id is not None:
+        mensaje["jugador-perdedor-id"] = fin.perdedor_id
+    return mensaje
+
+
+@event.listens_for(Session, "before_flush")
+def _actualizar_roles(session, flush_context, instances):
+    cambios = []
+    for carta in (*session.new, *session.dirty):
+        if not isinstance(carta, Carta) or carta.id_carta not in _ROLES or not carta.partida_id:
+            continue
+        estado = inspect(carta)
+        if carta in session.new or any(estado.attrs[a].history.has_changes() for a in _SEGUIDOS):
+            cambios.append(carta)
+    if not cambios:
+        return
+
+    nuevas = {p.id: p for p in session.new if isinstance(p, Partida) and p.id is not None}
+    with session.no_autoflush:
+        for carta in cambios:
+            partida = nuevas.get(carta.partida_id) or session.get(Partida, carta.partida_id)
+            if partida is None or partida in session.deleted:
+                continue
+            en_mesa = carta.ubicacion == "mesa"
+            fijar_rol(partida, carta.id_carta, carta.jugador_id if en_mesa else None, carta.bocaArriba)
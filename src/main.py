@@ -1,9 +1,24 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy.orm.exc import StaleDataError
+import time
 import logging
 from fastapi.middleware.cors import CORSMiddleware
-from game.modelos.db import Base, get_engine
+from game.modelos.db import Base, ConflictoDeVersion, get_db, get_engine, estadisticas_pool
+from game.modelos.consultas import CABECERA_CONSULTAS, CABECERA_TIEMPO, medir_consultas
+from game.modelos.metricas import metricas, latencia_http, tiempo_db_http, consultas_http
+from game.partidas.endpoints import partidas_en_curso
+from game.partidas.services import PartidaService
+from game.modelos.ejecucion import cerrar_executor, ejecutar_db
+from game.modelos.perfilado import instalar_perfilado
+from game.modelos.trazas import CABECERA_TRAZA, cerrar_traza, iniciar_traza, registro_trazas
+from game.modelos.vigilancia import VigilanteEventLoop, rutas_por_codigo
+from game.partidas.buzon import registro_buzones
+from game.partidas.roles import registro_roles
+from game.partidas.version import CABECERA_VERSION, version_conocida
 
 from api import api_router
+from settings import settings
 #import os
 
 app = FastAPI()
@@ -28,8 +43,124 @@ app.add_middleware(
 
 app.include_router(api_router)
 
+logger = logging.getLogger(__name__)
+
+
+@app.middleware("http")
+async def cabecera_version_partida(request, call_next):
+    """Agrega la ultima version confirmada de la partida a las respuestas de /partidas/{id_partida}."""
+    response = await call_next(request)
+    id_partida = request.scope.get("path_params", {}).get("id_partida")
+    version = version_conocida(id_partida) if id_partida is not None else None
+    if version is not None:
+        response.headers[CABECERA_VERSION] = str(version)
+    return response
+
+@app.middleware("http")
+async def medir_request(request, call_next):
+    """
+    Latencia, sentencias SQL y tiempo en la base de cada request: van a las
+    metricas por plantilla de ruta y, las de la base, a las cabeceras.
+    """
+    inicio = time.perf_counter()
+    with medir_consultas(settings.DB_CONSULTAS_LENTAS) as medicion:
+        response = await call_next(request)
+    ruta = request.scope.get("route")
+    etiquetas = {"metodo": request.method, "ruta": getattr(ruta, "path", "sin_ruta")}
+    latencia_http.observar(time.perf_counter() - inicio, **etiquetas)
+    tiempo_db_http.observar(medicion.tiempo, **etiquetas)
+    consultas_http.incrementar(medicion.cantidad, **etiquetas)
+    response.headers[CABECERA_CONSULTAS] = str(medicion.cantidad)
+    response.headers[CABECERA_TIEMPO] = f"{medicion.tiempo_ms:.3f}"
+    if medicion.tiempo_ms >= settings.DB_LOG_CONSULTAS_MS:
+        lentas = "; ".join(f"{ms:.1f}ms {sql}" for ms, sql in medicion.mas_lentas())
+        logger.warning(
+            "%s %s: %d sentencias, %.1fms en la base. Mas lentas: %s",
+            request.method, request.url.path, medicion.cantidad, medicion.tiempo_ms, lentas,
+        )
+    return response
+
+if settings.PERFILAR_REQUESTS:
+    instalar_perfilado(app, settings.DIRECTORIO_PERFILES)
+
+@app.middleware("http")
+async def trazar_request(request, call_next):
+    """
+    Abre la traza del request (ver game.modelos.trazas): los mensajes de
+    websocket que dispare llevan su id y se registran por partida.
+    """
+    traza, token = iniciar_traza(request.headers.get(CABECERA_TRAZA))
+    try:
+        response = await call_next(request)
+    finally:
+        cerrar_traza(token)
+    response.headers[CABECERA_TRAZA] = traza.id
+    try:
+        id_partida = int(request.scope.get("path_params", {})["id_partida"])
+    except (KeyError, TypeError, ValueError):
+        return response
+    ruta = getattr(request.scope.get("route"), "path", request.url.path)
+    registro_trazas.registrar_request(id_partida, traza, request.method, ruta, response.status_code)
+    return response
+
+@app.exception_handler(StaleDataError)
+async def conflicto_de_version(request, exc):
+    """
+    Un conflicto de version que no paso por unidad_de_trabajo (por ejemplo
+    el commit final de get_db) tambien es un 409 reintentable.
+    """
+    conflicto = ConflictoDeVersion()
+    return JSONResponse({"detail": conflicto.detail}, status_code=conflicto.status_code, headers=conflicto.headers)
+
 @app.get("/")
 async def root():
     return {"message":"HOLA"}
 
+@app.get("/db/pool")
+async def estado_pool_db():
+    """Estado y contadores del pool de conexiones, para dimensionarlo."""
+    return estadisticas_pool()
+
+@app.get("/partidas-buzones")
+async def estado_buzones():
+    """Profundidad de cola y tiempos de espera del buzon de cada partida."""
+    return registro_buzones.estadisticas()
+
+@app.get("/partidas-roles")
+async def estado_cache_roles():
+    """Aciertos y fallos de la cache de roles (asesino/complice) por partida."""
+    return registro_roles.estadisticas()
+
+@app.get("/partidas-trazas/{partida}")
+async def exportar_trazas(partida: int):
+    """Trazas de la partida (requests y entregas por websocket) en formato de eventos de Chrome."""
+    return registro_trazas.exportar(partida)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def exportar_metricas(db=Depends(get_db)):
+    """Metricas del proceso en formato de texto de Prometheus."""
+    partidas_en_curso.fijar(await ejecutar_db(PartidaService(db).contar_en_curso))
+    return PlainTextResponse(metricas.exponer(), media_type="text/plain; version=0.0.4")
+
+vigilante_event_loop = None
+
+@app.on_event("startup")
+async def _iniciar_vigilante_event_loop():
+    global vigilante_event_loop
+    if settings.VIGILAR_EVENT_LOOP:
+        vigilante_event_loop = VigilanteEventLoop(
+            settings.LOOP_LAG_INTERVALO, settings.LOOP_LAG_UMBRAL, rutas_por_codigo(app))
+        vigilante_event_loop.iniciar()
+
+@app.on_event("shutdown")
+async def _detener_vigilante_event_loop():
+    global vigilante_event_loop
+    if vigilante_event_loop is not None:
+        await vigilante_event_loop.detener()
+        vigilante_event_loop = None
+
+@app.on_event("shutdown")
+def _cerrar_executor_db():
+    cerrar_executor()
+
 Base.metadata.create_all(bind=get_engine())
@@ -7,4 +7,38 @@ class Settings:
     # Base de datos para testing (en memoria)
     TEST_DATABASE_URL: str = os.getenv("TEST_DATABASE_URL", "sqlite:///:memory:")
 
-settings = Settings()
\ No newline at end of file
+    # Pool de conexiones del engine (uno por proceso)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # segundos
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # segundos
+
+    # Donde corren las llamadas a la base desde los endpoints async:
+    # "inline" (en el event loop) o "threadpool" (en un executor acotado)
+    DB_EXECUTION_MODE: str = os.getenv("DB_EXECUTION_MODE", "inline")
+    DB_THREADPOOL_WORKERS: int = int(os.getenv("DB_THREADPOOL_WORKERS", "8"))
+
+    # Fotos en memoria de las partidas en curso para las lecturas (turno, mazo,
+    # descarte, draft) y cache de roles. Solo con un unico proceso escribiendo en la base
+    ESTADO_EN_MEMORIA: bool = os.getenv("ESTADO_EN_MEMORIA", "false").lower() in ("1", "true", "si")
+
+    # Medicion de sentencias por request: se loguean las DB_CONSULTAS_LENTAS mas
+    # lentas de los requests que pasan mas de DB_LOG_CONSULTAS_MS en la base
+    DB_CONSULTAS_LENTAS: int = int(os.getenv("DB_CONSULTAS_LENTAS", "3"))
+    DB_LOG_CONSULTAS_MS: float = float(os.getenv("DB_LOG_CONSULTAS_MS", "100"))
+
+    # Vigilancia del event loop: cada LOOP_LAG_INTERVALO se mide el lag y si el
+    # loop queda bloqueado mas de LOOP_LAG_UMBRAL se loguea la pila (segundos)
+    VIGILAR_EVENT_LOOP: bool = os.getenv("VIGILAR_EVENT_LOOP", "true").lower() in ("1", "true", "si")
+    LOOP_LAG_INTERVALO: float = float(os.getenv("LOOP_LAG_INTERVALO", "0.1"))
+    LOOP_LAG_UMBRAL: float = float(os.getenv("LOOP_LAG_UMBRAL", "0.25"))
+
+    # Perfilar con cProfile los requests que traen X-Perfilar: 1 (o ?perfilar=1);
+    # apagado no instala nada
+    PERFILAR_REQUESTS: bool = os.getenv("PERFILAR_REQUESTS", "false").lower() in ("1", "true", "si")
+    DIRECTORIO_PERFILES: str = os.getenv("DIRECTORIO_PERFILES", "perfiles")
+
+    # Guardar un resumen comprimido de cada partida terminada antes de borrarla
+    ARCHIVAR_PARTIDAS: bool = os.getenv("ARCHIVAR_PARTIDAS", "false").lower() in ("1", "true", "si")
+
+settings = Settings()
@@ -3,7 +3,7 @@ import os
 os.environ["DATABASE_URL"] = "sqlite:///:memory:"
 from sqlalchemy import create_engine
 from sqlalchemy.pool import StaticPool
-from game.modelos.db import Base, get_db, get_session_local
+from game.modelos.db import Base, crear_engine, get_db, get_session_local
 from main import app
 from fastapi.testclient import TestClient
 from unittest.mock import MagicMock, patch, AsyncMock
@@ -11,6 +11,9 @@ from game.partidas.utils import *
 from game.partidas.models import Partida
 from game.jugadores.models import Jugador
 from game.cartas.models import Carta
+from game.partidas.schemas import PartidaData, IniciarPartidaData
+from game.jugadores.schemas import JugadorData
+from settings import settings
 
 # ---------- FIXTURE DE DB ----------
 @pytest.fixture(name="session")
@@ -21,6 +24,43 @@ def dbTesting_fixture():
     with TestingSessionLocal() as session:
         yield session
 
+# ---------- FIXTURE DE DB EN ARCHIVO ----------
+# Engine de la app (crear_engine: pool medido y medicion de sentencias) sobre
+# un SQLite en archivo, para los tests que miden sentencias o usan varias sesiones
+@pytest.fixture(name="engine")
+def engine_archivo_fixture(tmp_path):
+    engine = crear_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture(name="db")
+def db_archivo_fixture(engine):
+    db = get_session_local(engine)()
+    yield db
+    db.close()
+
+@pytest.fixture(name="nueva_partida")
+def nueva_partida_fixture(db, monkeypatch):
+    """
+    nueva_partida(jugadores, estado_en_memoria) arma en `db` una partida
+    iniciada ("j0" es el anfitrion) con ESTADO_EN_MEMORIA fijado para el
+    test. Devuelve (id_partida, ids de los jugadores en orden de union).
+    """
+    def crear(jugadores: int = 2, estado_en_memoria: bool = False):
+        monkeypatch.setattr(settings, "ESTADO_EN_MEMORIA", estado_en_memoria)
+        datos = crearPartida(PartidaData(**{
+            "nombre-partida": "p", "max-jugadores": 6, "min-jugadores": 2,
+            "nombre-jugador": "j0", "dia-nacimiento": "1990-01-01",
+        }), db)
+        ids = [datos.id_jugador]
+        for i in range(1, jugadores):
+            jugador = unir_a_partida(datos.id_partida, JugadorData(nombreJugador=f"j{i}", fechaNacimiento="1991-01-01"), db)
+            ids.append(jugador.id_jugador)
+        iniciarPartida(datos.id_partida, IniciarPartidaData(id_jugador=datos.id_jugador), db)
+        return datos.id_partida, ids
+    return crear
+
 @pytest.fixture(name="partida1")
 def partida1_fixture():
     partida = Partida(
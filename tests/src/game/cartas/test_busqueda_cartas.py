@@ -0,0 +1,85 @@
+import pytest
+import datetime
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from sqlalchemy import event
+from game.jugadores.models import Jugador
+from game.partidas.models import Partida
+from game.cartas.models import Carta
+from game.cartas.services import CartaService
+
+
+@pytest.fixture
+def db(db):
+    """Dos partidas con las mismas cartas (mismo id_carta) en la mano de cada jugador."""
+    for id_partida in (1, 2):
+        db.add(Partida(id=id_partida, nombre=f"p{id_partida}", anfitrionId=id_partida, cantJugadores=1,
+                       iniciada=True, maxJugadores=4, minJugadores=2))
+        db.add(Jugador(id=id_partida, nombre=f"j{id_partida}", fecha_nacimiento=datetime.date(2000, 1, 1),
+                       partida_id=id_partida))
+        db.add(Carta(id_carta=7, nombre="Hercule Poirot", tipo="Detective", ubicacion="mano",
+                     partida_id=id_partida, jugador_id=id_partida))
+    db.commit()
+    return db
+
+
+def contar_selects(engine):
+    selects = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _contar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    return selects
+
+
+def test_obtener_carta_busca_dentro_de_la_partida(db):
+    carta = CartaService(db).obtener_carta(7, 2)
+    assert carta.partida_id == 2
+
+
+def test_obtener_carta_inexistente_en_la_partida(db):
+    with pytest.raises(ValueError, match="partida 1"):
+        CartaService(db).obtener_carta(99, 1)
+
+
+def test_obtener_carta_repetida_usa_cache_del_request(engine, db):
+    selects = contar_selects(engine)
+    cs = CartaService(db)
+
+    primera = cs.obtener_carta(7, 1)
+    segunda = CartaService(db).obtener_carta(7, 1)
+
+    assert primera is segunda
+    assert len(selects) == 1
+
+
+def test_cache_se_vacia_al_commitear(engine, db):
+    cs = CartaService(db)
+    cs.obtener_carta(7, 1)
+    db.commit()
+
+    selects = contar_selects(engine)
+    cs.obtener_carta(7, 1)
+    assert len(selects) == 1
+
+
+def test_descartar_cartas_no_toca_otras_partidas(db):
+    CartaService(db).descartar_cartas(1, [7])
+
+    carta_p1 = db.query(Carta).filter_by(partida_id=1, id_carta=7).one()
+    carta_p2 = db.query(Carta).filter_by(partida_id=2, id_carta=7).one()
+    assert carta_p1.ubicacion == "descarte"
+    assert carta_p2.ubicacion == "mano"
+    assert carta_p2.jugador_id == 2
+
+
+def test_carta_de_mano_y_evento_dentro_de_la_partida(db):
+    cs = CartaService(db)
+    assert cs.obtener_carta_de_mano(7, 1, 1).partida_id == 1
+    assert cs.obtener_carta_de_mano(7, 1, 2) is None
+    db.query(Carta).filter_by(partida_id=1, id_carta=7).one().ubicacion = "evento_jugado"
+    db.flush()
+    assert cs.evento_jugado_en_turno(1, 1) is True
+    assert cs.evento_jugado_en_turno(1, 2) is False
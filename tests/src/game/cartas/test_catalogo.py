@@ -0,0 +1,42 @@
+import pytest
+from game.cartas.constants import cartasDict, secretosDict
+from game.cartas import catalogo
+from game.cartas.enums import TipoCarta
+from game.partidas.utils import verif_evento
+
+
+def test_catalogo_cubre_todas_las_cartas():
+    ids = {c["id"] for c in (*cartasDict.values(), *secretosDict.values())}
+    assert set(catalogo.CATALOGO) == ids
+    for datos in cartasDict.values():
+        assert catalogo.nombre_de(datos["id"]) == datos["carta"]
+        assert catalogo.id_de(datos["carta"]) == datos["id"]
+        assert catalogo.tipo_de(datos["id"]) == datos["tipo"]
+
+
+def test_conjuntos_por_tipo():
+    assert catalogo.IDS_COMODIN == {14}
+    assert catalogo.IDS_COMODIN <= catalogo.IDS_DETECTIVE
+    assert catalogo.IDS_EVENTO == {17, 18, 19, 20, 21, 22, 23, 24, 25}
+    assert catalogo.IDS_INSTANTANEA == {16}
+    assert catalogo.IDS_SECRETO == {3, 4, 6}
+    assert (catalogo.ID_ASESINO, catalogo.ID_COMPLICE) == (3, 4)
+    assert catalogo.tipo_de(20) is TipoCarta.EVENTO
+    assert catalogo.tipo_de(999) is None
+
+
+def test_catalogo_es_inmutable():
+    with pytest.raises(TypeError):
+        catalogo.CATALOGO[99] = None
+    with pytest.raises(AttributeError):
+        catalogo.IDS_EVENTO.add(99)
+    with pytest.raises(Exception):
+        catalogo.CATALOGO[14].nombre = "otro"
+
+
+def test_verif_evento_usa_el_catalogo():
+    assert verif_evento("Not so fast", 16)
+    assert verif_evento("Cards off the table", 17)
+    assert not verif_evento("Cards off the table", 16)
+    assert not verif_evento("Carta inexistente", 16)
+    assert not verif_evento("Not so fast", None)
@@ -0,0 +1,50 @@
+import json
+import datetime
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+import pytest
+from sqlalchemy import text
+from game.jugadores.models import Jugador
+from game.partidas.models import Partida
+from game.cartas.models import Carta
+from game.cartas.enums import TipoCarta, UbicacionCarta
+
+
+@pytest.fixture
+def db(db):
+    db.add(Partida(id=1, nombre="p", anfitrionId=1, cantJugadores=1, iniciada=True, maxJugadores=4, minJugadores=2))
+    db.add(Jugador(id=1, nombre="j1", fecha_nacimiento=datetime.date(2000, 1, 1), partida_id=1))
+    db.add_all([
+        Carta(id_carta=3, nombre="murderer", tipo="Secreto", ubicacion="mesa", partida_id=1, jugador_id=1),
+        Carta(id_carta=7, nombre="Hercule Poirot", tipo="Detective", ubicacion="mano", partida_id=1, jugador_id=1),
+    ])
+    db.commit()
+    return db
+
+
+def test_se_guardan_como_enteros(db):
+    filas = db.execute(text("SELECT tipo, ubicacion FROM cartas ORDER BY id_carta")).all()
+    assert filas == [(TipoCarta.SECRETO.codigo, UbicacionCarta.MESA.codigo),
+                     (TipoCarta.DETECTIVE.codigo, UbicacionCarta.MANO.codigo)]
+
+
+def test_se_leen_como_enums_que_comparan_como_strings(db):
+    secreto = db.query(Carta).filter_by(ubicacion="mesa").one()
+    assert secreto.tipo is TipoCarta.SECRETO
+    assert secreto.tipo == "secreto"
+    assert secreto.ubicacion == "mesa"
+    assert f"{secreto.ubicacion}" == "mesa"
+    assert json.dumps({"tipo": secreto.tipo}) == '{"tipo": "secreto"}'
+
+
+def test_filtros_con_strings_o_enums(db):
+    assert db.query(Carta).filter(Carta.ubicacion == UbicacionCarta.MANO).count() == 1
+    assert db.query(Carta).filter(Carta.ubicacion.in_(["mano", "mesa"])).count() == 2
+    assert db.query(Carta).filter_by(tipo="SECRETO").count() == 1
+
+
+def test_valores_desconocidos_fallan():
+    assert TipoCarta("event") is TipoCarta.EVENTO
+    assert TipoCarta("respuesta") is TipoCarta.INSTANTANEA
+    with pytest.raises(ValueError):
+        UbicacionCarta("bolsillo")
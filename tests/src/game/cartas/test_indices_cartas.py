@@ -0,0 +1,117 @@
+import pytest
+import datetime
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from sqlalchemy import event
+from game.jugadores.models import Jugador
+from game.partidas.models import Partida
+from game.cartas.models import Carta, SetJugado
+from game.cartas.services import CartaService
+
+
+@pytest.fixture
+def db(db):
+    partida = Partida(id=1, nombre="p", anfitrionId=1, cantJugadores=2, iniciada=True, maxJugadores=4, minJugadores=2)
+    j1 = Jugador(id=1, nombre="j1", fecha_nacimiento=datetime.date(2000, 1, 1), partida_id=1)
+    j2 = Jugador(id=2, nombre="j2", fecha_nacimiento=datetime.date(2000, 1, 1), partida_id=1)
+    db.add_all([partida, j1, j2])
+    db.add_all([
+        Carta(id_carta=7, nombre="Hercule Poirot", tipo="Detective", ubicacion="mano", partida_id=1, jugador_id=1),
+        Carta(id_carta=20, nombre="Look into the ashes", tipo="Event", ubicacion="evento_jugado", partida_id=1, jugador_id=1),
+        Carta(id_carta=8, nombre="Miss Marple", tipo="Detective", ubicacion="mazo_robo", orden_mazo=1, partida_id=1, jugador_id=0),
+        Carta(id_carta=9, nombre="Mr Satterthwaite", tipo="Detective", ubicacion="descarte", orden_descarte=1, partida_id=1, jugador_id=0),
+        Carta(id_carta=10, nombre="Parker Pyne", tipo="Detective", ubicacion="draft", partida_id=1, jugador_id=0),
+        Carta(id_carta=18, nombre="Another Victim", tipo="Event", ubicacion="evento_jugado", partida_id=1, jugador_id=1),
+        Carta(id_carta=3, nombre="murderer", tipo="secreto", ubicacion="mesa", partida_id=1, jugador_id=2),
+    ])
+    db.add(SetJugado(partida_id=1, jugador_id=2, representacion_id_carta=7, cartas_ids=[7, 7]))
+    db.commit()
+    return db
+
+
+def capturar_selects(engine, tablas=("cartas", "sets_jugados")):
+    """Registra los SELECT que tocan las tablas dadas junto con sus parametros."""
+    capturadas = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and any(t in statement for t in tablas):
+            capturadas.append((statement, parameters))
+
+    return capturadas
+
+
+def escaneos_completos(engine, consultas):
+    """Devuelve los pasos 'SCAN <tabla>' de EXPLAIN QUERY PLAN para cada consulta."""
+    escaneos = []
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for statement, parameters in consultas:
+            for fila in cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall():
+                detalle = fila[-1]
+                if detalle.startswith("SCAN ") and "USING" not in detalle:
+                    escaneos.append((detalle, statement))
+    finally:
+        raw.close()
+    return escaneos
+
+
+CONSULTAS_CALIENTES = {
+    "obtener_mano_jugador": lambda cs: cs.obtener_mano_jugador(1, 1),
+    "obtener_mazo_de_robo": lambda cs: cs.obtener_mazo_de_robo(1),
+    "tope_mazo_robo": lambda cs: cs.tope_mazo_robo(1, 2),
+    "contar_cartas": lambda cs: cs.contar_cartas(1, "mazo_robo"),
+    "obtener_cartas_descarte": lambda cs: cs.obtener_cartas_descarte(1, 5),
+    "obtener_mazo_draft": lambda cs: cs.obtener_mazo_draft(1),
+    "obtener_secretos_jugador": lambda cs: cs.obtener_secretos_jugador(2, 1),
+    "obtener_carta_de_mano": lambda cs: cs.obtener_carta_de_mano(7, 1, 1),
+    "evento_jugado_en_turno": lambda cs: cs.evento_jugado_en_turno(1, 1),
+    "obtener_cartas_jugadas": lambda cs: cs.obtener_cartas_jugadas(1, 1, "Look into the ashes", "evento_jugado"),
+    "obtener_sets_jugados": lambda cs: cs.obtener_sets_jugados(1),
+    "descartar_eventos": lambda cs: cs.descartar_eventos(1, 1),
+    "obtener_carta": lambda cs: cs.obtener_carta(10, 1),
+    "descartar_cartas": lambda cs: cs.descartar_cartas(1, [7]),
+    "obtener_sets_con_carta": lambda cs: cs.obtener_sets_con_carta(1, 7),
+    "robar_set": lambda cs: cs.robar_set(1, 1, 2, 7, [7, 7]),
+}
+
+
+@pytest.mark.parametrize("nombre", list(CONSULTAS_CALIENTES))
+def test_consultas_calientes_usan_indices(engine, db, nombre):
+    consultas = capturar_selects(engine)
+    CONSULTAS_CALIENTES[nombre](CartaService(db))
+
+    assert consultas, f"{nombre} no ejecuto ningun SELECT sobre cartas/sets_jugados"
+    assert escaneos_completos(engine, consultas) == []
+
+
+def test_detecta_escaneo_completo(engine, db):
+    """Sanity check: una consulta sin filtro indexado se reporta como escaneo."""
+    consultas = [("SELECT * FROM cartas WHERE nombre = ?", ("murderer",))]
+    assert escaneos_completos(engine, consultas)
+
+
+def test_indices_creados(engine):
+    from sqlalchemy import inspect
+    indices_cartas = {i["name"] for i in inspect(engine).get_indexes("cartas")}
+    indices_sets = {i["name"] for i in inspect(engine).get_indexes("sets_jugados")}
+    assert "ix_cartas_partida_ubicacion_jugador" in indices_cartas
+    assert "ix_cartas_jugador_ubicacion_id_carta" in indices_cartas
+    assert "ix_sets_jugados_partida_representacion_jugador" in indices_sets
+    indices_sets_cartas = {i["name"] for i in inspect(engine).get_indexes("sets_jugados_cartas")}
+    assert "ix_sets_jugados_cartas_id_carta_set" in indices_sets_cartas
+
+
+def test_sets_guardan_cartas_en_orden(db):
+    cs = CartaService(db)
+    registro = db.query(SetJugado).filter_by(partida_id=1).one()
+    registro.agregar_carta(14)
+    db.commit()
+
+    assert cs.obtener_sets_jugados(1) == [
+        {"jugador_id": 2, "representacion_id_carta": 7, "cartas_ids": [7, 7, 14]}
+    ]
+    assert registro.cartas_ids_csv == "7,7,14"
+    assert cs.obtener_sets_con_carta(1, 14) == [registro]
+    assert cs.obtener_sets_con_carta(1, 9) == []
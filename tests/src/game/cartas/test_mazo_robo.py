@@ -0,0 +1,75 @@
+import pytest
+import datetime
+import os
+import random
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from sqlalchemy import event
+from game.jugadores.models import Jugador
+from game.partidas.models import Partida
+from game.cartas.models import Carta
+from game.cartas.services import CartaService
+
+
+@pytest.fixture
+def db(db):
+    """Mazo de 40 cartas insertadas en desorden respecto de orden_mazo."""
+    db.add(Partida(id=1, nombre="p", anfitrionId=1, cantJugadores=1, iniciada=True, maxJugadores=4, minJugadores=2))
+    db.add(Jugador(id=1, nombre="j1", fecha_nacimiento=datetime.date(2000, 1, 1), partida_id=1))
+    ordenes = list(range(40))
+    random.Random(7).shuffle(ordenes)
+    for orden in ordenes:
+        db.add(Carta(id_carta=7, nombre=f"carta {orden}", tipo="Detective", ubicacion="mazo_robo",
+                     orden_mazo=orden, bocaArriba=False, partida_id=1, jugador_id=0))
+    db.add(Carta(id_carta=8, nombre="en draft", tipo="Detective", ubicacion="draft", partida_id=1, jugador_id=0))
+    db.commit()
+    return db
+
+
+def capturar_sentencias(engine):
+    sentencias = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, parameters, *args: sentencias.append((statement, parameters)))
+    return sentencias
+
+
+def test_robar_cartas_toma_el_tope_en_orden(db):
+    cs = CartaService(db)
+    robadas = cs.robar_cartas(1, 1, 3)
+
+    assert [c["nombre"] for c in robadas] == ["carta 0", "carta 1", "carta 2"]
+    assert cs.contar_cartas(1, "mazo_robo") == 37
+    assert [c.nombre for c in cs.obtener_mazo_de_robo(1)[:2]] == ["carta 3", "carta 4"]
+
+
+def test_robar_mas_de_las_que_hay(db):
+    cs = CartaService(db)
+    assert len(cs.robar_cartas(1, 1, 50)) == 40
+    assert cs.robar_cartas(1, 1, 1) == []
+
+
+def test_tope_usa_el_indice_sin_ordenar(engine, db):
+    sentencias = capturar_sentencias(engine)
+    CartaService(db).tope_mazo_robo(1, 2)
+
+    (statement, parameters), = sentencias
+    assert "LIMIT" in statement
+    raw = engine.raw_connection()
+    try:
+        plan = [fila[-1] for fila in raw.cursor().execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()]
+    finally:
+        raw.close()
+    assert any("ix_cartas_partida_ubicacion_orden_mazo" in paso for paso in plan)
+    assert not any("TEMP B-TREE" in paso for paso in plan)
+
+
+def test_actualizar_draft_repone_solo_las_faltantes(engine, db):
+    cs = CartaService(db)
+    sentencias = capturar_sentencias(engine)
+    cs.actualizar_mazo_draft(1)
+
+    selects = [s for s, _ in sentencias if s.lstrip().upper().startswith("SELECT") and "FROM cartas" in s]
+    assert len(selects) == 2  # COUNT del draft + tope del mazo
+    assert "count(" in selects[0].lower()
+    assert sorted(c.nombre for c in cs.obtener_mazo_draft(1)) == ["carta 0", "carta 1", "en draft"]
+    assert all(c.orden_mazo is None for c in cs.obtener_mazo_draft(1))
+    assert cs.contar_cartas(1, "mazo_robo") == 38
@@ -0,0 +1,111 @@
+import pytest
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from sqlalchemy import event
+from game.modelos.db import unidad_de_trabajo
+from game.partidas.models import Partida
+from game.cartas.models import Carta
+from game.cartas.services import CartaService
+from game.cartas.constants import NOT_SO_FAST
+
+
+@pytest.fixture
+def partida(engine, db, nueva_partida):
+    id_partida, (id_jugador, id_otro) = nueva_partida()
+    updates = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: updates.append(statement)
+                 if statement.lstrip().upper().startswith("UPDATE CARTAS") else None)
+    yield db, id_partida, id_jugador, id_otro, updates
+
+
+def mano(db, id_partida, id_jugador):
+    return CartaService(db).obtener_mano_jugador(id_jugador, id_partida)
+
+
+def test_robar_y_reponer_draft(partida):
+    db, id_partida, id_jugador, _, updates = partida
+    cs = CartaService(db)
+    with unidad_de_trabajo(db):
+        for carta in cs.obtener_mazo_draft(id_partida)[:2]:
+            carta.ubicacion = "mano"
+            carta.jugador_id = id_jugador
+    tope = [c.id for c in cs.tope_mazo_robo(id_partida, 5)]
+    updates.clear()
+
+    cs.robar_cartas(id_partida, id_jugador, 3)
+    assert len(updates) == 1
+    cs.actualizar_mazo_draft(id_partida)
+    assert len(updates) == 2
+    db.commit()
+
+    ids_mano = {c.id for c in mano(db, id_partida, id_jugador)}
+    assert set(tope[:3]) <= ids_mano
+    assert {c.id for c in cs.obtener_mazo_draft(id_partida)} >= set(tope[3:5])
+    assert db.get(Partida, id_partida).cartas_mazo_robo == cs.contar_cartas(id_partida, "mazo_robo")
+
+
+def test_descartar_varias_cartas_un_update(partida):
+    db, id_partida, id_jugador, _, updates = partida
+    cs = CartaService(db)
+    cartas = [c for c in mano(db, id_partida, id_jugador) if c.id_carta != NOT_SO_FAST][:3]
+    updates.clear()
+
+    cs.descartar_cartas(id_jugador, [c.id_carta for c in cartas])
+    assert len(updates) == 1
+    db.commit()
+
+    descarte = cs.obtener_cartas_descarte(id_partida, 5)
+    assert [c.id for c in descarte] == [c.id for c in reversed(cartas)]
+    assert [c.orden_descarte for c in descarte] == [3, 2, 1]
+    assert all(c.jugador_id == 0 and c.orden_mazo is None for c in descarte)
+
+
+def test_cards_off_the_table_descarta_los_not_so_fast(partida):
+    db, id_partida, id_jugador, id_objetivo, updates = partida
+    cs = CartaService(db)
+    updates.clear()
+
+    cs.jugar_cards_off_the_table(id_partida, id_jugador, id_objetivo)
+    assert len(updates) == 1
+    db.commit()
+    assert all(c.id_carta != NOT_SO_FAST for c in mano(db, id_partida, id_objetivo))
+
+
+def test_early_train_y_delay_the_murderer(partida):
+    db, id_partida, id_jugador, _, updates = partida
+    cs = CartaService(db)
+    antes = cs.obtener_cantidad_mazo(id_partida)
+    updates.clear()
+
+    cs.jugar_early_train_to_paddington(id_partida, id_jugador)
+    assert len(updates) == 1  # sin carta de evento jugada: solo las 6 del mazo
+    db.commit()
+    assert cs.obtener_cantidad_mazo(id_partida) == antes - 6
+    assert db.get(Partida, id_partida).cartas_descarte == 6
+    updates.clear()
+
+    cs.jugar_delay_the_murderer_escape(id_partida, id_jugador, 5)
+    assert len(updates) == 1
+    db.commit()
+    assert cs.obtener_cantidad_mazo(id_partida) == antes - 1
+    assert all(c.orden_descarte is None and not c.bocaArriba for c in cs.tope_mazo_robo(id_partida, 5))
+
+
+def test_pasar_cartas_y_descartar_de_la_pila(partida):
+    db, id_partida, id_jugador, id_otro, updates = partida
+    cs = CartaService(db)
+    mias, suyas = mano(db, id_partida, id_jugador)[:2], mano(db, id_partida, id_otro)[:2]
+    updates.clear()
+
+    cs.pasar_cartas({**{c.id: id_otro for c in mias}, **{c.id: id_jugador for c in suyas}})
+    assert len(updates) == 1
+    db.commit()
+    assert all(db.get(Carta, c.id).jugador_id == id_otro for c in mias)
+    assert all(db.get(Carta, c.id).jugador_id == id_jugador for c in suyas)
+    updates.clear()
+
+    cs.descartar_cartas_de_pila([c.id for c in mias + suyas], id_partida)
+    assert len(updates) == 1
+    db.commit()
+    assert db.get(Partida, id_partida).cartas_descarte == cs.contar_cartas(id_partida, "descarte") == 4
@@ -0,0 +1,70 @@
+import pytest
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from sqlalchemy import event
+from game.modelos.db import unidad_de_trabajo
+from game.partidas.utils import determinar_desgracia_social
+from game.jugadores.models import Jugador
+from game.cartas.services import CartaService
+
+
+@pytest.fixture
+def partida(engine, db, nueva_partida):
+    id_partida, (id_jugador, id_otro) = nueva_partida()
+    escrituras = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: escrituras.append(statement)
+                 if not statement.lstrip().upper().startswith("SELECT") else None)
+    yield db, id_partida, id_jugador, id_otro, escrituras
+
+
+def contadores(db, id_jugador):
+    jugador = db.get(Jugador, id_jugador)
+    return jugador.secretos_revelados, jugador.secretos_ocultos, jugador.desgracia_social
+
+
+def test_reparto_inicial(partida):
+    db, _, id_jugador, id_otro, _ = partida
+    assert contadores(db, id_jugador) == (0, 3, False)
+    assert contadores(db, id_otro) == (0, 3, False)
+
+
+def test_revelar_y_ocultar(partida):
+    db, id_partida, id_jugador, _, _ = partida
+    cs = CartaService(db)
+    secretos = cs.obtener_secretos_jugador(id_jugador, id_partida)
+
+    for secreto in secretos:
+        with unidad_de_trabajo(db):
+            cs.revelar_secreto(secreto.id)
+    assert contadores(db, id_jugador) == (3, 0, True)
+
+    with unidad_de_trabajo(db):
+        cs.ocultar_secreto(secretos[0].id)
+    assert contadores(db, id_jugador) == (2, 1, False)
+
+
+def test_robar_secreto_revelado(partida):
+    db, id_partida, id_jugador, id_otro, _ = partida
+    cs = CartaService(db)
+    secreto = cs.obtener_secretos_jugador(id_jugador, id_partida)[0]
+    with unidad_de_trabajo(db):
+        cs.revelar_secreto(secreto.id)
+
+    # como en And then there was one more...: pasa oculto al destino
+    with unidad_de_trabajo(db):
+        cs.robar_secreto(cs.obtener_carta_por_id(secreto.id), id_otro)
+    assert contadores(db, id_jugador) == (0, 2, False)
+    assert contadores(db, id_otro) == (0, 4, False)
+
+
+def test_determinar_desgracia_social_no_escribe(partida):
+    db, id_partida, id_jugador, _, escrituras = partida
+    escrituras.clear()
+    commits = []
+    event.listen(db, "after_commit", lambda session: commits.append(session))
+
+    assert determinar_desgracia_social(id_partida, id_jugador, db) is False
+    assert escrituras == []
+    assert commits == []
+    assert not (db.new or db.dirty or db.deleted)
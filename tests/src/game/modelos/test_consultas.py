@@ -0,0 +1,80 @@
+import pytest
+import logging
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from sqlalchemy import text
+from fastapi.testclient import TestClient
+from game.modelos.db import get_db, get_session_local
+from game.modelos.consultas import (CABECERA_CONSULTAS, CABECERA_TIEMPO, huella, medir_consultas,
+                                    presupuesto_consultas)
+from game.partidas.utils import crearPartida
+from game.partidas.schemas import PartidaData
+from settings import settings
+from main import app
+
+
+@pytest.fixture
+def cliente(engine):
+    Sesion = get_session_local(engine)
+    with Sesion() as db:
+        datos = crearPartida(PartidaData(**{
+            "nombre-partida": "p", "max-jugadores": 6, "min-jugadores": 2,
+            "nombre-jugador": "j0", "dia-nacimiento": "1990-01-01",
+        }), db)
+
+    def get_db_override():
+        with Sesion() as db:
+            yield db
+    app.dependency_overrides[get_db] = get_db_override
+    yield TestClient(app), engine, datos.id_partida
+    app.dependency_overrides.clear()
+
+
+def test_huella_sin_columnas_ni_valores():
+    a = huella("SELECT cartas.id, cartas.nombre\nFROM cartas WHERE cartas.jugador_id IN (?, ?, ?) AND nombre = 'x'")
+    b = huella("SELECT cartas.id FROM cartas WHERE cartas.jugador_id IN (?) AND nombre = 'otra'")
+    assert a == b == "SELECT ... FROM cartas WHERE cartas.jugador_id IN (...) AND nombre = ?"
+
+
+def test_medicion_solo_del_contexto(engine):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        with medir_consultas(lentas=2) as medicion:
+            for _ in range(3):
+                conn.execute(text("SELECT 2"))
+        conn.execute(text("SELECT 3"))
+    assert medicion.cantidad == 3 and medicion.tiempo > 0
+    assert [sql for _, sql in medicion.mas_lentas()] == ["SELECT ?", "SELECT ?"]
+
+
+def test_cabeceras_y_presupuesto_del_endpoint(cliente):
+    client, engine, id_partida = cliente
+    with presupuesto_consultas(2, engine):
+        respuesta = client.get(f"/partidas/{id_partida}")
+    assert respuesta.status_code == 200
+    assert 1 <= int(respuesta.headers[CABECERA_CONSULTAS]) <= 2
+    assert float(respuesta.headers[CABECERA_TIEMPO]) > 0
+
+    with pytest.raises(AssertionError, match="presupuesto: 0"):
+        with presupuesto_consultas(0, engine):
+            client.get(f"/partidas/{id_partida}")
+
+
+def test_loguea_las_mas_lentas(cliente, caplog, monkeypatch):
+    client, _, id_partida = cliente
+    monkeypatch.setattr(settings, "DB_LOG_CONSULTAS_MS", 0)
+    with caplog.at_level(logging.WARNING, logger="main"):
+        client.get(f"/partidas/{id_partida}")
+    assert any(f"/partidas/{id_partida}" in r.message and "FROM partidas" in r.message for r in caplog.records)
+
+
+def test_huellas_solo_de_las_mas_lentas(engine, monkeypatch):
+    import game.modelos.consultas as consultas
+    llamadas = []
+    original = consultas.huella
+    monkeypatch.setattr(consultas, "huella", lambda sql: llamadas.append(sql) or original(sql))
+    with engine.connect() as conn, medir_consultas(lentas=1) as medicion:
+        for i in range(5):
+            conn.execute(text(f"SELECT {i}"))
+    assert medicion.cantidad == 5 and llamadas == []
+    assert len(medicion.mas_lentas()) == 1 and len(llamadas) == 1
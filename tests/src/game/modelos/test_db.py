@@ -0,0 +1,176 @@
+import pytest
+import asyncio
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from fastapi.testclient import TestClient
+from game.modelos.db import (crear_engine, get_engine, get_db, get_session_local, estadisticas_pool, PoolMedido,
+                             unidad_de_trabajo, transaccional)
+from settings import settings
+from main import app
+
+
+def test_get_engine_es_unico_por_proceso():
+    """get_engine devuelve siempre el mismo engine (y por lo tanto el mismo pool)."""
+    assert get_engine() is get_engine()
+
+
+def test_get_db_reutiliza_la_fabrica_de_sesiones():
+    gen1 = get_db()
+    gen2 = get_db()
+    db1 = next(gen1)
+    db2 = next(gen2)
+    try:
+        assert db1 is not db2
+        assert db1.get_bind() is db2.get_bind() is get_engine()
+    finally:
+        gen1.close()
+        gen2.close()
+
+
+def test_estadisticas_pool_cuenta_checkouts(tmp_path):
+    engine = crear_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    assert isinstance(engine.pool, PoolMedido)
+
+    for _ in range(3):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    datos = estadisticas_pool(engine)
+    assert datos["checkouts"] == 3
+    assert datos["checkins"] == 3
+    assert datos["conexiones_creadas"] == 1
+    assert datos["en_uso"] == 0
+    assert datos["espera_max_s"] >= 0
+    engine.dispose()
+
+
+def test_estadisticas_pool_se_conservan_al_recrear(tmp_path):
+    engine = crear_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    engine.dispose()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    assert estadisticas_pool(engine)["checkouts"] == 2
+    engine.dispose()
+
+
+def test_estadisticas_pool_desde_varios_hilos(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 2)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 0)
+    monkeypatch.setattr(settings, "DB_POOL_TIMEOUT", 0.05)
+    engine = crear_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+
+    def consultar(_):
+        for _ in range(50):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(consultar, range(4)))
+
+    with engine.connect(), engine.connect():
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+
+    datos = estadisticas_pool(engine)
+    assert datos["checkouts"] == datos["checkins"] == 202
+    assert datos["timeouts"] == 1
+    engine.dispose()
+
+
+def test_endpoint_estado_pool():
+    client = TestClient(app)
+    response = client.get("/db/pool")
+    assert response.status_code == 200
+    assert "checkouts" in response.json()
+
+
+@pytest.fixture
+def sesion_archivo(engine, db):
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    return db, engine, commits
+
+
+def _partida(nombre="p"):
+    from game.partidas.models import Partida
+    return Partida(nombre=nombre, anfitrionId=1, cantJugadores=1, iniciada=False, maxJugadores=4, minJugadores=2)
+
+
+def test_unidad_de_trabajo_anidada_confirma_una_sola_vez(sesion_archivo):
+    from game.partidas.models import Partida
+    db, engine, commits = sesion_archivo
+
+    with unidad_de_trabajo(db):
+        db.add(_partida("a"))
+        db.flush()
+        with unidad_de_trabajo(db):
+            db.add(_partida("b"))
+            db.flush()
+        assert commits == []
+
+    assert len(commits) == 1
+    otra = get_session_local(engine)()
+    assert otra.query(Partida).count() == 2
+    otra.close()
+
+
+def test_unidad_de_trabajo_revierte_todo_ante_error(sesion_archivo):
+    from game.partidas.models import Partida
+    db, engine, commits = sesion_archivo
+
+    with pytest.raises(ValueError):
+        with unidad_de_trabajo(db):
+            db.add(_partida("a"))
+            db.flush()
+            with unidad_de_trabajo(db):
+                raise ValueError("falla a mitad de la accion")
+
+    assert commits == []
+    assert db.query(Partida).count() == 0
+
+
+def test_transaccional_y_async_with(sesion_archivo):
+    from game.partidas.models import Partida
+    db, engine, commits = sesion_archivo
+
+    @transaccional
+    def crear(nombre, db):
+        db.add(_partida(nombre))
+        db.flush()
+
+    crear("suelta", db)
+    assert len(commits) == 1
+
+    async def _accion():
+        async with unidad_de_trabajo(db):
+            crear("x", db)
+            crear("y", db=db)
+
+    asyncio.run(_accion())
+    assert len(commits) == 2
+    assert db.query(Partida).count() == 3
+
+
+def test_descartar_cartas_confirma_una_vez(sesion_archivo):
+    import datetime
+    from game.jugadores.models import Jugador
+    from game.cartas.models import Carta
+    from game.cartas.services import CartaService
+    db, engine, commits = sesion_archivo
+    db.add(_partida())
+    db.add(Jugador(id=1, nombre="j", fecha_nacimiento=datetime.date(2000, 1, 1), partida_id=1))
+    db.add_all([Carta(id_carta=i, nombre=f"c{i}", tipo="Detective", ubicacion="mano", partida_id=1, jugador_id=1)
+                for i in (7, 8, 9)])
+    db.commit()
+    commits.clear()
+
+    with unidad_de_trabajo(db):
+        CartaService(db).descartar_cartas(1, [7, 8, 9])
+
+    assert len(commits) == 1
+    assert db.query(Carta).filter_by(ubicacion="descarte").count() == 3
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import pytest
+from game.modelos import ejecucion
+from game.modelos.ejecucion import ejecutar_db
+from settings import settings
+
+
+@pytest.fixture
+def modo_ejecucion(monkeypatch):
+    def _set(modo):
+        monkeypatch.setattr(settings, "DB_EXECUTION_MODE", modo)
+    yield _set
+    ejecucion.cerrar_executor()
+
+
+def _hilo_actual(valor, extra=None):
+    return threading.current_thread().name, valor, extra
+
+
+def test_ejecutar_db_inline_corre_en_el_loop(modo_ejecucion):
+    modo_ejecucion("inline")
+    hilo, valor, extra = asyncio.run(ejecutar_db(_hilo_actual, 1, extra="x"))
+    assert hilo == threading.current_thread().name
+    assert (valor, extra) == (1, "x")
+
+
+def test_ejecutar_db_threadpool_corre_fuera_del_loop(modo_ejecucion):
+    modo_ejecucion("threadpool")
+    hilo, valor, extra = asyncio.run(ejecutar_db(_hilo_actual, 2, extra="y"))
+    assert hilo.startswith("db")
+    assert (valor, extra) == (2, "y")
+
+
+def test_ejecutar_db_threadpool_propaga_excepciones(modo_ejecucion):
+    modo_ejecucion("threadpool")
+
+    def _falla():
+        raise ValueError("Partida no encontrada")
+
+    with pytest.raises(ValueError, match="Partida no encontrada"):
+        asyncio.run(ejecutar_db(_falla))
+
+
+def test_ejecutar_db_threadpool_no_bloquea_el_loop(modo_ejecucion):
+    modo_ejecucion("threadpool")
+    evento = threading.Event()
+
+    async def _escenario():
+        # mientras la llamada "a la base" espera, el loop sigue atendiendo
+        tarea = asyncio.create_task(ejecutar_db(evento.wait, 2))
+        await asyncio.sleep(0)
+        evento.set()
+        return await tarea
+
+    assert asyncio.run(_escenario()) is True
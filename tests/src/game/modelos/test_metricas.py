@@ -0,0 +1,81 @@
+import pytest
+import asyncio
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from unittest.mock import AsyncMock
+from fastapi.testclient import TestClient
+from game.modelos.db import get_db, get_session_local
+from game.modelos.metricas import RegistroMetricas
+from game.partidas.endpoints import ConnectionManager, destinatarios_broadcast
+from game.partidas.utils import crearPartida, unir_a_partida, iniciarPartida
+from game.partidas.schemas import PartidaData, IniciarPartidaData
+from game.jugadores.schemas import JugadorData
+from main import app
+
+
+def test_formato_prometheus():
+    registro = RegistroMetricas()
+    latencia = registro.histograma("latencia_seconds", "Latencia", ("ruta",), buckets=(0.1, 1))
+    latencia.observar(0.05, ruta="/a")
+    latencia.observar(0.5, ruta="/a")
+    registro.contador("pedidos_total", "Pedidos").incrementar(3)
+    registro.medidor("conexiones", "Conexiones", ("partida",)).usar_fuente(lambda: {1: 2, 3: 0})
+
+    texto = registro.exponer()
+    assert "# TYPE latencia_seconds histogram" in texto
+    assert 'latencia_seconds_bucket{ruta="/a",le="0.1"} 1' in texto
+    assert 'latencia_seconds_bucket{ruta="/a",le="1"} 2' in texto
+    assert 'latencia_seconds_bucket{ruta="/a",le="+Inf"} 2' in texto
+    assert 'latencia_seconds_count{ruta="/a"} 2' in texto
+    assert "pedidos_total 3" in texto
+    assert 'conexiones{partida="1"} 2' in texto and 'conexiones{partida="3"} 0' in texto
+    with pytest.raises(ValueError):
+        latencia.observar(1, metodo="GET")
+
+
+def test_por_minuto_descarta_lo_viejo():
+    por_minuto = RegistroMetricas().por_minuto("iniciadas", "Iniciadas")
+    for instante in (0, 30, 59.5):
+        por_minuto.registrar(instante)
+    assert por_minuto.valor(60) == 2
+    assert por_minuto.valor(200) == 0
+
+
+def test_broadcast_mide_destinatarios():
+    manager = ConnectionManager()
+    manager.active_connections[1] = [AsyncMock(), AsyncMock(), AsyncMock()]
+    antes = destinatarios_broadcast.cantidad()
+    asyncio.run(manager.broadcast(1, '{"evento": "x"}'))
+    assert destinatarios_broadcast.cantidad() == antes + 1
+    assert manager.conexiones_por_partida() == {1: 3}
+
+
+def test_endpoint_metrics(engine):
+    Sesion = get_session_local(engine)
+    with Sesion() as db:
+        datos = crearPartida(PartidaData(**{
+            "nombre-partida": "p", "max-jugadores": 6, "min-jugadores": 2,
+            "nombre-jugador": "j0", "dia-nacimiento": "1990-01-01",
+        }), db)
+        unir_a_partida(datos.id_partida, JugadorData(nombreJugador="j1", fechaNacimiento="1991-01-01"), db)
+        iniciarPartida(datos.id_partida, IniciarPartidaData(id_jugador=datos.id_jugador), db)
+
+    def get_db_override():
+        with Sesion() as db:
+            yield db
+    app.dependency_overrides[get_db] = get_db_override
+    try:
+        client = TestClient(app)
+        client.get(f"/partidas/{datos.id_partida}")
+        respuesta = client.get("/metrics")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"].startswith("text/plain")
+    texto = respuesta.text
+    assert 'http_request_duration_seconds_count{metodo="GET",ruta="/partidas/{id_partida}"}' in texto
+    assert 'http_request_db_seconds_sum{metodo="GET",ruta="/partidas/{id_partida}"}' in texto
+    assert "partidas_en_curso 1" in texto
+    assert "# TYPE ws_conexiones_activas gauge" in texto
+    assert "partidas_terminadas_ultimo_minuto" in texto
@@ -0,0 +1,42 @@
+import pytest
+import os
+import pstats
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from game.modelos.perfilado import CABECERA_PERFIL, CABECERA_PERFILAR, instalar_perfilado
+
+
+def calculo_lento():
+    return sum(i * i for i in range(20000))
+
+
+@pytest.fixture
+def cliente(tmp_path):
+    app = FastAPI()
+
+    @app.get("/partidas/{id_partida}/lento")
+    async def lento(id_partida: int):
+        return {"total": calculo_lento()}
+
+    instalar_perfilado(app, str(tmp_path / "perfiles"))
+    return TestClient(app), tmp_path / "perfiles"
+
+
+def test_sin_pedido_no_perfila(cliente):
+    client, directorio = cliente
+    respuesta = client.get("/partidas/1/lento")
+    assert respuesta.status_code == 200
+    assert CABECERA_PERFIL not in respuesta.headers
+    assert not directorio.exists()
+
+
+@pytest.mark.parametrize("pedido", [{"headers": {CABECERA_PERFILAR: "1"}}, {"params": {"perfilar": "true"}}])
+def test_perfila_con_cabecera_o_parametro(cliente, pedido):
+    client, directorio = cliente
+    respuesta = client.get("/partidas/1/lento", **pedido)
+    assert respuesta.status_code == 200
+    nombre = respuesta.headers[CABECERA_PERFIL]
+    assert nombre.endswith("-GET-partidas-id_partida-lento.pstats")
+    funciones = {f[2] for f in pstats.Stats(str(directorio / nombre)).stats}
+    assert "calculo_lento" in funciones
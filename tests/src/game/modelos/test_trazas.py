@@ -0,0 +1,81 @@
+import pytest
+import asyncio
+import json
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from fastapi.testclient import TestClient
+from game.modelos.db import get_db, get_session_local
+from game.modelos.trazas import (CABECERA_TRAZA, RegistroTrazas, agregar_traza, cerrar_traza, iniciar_traza,
+                                 registro_trazas)
+from game.partidas.endpoints import ConnectionManager
+from main import app
+
+
+def test_agregar_traza_solo_con_traza_activa():
+    assert agregar_traza('{"evento": "x"}') == '{"evento": "x"}'
+    traza, token = iniciar_traza("abc-123")
+    try:
+        assert json.loads(agregar_traza('{"evento": "x"}')) == {"evento": "x", "traza": "abc-123"}
+        assert agregar_traza("no es json") == "no es json"
+    finally:
+        cerrar_traza(token)
+    traza, token = iniciar_traza("id con espacios")
+    cerrar_traza(token)
+    assert traza.id != "id con espacios" and len(traza.id) == 16
+
+
+def test_registro_acotado_por_partida():
+    registro = RegistroTrazas(max_partidas=2, max_eventos=3)
+    traza, token = iniciar_traza()
+    try:
+        for id_partida in (1, 2, 2, 2, 2, 3):
+            registro.registrar_entrega(id_partida, 7, "broadcast", traza.inicio_us)
+    finally:
+        cerrar_traza(token)
+    assert registro.exportar(1)["traceEvents"] == []
+    assert len(registro.exportar(2)["traceEvents"]) == 3
+    assert registro.exportar(3)["traceEvents"][0]["tid"] == "jugador-7"
+
+
+def test_del_request_a_cada_destinatario(engine):
+    Sesion = get_session_local(engine)
+
+    def get_db_override():
+        with Sesion() as db:
+            yield db
+    app.dependency_overrides[get_db] = get_db_override
+    try:
+        client = TestClient(app)
+        creacion = client.post("/partidas", json={
+            "nombre-partida": "p", "max-jugadores": 4, "min-jugadores": 2,
+            "nombre-jugador": "j0", "dia-nacimiento": "2000-01-01",
+        }).json()
+        id_partida, id_jugador = creacion["id_partida"], creacion["id_jugador"]
+        with client.websocket_connect(f"/partidas/ws/{id_partida}/{id_jugador}") as ws:
+            union = client.post(f"/partidas/{id_partida}", json={"nombreJugador": "j1", "fechaNacimiento": "2001-02-02"},
+                                headers={CABECERA_TRAZA: "union-1"})
+            evento = ws.receive_json()
+        trazas = client.get(f"/partidas-trazas/{id_partida}").json()
+    finally:
+        app.dependency_overrides.clear()
+
+    assert union.headers[CABECERA_TRAZA] == "union-1"
+    assert evento["evento"] == "union-jugador" and evento["traza"] == "union-1"
+    de_la_union = [e for e in trazas["traceEvents"] if e["args"]["traza"] == "union-1"]
+    http = next(e for e in de_la_union if e["cat"] == "http")
+    entrega = next(e for e in de_la_union if e["cat"] == "ws")
+    assert http["name"] == "POST /partidas/{id_partida}" and http["pid"] == id_partida
+    assert entrega["tid"] == f"jugador-{id_jugador}"
+    assert entrega["args"]["desde_request_ms"] >= 0
+    assert http["ts"] <= entrega["ts"] <= http["ts"] + http["dur"]
+
+
+def test_cerrar_la_partida_descarta_sus_trazas():
+    traza, token = iniciar_traza()
+    try:
+        registro_trazas.registrar_entrega(991, 1, "broadcast", traza.inicio_us)
+    finally:
+        cerrar_traza(token)
+    assert registro_trazas.exportar(991)["traceEvents"]
+    asyncio.run(ConnectionManager().clean_connections(991))
+    assert registro_trazas.exportar(991)["traceEvents"] == []
@@ -0,0 +1,52 @@
+import pytest
+import asyncio
+import inspect
+import logging
+import os
+import time
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from game.modelos.vigilancia import VigilanteEventLoop, rutas_por_codigo, bloqueos_event_loop
+from game.partidas.endpoints import cards_off_the_table
+from main import app
+
+
+async def endpoint_bloqueante():
+    time.sleep(0.3)
+
+
+def test_detecta_el_bloqueo_y_la_ruta(caplog):
+    vigilante = VigilanteEventLoop(0.02, 0.05, {endpoint_bloqueante.__code__: "GET /bloquea"})
+    antes = bloqueos_event_loop.valor(ruta="GET /bloquea")
+
+    async def escenario():
+        vigilante.iniciar()
+        await asyncio.sleep(0.05)
+        await endpoint_bloqueante()
+        await asyncio.sleep(0.05)
+        await vigilante.detener()
+
+    with caplog.at_level(logging.WARNING, logger="game.modelos.vigilancia"):
+        asyncio.run(escenario())
+
+    assert vigilante.bloqueos == 1
+    assert bloqueos_event_loop.valor(ruta="GET /bloquea") == antes + 1
+    assert vigilante.lag_max >= 0.2
+    assert any("GET /bloquea" in r.message and "time.sleep(0.3)" in r.message for r in caplog.records)
+
+
+def test_sin_bloqueos_no_reporta():
+    vigilante = VigilanteEventLoop(0.01, 0.2)
+
+    async def escenario():
+        vigilante.iniciar()
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        await vigilante.detener()
+
+    asyncio.run(escenario())
+    assert vigilante.bloqueos == 0
+
+
+def test_rutas_de_los_endpoints_decorados():
+    rutas = rutas_por_codigo(app)
+    assert rutas[inspect.unwrap(cards_off_the_table).__code__] == "PUT /partidas/{id_partida}/evento/CardsTable"
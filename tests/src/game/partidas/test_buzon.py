@@ -0,0 +1,149 @@
+import asyncio
+import inspect
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from game.partidas.buzon import en_buzon, pausa_fuera_del_buzon, registro_buzones, serializar_por_partida
+from game.partidas.endpoints import agregar_a_set
+from game.partidas.schemas import AgregarCartaSetPayload
+from main import app
+
+
+async def _accion(id_partida, nombre, registro, pausa=0.01):
+    async with en_buzon(id_partida):
+        registro.append(("inicio", nombre))
+        await asyncio.sleep(pausa)
+        registro.append(("fin", nombre))
+
+
+def test_misma_partida_en_orden_y_sin_intercalar():
+    registro = []
+
+    async def _correr():
+        await asyncio.gather(*(_accion(1, n, registro) for n in ("a", "b", "c")))
+        return registro_buzones.buzon(1).como_dict()
+
+    stats = asyncio.run(_correr())
+    assert registro == [("inicio", "a"), ("fin", "a"), ("inicio", "b"), ("fin", "b"), ("inicio", "c"), ("fin", "c")]
+    assert stats["atendidas"] == 3
+    assert stats["en_cola_max"] == 3
+    assert stats["en_cola"] == 0
+    assert stats["espera_max_s"] > 0
+
+
+def test_partidas_distintas_corren_en_paralelo():
+    registro = []
+
+    async def _correr():
+        await asyncio.gather(_accion(1, "p1", registro), _accion(2, "p2", registro))
+
+    asyncio.run(_correr())
+    assert registro[:2] == [("inicio", "p1"), ("inicio", "p2")]
+
+
+def test_cancelar_una_espera_no_traba_la_cola():
+    registro = []
+
+    async def _correr():
+        primera = asyncio.create_task(_accion(1, "a", registro, pausa=0.05))
+        await asyncio.sleep(0)
+        segunda = asyncio.create_task(_accion(1, "b", registro))
+        tercera = asyncio.create_task(_accion(1, "c", registro))
+        await asyncio.sleep(0.01)
+        segunda.cancel()
+        await asyncio.gather(primera, tercera)
+        with pytest.raises(asyncio.CancelledError):
+            await segunda
+
+    asyncio.run(_correr())
+    assert [n for evento, n in registro if evento == "inicio"] == ["a", "c"]
+
+
+def test_error_en_la_accion_libera_el_turno():
+    async def _falla():
+        async with en_buzon(1):
+            raise ValueError("falla")
+
+    async def _correr():
+        with pytest.raises(ValueError):
+            await _falla()
+        await asyncio.wait_for(_accion(1, "siguiente", []), timeout=1)
+
+    asyncio.run(_correr())
+
+
+def test_decorador_conserva_la_firma_y_usa_id_partida():
+    vistos = []
+
+    @serializar_por_partida
+    async def endpoint(id_partida: int, id_jugador: int, db=None):
+        vistos.append(registro_buzones.buzon(id_partida).profundidad)
+        return id_jugador
+
+    assert list(inspect.signature(endpoint).parameters) == ["id_partida", "id_jugador", "db"]
+    assert asyncio.run(endpoint(id_partida=7, id_jugador=3)) == 3
+    assert vistos == [1]
+
+
+def test_agregar_a_set_concurrentes_hacen_cola():
+    registro = []
+
+    async def ejecutar_db_lento(func, id_partida, payload, db):
+        registro.append(("inicio", payload.id_carta_instancia))
+        await asyncio.sleep(0.01)
+        registro.append(("fin", payload.id_carta_instancia))
+        return SimpleNamespace(id=1)
+
+    async def _correr():
+        with patch("game.partidas.endpoints.ejecutar_db", ejecutar_db_lento):
+            await asyncio.gather(*(
+                agregar_a_set(id_partida=11, db=None, payload=AgregarCartaSetPayload(
+                    id_carta_instancia=n, id_jugador_set=1, id_tipo_set=1))
+                for n in (1, 2)
+            ))
+        return registro_buzones.buzon(11).como_dict()
+
+    stats = asyncio.run(_correr())
+    assert registro == [("inicio", 1), ("fin", 1), ("inicio", 2), ("fin", 2)]
+    assert stats["en_cola_max"] == 2
+
+
+def test_pausa_suelta_el_buzon_mientras_espera():
+    registro = []
+
+    async def con_pausa():
+        async with en_buzon(12):
+            registro.append("evento jugado")
+            await pausa_fuera_del_buzon(0.05)
+            registro.append("evento resuelto")
+
+    async def respuesta():
+        await asyncio.sleep(0.01)
+        async with en_buzon(12):
+            registro.append("not so fast")
+
+    async def _correr():
+        await asyncio.wait_for(asyncio.gather(con_pausa(), respuesta()), timeout=1)
+        return registro_buzones.estadisticas().get(12)
+
+    stats = asyncio.run(_correr())
+    assert registro == ["evento jugado", "not so fast", "evento resuelto"]
+    assert stats is None or stats["en_cola"] == 0
+
+
+def test_partida_terminada_se_olvida_al_vaciarse():
+    async def _correr():
+        async with en_buzon(9):
+            registro_buzones.descartar(9)
+            assert 9 in registro_buzones.estadisticas()
+        assert 9 not in registro_buzones.estadisticas()
+
+    asyncio.run(_correr())
+
+
+def test_endpoint_estadisticas_buzones():
+    response = TestClient(app).get("/partidas-buzones")
+    assert response.status_code == 200
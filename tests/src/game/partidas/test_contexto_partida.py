@@ -0,0 +1,81 @@
+import pytest
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+from game.modelos.db import get_db, unidad_de_trabajo
+from game.partidas.utils import validar_accion_evento, verif_send_card, enviar_mensaje, eliminarPartida
+from game.partidas.schemas import Mensaje
+from game.partidas.models import Partida
+from game.cartas.models import Carta
+from game.jugadores.models import Jugador
+from main import app
+
+
+@pytest.fixture
+def partida(engine, db, nueva_partida):
+    id_partida, _ = nueva_partida(jugadores=3)
+
+    # el jugador en turno recibe una carta de evento del mazo
+    p = db.get(Partida, id_partida)
+    turno, otro = p.turno_id, next(j.id for j in p.jugadores if j.id != p.turno_id)
+    with unidad_de_trabajo(db):
+        evento = db.query(Carta).filter_by(partida_id=p.id, ubicacion="mazo_robo", tipo="Event").first()
+        evento.ubicacion, evento.jugador_id = "mano", turno
+    id_evento = evento.id_carta
+    db.close()  # los tests arrancan con la sesion vacia
+
+    sentencias = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: sentencias.append(statement))
+    yield db, id_partida, turno, otro, id_evento, sentencias
+
+
+def test_validar_evento_en_dos_consultas(partida):
+    db, id_partida, turno, _, id_evento, sentencias = partida
+    carta = validar_accion_evento(id_partida, turno, id_evento, db)
+    assert carta.id_carta == id_evento and carta.jugador_id == turno
+    assert len(sentencias) <= 2  # partida + jugadores, cartas de los jugadores
+
+
+def test_enviar_carta_y_chat(partida):
+    db, id_partida, turno, otro, _, sentencias = partida
+    id_carta = db.query(Carta).filter_by(jugador_id=turno, ubicacion="mano").first().id
+    db.rollback()
+    sentencias.clear()
+    assert verif_send_card(id_partida, id_carta, turno, otro, db) is True
+    assert len(sentencias) <= 2
+
+    nombre = db.get(Jugador, otro).nombre
+    db.rollback()
+    sentencias.clear()
+    assert enviar_mensaje(id_partida, otro, Mensaje(nombreJugador=nombre, texto="hola"), db) is True
+    assert len(sentencias) <= 2  # perfil LOBBY: partida y jugadores
+
+
+def test_validacion_fallida_sigue_igual(partida):
+    db, id_partida, _, otro, id_evento, _ = partida
+    with pytest.raises(ValueError, match="no esta en turno"):
+        validar_accion_evento(id_partida, otro, id_evento, db)
+
+
+def test_lobby_y_cierre_acotados(partida):
+    db, id_partida, _, _, _, sentencias = partida
+
+    def get_db_override():
+        yield db
+    app.dependency_overrides[get_db] = get_db_override
+    try:
+        respuesta = TestClient(app).get(f"/partidas/{id_partida}")
+    finally:
+        app.dependency_overrides.clear()
+    assert respuesta.status_code == 200
+    assert len(respuesta.json()["listaJugadores"]) == 3
+    assert len([s for s in sentencias if s.lstrip().upper().startswith("SELECT")]) <= 2
+
+    db.rollback()
+    sentencias.clear()
+    with unidad_de_trabajo(db):
+        eliminarPartida(id_partida, db, archivar=True)
+    lecturas = [s for s in sentencias if s.lstrip().upper().startswith("SELECT")]
+    assert len(lecturas) <= 5  # partida, jugadores, cartas, sets y el chequeo de version
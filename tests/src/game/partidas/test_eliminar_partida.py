@@ -0,0 +1,77 @@
+import pytest
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from sqlalchemy import event
+from game.partidas.utils import crearPartida, unir_a_partida, iniciarPartida, eliminarPartida
+from game.partidas.schemas import PartidaData, IniciarPartidaData
+from game.partidas.services import PartidaService
+from game.partidas.models import Partida, VotacionEvento, PartidaHistorial
+from game.jugadores.schemas import JugadorData
+from game.jugadores.models import Jugador
+from game.cartas.models import Carta, SetJugado, SetJugadoCarta
+
+
+def partida_en_juego(db, nombre="p"):
+    partida = crearPartida(PartidaData(**{
+        "nombre-partida": nombre, "max-jugadores": 4, "min-jugadores": 2,
+        "nombre-jugador": "ana", "dia-nacimiento": "1990-01-01",
+    }), db)
+    otro = unir_a_partida(partida.id_partida, JugadorData(nombreJugador="beto", fechaNacimiento="1991-01-01"), db)
+    iniciarPartida(partida.id_partida, IniciarPartidaData(id_jugador=partida.id_jugador), db)
+    db.add(SetJugado(partida_id=partida.id_partida, jugador_id=partida.id_jugador,
+                     representacion_id_carta=7, cartas_ids_csv="7,7,7"))
+    db.add(VotacionEvento(partida_id=partida.id_partida, votante_id=partida.id_jugador, votado_id=otro.id_jugador))
+    # carta sacada de la partida (p.ej. Delay the murderer's escape) que sigue a nombre de un jugador
+    db.add(Carta(id_carta=23, nombre="Delay the murderer's escape!", tipo="Event", ubicacion="eliminada",
+                 partida_id=0, jugador_id=otro.id_jugador))
+    db.commit()
+    return partida.id_partida
+
+
+def test_eliminar_partida_borra_todo_por_conjunto(engine, db):
+    id_partida = partida_en_juego(db)
+    id_otra = partida_en_juego(db, "otra")
+    cartas_otra = db.query(Carta).filter_by(partida_id=id_otra).count()
+
+    deletes, commits = [], []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _contar(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("DELETE"):
+            deletes.append(statement)
+
+    eliminarPartida(id_partida, db, archivar=False)
+
+    assert len(deletes) == 6
+    assert len(commits) == 1
+    assert db.query(Partida).filter_by(id=id_partida).count() == 0
+    assert db.query(Jugador).filter_by(partida_id=id_partida).count() == 0
+    assert db.query(Carta).filter_by(partida_id=id_partida).count() == 0
+    assert db.query(Carta).filter_by(ubicacion="eliminada").count() == 1  # la de la otra partida
+    assert db.query(SetJugado).filter_by(partida_id=id_partida).count() == 0
+    assert db.query(SetJugadoCarta).count() == 3  # solo las del set de la otra partida
+    assert db.query(VotacionEvento).filter_by(partida_id=id_partida).count() == 0
+    assert db.query(PartidaHistorial).count() == 0
+    # la otra partida queda intacta
+    assert db.query(Carta).filter_by(partida_id=id_otra).count() == cartas_otra
+
+
+def test_eliminar_partida_archiva_estado_final(db):
+    id_partida = partida_en_juego(db)
+    asesino = db.query(Carta).filter_by(partida_id=id_partida, nombre="murderer").one()
+    id_asesino = asesino.jugador_id
+    asesino.bocaArriba = True
+    db.commit()
+
+    eliminarPartida(id_partida, db, archivar=True)
+
+    historial = PartidaService(db).obtener_historial(id_partida)
+    assert historial["asesino_gano"] is False
+    assert id_asesino not in historial["ganadores"]
+    assert len(historial["ganadores"]) == 1
+    estado = historial["estado_final"]
+    assert {j["nombre"] for j in estado["jugadores"]} == {"ana", "beto"}
+    assert any(c["nombre"] == "murderer" and c["bocaArriba"] for c in estado["cartas"])
+    assert estado["sets"][0]["cartas_ids"] == [7, 7, 7]
+    assert db.query(Partida).filter_by(id=id_partida).count() == 0
@@ -1438,7 +1438,7 @@ def test_revelar_secreto(session):
     # Carta secreto
     carta = Carta(
         id=1,
-        id_carta=3,
+        id_carta=4,
         nombre="accomplice",
         tipo="secreto",
         bocaArriba=False,
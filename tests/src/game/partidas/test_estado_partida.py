@@ -0,0 +1,117 @@
+import pytest
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from sqlalchemy import event
+from game.modelos.db import unidad_de_trabajo
+from game.partidas.utils import ids_asesino_complice, mostrar_mazo_draft, eliminarPartida
+from game.partidas.services import PartidaService
+from game.partidas.estado import registro_estados, EstadoPartida
+from game.cartas.models import Carta
+from game.cartas.services import CartaService
+from settings import settings
+
+
+@pytest.fixture
+def partida(engine, db, nueva_partida):
+    id_partida, _ = nueva_partida(jugadores=5, estado_en_memoria=True)
+    selects = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: selects.append(statement)
+                 if statement.lstrip().upper().startswith("SELECT") else None)
+    yield db, id_partida, selects
+
+
+def test_lecturas_repetidas_no_vuelven_a_la_base(partida):
+    db, id_partida, selects = partida
+    ps, cs = PartidaService(db), CartaService(db)
+
+    turno = ps.obtener_turno_actual(id_partida)
+    cantidad = cs.obtener_cantidad_mazo(id_partida)
+    assert len(selects) == 3  # partida, jugadores y cartas
+    selects.clear()
+
+    assert ps.obtener_turno_actual(id_partida) == turno
+    assert cs.obtener_cantidad_mazo(id_partida) == cantidad == len(cs.obtener_mazo_de_robo(id_partida))
+    assert len(mostrar_mazo_draft(id_partida, db)) == 3
+    roles = ids_asesino_complice(db, id_partida)
+    assert roles["asesino-id"] is not None and roles["complice-id"] is not None
+    assert len(selects) == 1  # solo obtener_mazo_de_robo
+
+
+def test_commit_invalida_la_foto(partida):
+    db, id_partida, selects = partida
+    cs = CartaService(db)
+    antes = cs.obtener_cantidad_mazo(id_partida)
+
+    with unidad_de_trabajo(db):
+        turno = PartidaService(db).obtener_turno_actual(id_partida)
+        cs.robar_cartas(id_partida, turno, 2)
+        # con cambios sin confirmar se lee de la base
+        assert cs.obtener_cantidad_mazo(id_partida) == antes - 2
+
+    assert cs.obtener_cantidad_mazo(id_partida) == antes - 2
+    assert registro_estados.obtener(db, id_partida).cantidad_mazo() == antes - 2
+
+
+def test_rollback_no_invalida_y_sentencias_masivas_si(partida):
+    db, id_partida, selects = partida
+    estado = registro_estados.obtener(db, id_partida)
+
+    with pytest.raises(ValueError):
+        with unidad_de_trabajo(db):
+            db.query(Carta).filter_by(partida_id=id_partida).update({"bocaArriba": True})
+            raise ValueError("se revierte")
+    assert registro_estados.obtener(db, id_partida) is estado
+
+    with unidad_de_trabajo(db):
+        db.query(Carta).filter_by(partida_id=id_partida, ubicacion="draft").delete()
+    nuevo = registro_estados.obtener(db, id_partida)
+    assert nuevo is not estado
+    assert nuevo.draft == ()
+
+
+def test_no_guarda_una_foto_invalidada_mientras_se_armaba(partida, monkeypatch):
+    db, id_partida, selects = partida
+    original = EstadoPartida.__dict__["cargar"]
+    cargar = original.__func__
+
+    def cargar_con_commit_en_el_medio(cls, db, id_partida):
+        estado = cargar(cls, db, id_partida)
+        registro_estados.invalidar(db.get_bind(), {id_partida})
+        return estado
+
+    EstadoPartida.cargar = classmethod(cargar_con_commit_en_el_medio)
+    try:
+        assert registro_estados.obtener(db, id_partida) is not None
+    finally:
+        EstadoPartida.cargar = original
+    selects.clear()
+    registro_estados.obtener(db, id_partida)
+    assert selects  # se volvio a armar
+
+
+def test_apagado_lee_siempre_de_la_base(partida, monkeypatch):
+    db, id_partida, selects = partida
+    monkeypatch.setattr(settings, "ESTADO_EN_MEMORIA", False)
+    assert registro_estados.obtener(db, id_partida) is None
+    PartidaService(db).obtener_turno_actual(id_partida)
+    assert selects
+
+    # sin fotos no se averigua que partidas toco cada commit
+    invalidaciones = registro_estados.invalidaciones
+    with unidad_de_trabajo(db):
+        db.query(Carta).filter_by(partida_id=id_partida, ubicacion="mazo_robo").first().bocaArriba = True
+        db.flush()
+        assert "partidas_modificadas" in db.info
+    assert registro_estados.invalidaciones == invalidaciones
+
+
+def test_eliminar_una_partida_no_invalida_las_demas(partida, nueva_partida):
+    db, id_partida, selects = partida
+    otra, _ = nueva_partida(estado_en_memoria=True)
+    assert registro_estados.obtener(db, id_partida) is not None
+
+    eliminarPartida(otra, db, archivar=False)
+    selects.clear()
+    assert registro_estados.obtener(db, id_partida) is not None
+    assert selects == []
@@ -17,6 +17,7 @@ import json
 from starlette.websockets import WebSocket
 from sqlalchemy.pool import StaticPool
 from types import SimpleNamespace
+from game.partidas.victoria import FinPartida, ASESINO_GANA
 
 # Base de datos en memoria
 @pytest.fixture(name="session")
@@ -35,7 +36,7 @@ def dbTesting_fixture():
         yield session
 
 #----------------Test ganar por desgracia social ok------------
-@patch("game.partidas.endpoints.ganar_por_desgracia_social")
+@patch("game.partidas.endpoints.evaluar_fin_partida")
 @patch("game.partidas.endpoints.eliminarPartida")
 @patch("game.partidas.endpoints.manager")
 @patch("game.partidas.endpoints.CartaService")
@@ -43,7 +44,7 @@ def dbTesting_fixture():
 @patch("game.partidas.endpoints.determinar_desgracia_social")
 @patch("game.partidas.endpoints.obtener_jugador_por_id_carta")
 def test_ganar_desgracia_social(mock_obtener_jugador_por_id_carta, mock_determinar_desgracia_social, mock_revelarSecreto, 
-                                mock_CartaService, mock_manager, mock_ganar_por_desgracia_social, mock_eliminarPartida, session):
+                                mock_CartaService, mock_manager, mock_eliminarPartida, mock_evaluar_fin_partida, session):
     def get_db_override():
         yield session
     app.dependency_overrides[get_db] = get_db_override
@@ -68,7 +69,7 @@ def test_ganar_desgracia_social(mock_obtener_jugador_por_id_carta, mock_determin
     carta_service_instance.es_complice.return_value = False
 
     mock_CartaService.return_value = carta_service_instance
-    mock_ganar_por_desgracia_social.return_value = True  
+    mock_evaluar_fin_partida.return_value = FinPartida(ASESINO_GANA, True, [2])
 
     response = client.patch("/partidas/1/revelacion?id_jugador_turno=1&id_unico_secreto=65")
 
@@ -81,21 +82,22 @@ def test_ganar_desgracia_social(mock_obtener_jugador_por_id_carta, mock_determin
     assert mock_determinar_desgracia_social.call_count == 2
     mock_revelarSecreto.assert_called_once_with(1, 1, 65, session)
     assert mock_manager.broadcast.await_count >= 1
-    mock_ganar_por_desgracia_social.assert_called_once_with(1, session)
-    assert mock_ganar_por_desgracia_social.return_value is True
+    mock_evaluar_fin_partida.assert_called_once_with(1, session)
+    fin = json.loads(mock_manager.broadcast.await_args_list[-1].args[1])
+    assert fin["evento"] == "fin-partida" and fin["asesinoGano"] is True and fin["ganadores"] == [2]
     mock_manager.clean_connections.assert_awaited_once_with(1)
     mock_eliminarPartida.assert_called_once_with(1, session)
 
 
 #----------------Test ganar asesino al revelar su secreto propio------------
-@patch("game.partidas.endpoints.ganar_por_desgracia_social")
+@patch("game.partidas.endpoints.evaluar_fin_partida")
 @patch("game.partidas.endpoints.eliminarPartida")
 @patch("game.partidas.endpoints.manager")
 @patch("game.partidas.endpoints.CartaService")
 @patch("game.partidas.endpoints.revelarSecretoPropio")
 @patch("game.partidas.endpoints.determinar_desgracia_social")
 def test_revelar_secreto_propio_gana_asesino(mock_desgracia_social, mock_revelarSecretoPropio, mock_CartaService, 
-                                             mock_manager, mock_eliminarPartida, mock_ganar_desgracia_social, session):
+                                             mock_manager, mock_eliminarPartida, mock_evaluar_fin_partida, session):
 
     def get_db_override():
         yield session
@@ -117,7 +119,7 @@ def test_revelar_secreto_propio_gana_asesino(mock_desgracia_social, mock_revelar
     cs_instance.es_complice.return_value = False
     mock_CartaService.return_value = cs_instance
 
-    mock_ganar_desgracia_social.return_value = True
+    mock_evaluar_fin_partida.return_value = FinPartida(ASESINO_GANA, True, [2])
 
     response = client.patch("/partidas/1/revelacion-propia?id_jugador=2&id_unico_secreto=65")
 
@@ -129,9 +131,9 @@ def test_revelar_secreto_propio_gana_asesino(mock_desgracia_social, mock_revelar
     mock_revelarSecretoPropio.assert_called_once_with(1, 2, 65, session)
     assert mock_desgracia_social.call_count == 2
     cs_instance.obtener_secretos_jugador.assert_called_once_with(secreto_revelado.jugador_id, 1)
-    cs_instance.es_asesino.assert_called_once_with(65)
-    mock_ganar_desgracia_social.assert_called_once_with(1, session)
-    assert mock_ganar_desgracia_social.return_value is True
+    mock_evaluar_fin_partida.assert_called_once_with(1, session)
+    fin = json.loads(mock_manager.broadcast.await_args_list[-1].args[1])
+    assert fin["payload"] == {"ganadores": [2], "asesinoGano": True}
     assert mock_manager.broadcast.await_count >= 1
     mock_manager.clean_connections.assert_awaited_once_with(1)
     mock_eliminarPartida.assert_called_once_with(1, session)
@@ -0,0 +1,64 @@
+import pytest
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from collections import Counter
+from sqlalchemy import event
+from game.partidas.utils import crearPartida, unir_a_partida, iniciarPartida
+from game.partidas.schemas import PartidaData, IniciarPartidaData
+from game.jugadores.schemas import JugadorData
+from game.partidas.models import Partida
+from game.cartas.models import Carta
+from game.cartas.constants import cartasDict
+
+
+def armar_partida(db, cantidad_jugadores):
+    partida = crearPartida(PartidaData(**{
+        "nombre-partida": "p", "max-jugadores": 6, "min-jugadores": 2,
+        "nombre-jugador": "j0", "dia-nacimiento": "1990-01-01",
+    }), db)
+    for i in range(1, cantidad_jugadores):
+        unir_a_partida(partida.id_partida, JugadorData(nombreJugador=f"j{i}", fechaNacimiento="1991-01-01"), db)
+    return partida
+
+
+@pytest.mark.parametrize("cantidad_jugadores", [2, 3, 4, 5, 6])
+def test_iniciar_partida_reparte_todo(db, cantidad_jugadores):
+    partida = armar_partida(db, cantidad_jugadores)
+    iniciarPartida(partida.id_partida, IniciarPartidaData(id_jugador=partida.id_jugador), db)
+
+    jugadores = db.get(Partida, partida.id_partida).jugadores
+    cartas = db.query(Carta).filter_by(partida_id=partida.id_partida).all()
+    mazo = [c for c in cartas if c.tipo != "secreto"]
+    secretos = [c for c in cartas if c.tipo == "secreto"]
+
+    assert len(mazo) == sum(c["cantidad"] for c in cartasDict.values())
+    for jugador in jugadores:
+        mano = [c for c in mazo if c.jugador_id == jugador.id and c.ubicacion == "mano"]
+        assert len(mano) == 6
+        assert any(c.nombre == "Not so fast" for c in mano)
+        assert all(c.orden_mazo is None for c in mano)
+        assert len([s for s in secretos if s.jugador_id == jugador.id]) == 3
+
+    ubicaciones = Counter(c.ubicacion for c in mazo)
+    assert ubicaciones["draft"] == 3
+    assert ubicaciones["mazo_robo"] == len(mazo) - 6 * cantidad_jugadores - 3
+    ordenes = [c.orden_mazo for c in mazo if c.ubicacion == "mazo_robo"]
+    assert len(set(ordenes)) == len(ordenes)
+
+    nombres = Counter(s.nombre for s in secretos)
+    assert nombres["murderer"] == 1
+    assert nombres["accomplice"] == (1 if cantidad_jugadores >= 5 else 0)
+
+
+def test_iniciar_partida_un_solo_insert_de_cartas(engine, db):
+    partida = armar_partida(db, 4)
+
+    inserts = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _contar(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO cartas"):
+            inserts.append(statement)
+
+    iniciarPartida(partida.id_partida, IniciarPartidaData(id_jugador=partida.id_jugador), db)
+    assert len(inserts) == 1
@@ -0,0 +1,95 @@
+import pytest
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from sqlalchemy import event
+from game.modelos.db import unidad_de_trabajo
+from game.partidas.models import Partida
+from game.cartas.models import Carta
+from game.cartas.services import CartaService
+
+
+@pytest.fixture
+def partida(engine, db, nueva_partida):
+    id_partida, (id_jugador, _) = nueva_partida()
+    sentencias = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: sentencias.append(statement.lower()))
+    yield db, id_partida, id_jugador, sentencias
+
+
+def contadores_coinciden(db, id_partida):
+    partida = db.get(Partida, id_partida)
+    cartas = db.query(Carta).filter_by(partida_id=id_partida).all()
+    mazo = [c.orden_mazo for c in cartas if c.ubicacion == "mazo_robo"]
+    descarte = [c.orden_descarte for c in cartas if c.ubicacion == "descarte"]
+    assert partida.cartas_mazo_robo == len(mazo)
+    assert partida.cartas_descarte == len(descarte)
+    assert all(partida.orden_tope_mazo <= orden for orden in mazo)
+    assert all(partida.orden_tope_descarte >= orden for orden in descarte)
+
+
+def test_contadores_al_iniciar(partida):
+    db, id_partida, _, _ = partida
+    assert db.get(Partida, id_partida).cartas_mazo_robo > 0
+    contadores_coinciden(db, id_partida)
+
+
+def test_descartar_y_robar_sin_agregados(partida):
+    db, id_partida, id_jugador, sentencias = partida
+    cs = CartaService(db)
+    antes = cs.obtener_cantidad_mazo(id_partida)
+    sentencias.clear()
+
+    with unidad_de_trabajo(db):
+        mano = cs.obtener_mano_jugador(id_jugador, id_partida)
+        cs.descartar_cartas(id_jugador, [mano[0].id_carta, mano[1].id_carta])
+        cs.robar_cartas(id_partida, id_jugador, 2)
+
+    assert not [s for s in sentencias if "max(" in s or "min(" in s or "count(" in s]
+    assert cs.obtener_cantidad_mazo(id_partida) == antes - 2
+    partida_db = db.get(Partida, id_partida)
+    assert partida_db.cartas_descarte == 2
+    assert [c.orden_descarte for c in cs.obtener_cartas_descarte(id_partida, 2)] == [2, 1]
+    contadores_coinciden(db, id_partida)
+
+
+def test_delay_the_murderer_pone_las_cartas_arriba_del_mazo(partida):
+    db, id_partida, id_jugador, _ = partida
+    cs = CartaService(db)
+    with unidad_de_trabajo(db):
+        mano = cs.obtener_mano_jugador(id_jugador, id_partida)
+        cs.descartar_cartas(id_jugador, [c.id_carta for c in mano[:3]])
+    ids_descarte = [c.id for c in cs.obtener_cartas_descarte(id_partida, 3)]
+
+    with unidad_de_trabajo(db):
+        cs.jugar_delay_the_murderer_escape(id_partida, id_jugador, 3)
+
+    # la ultima en apoyarse queda en el tope y se roba primero
+    assert [c.id for c in cs.tope_mazo_robo(id_partida, 3)] == list(reversed(ids_descarte))
+    assert db.get(Partida, id_partida).cartas_descarte == 0
+    contadores_coinciden(db, id_partida)
+
+
+def test_early_train_sigue_el_orden_del_descarte(partida):
+    db, id_partida, id_jugador, _ = partida
+    cs = CartaService(db)
+    with unidad_de_trabajo(db):
+        mano = cs.obtener_mano_jugador(id_jugador, id_partida)
+        cs.descartar_cartas(id_jugador, [mano[0].id_carta])
+
+    with unidad_de_trabajo(db):
+        cs.jugar_early_train_to_paddington(id_partida, id_jugador)
+
+    ordenes = [c.orden_descarte for c in cs.obtener_cartas_descarte(id_partida, 10)]
+    assert ordenes == [7, 6, 5, 4, 3, 2, 1]
+    contadores_coinciden(db, id_partida)
+
+
+def test_eliminar_carta_descuenta_de_su_pila(partida):
+    db, id_partida, _, _ = partida
+    cs = CartaService(db)
+    antes = cs.obtener_cantidad_mazo(id_partida)
+    with unidad_de_trabajo(db):
+        cs.eliminar_carta(cs.tope_mazo_robo(id_partida, 1)[0])
+    assert cs.obtener_cantidad_mazo(id_partida) == antes - 1
+    contadores_coinciden(db, id_partida)
@@ -123,7 +123,8 @@ def test_robar_secreto_otro_jugador_ok(
     )
     
     # Broadcasts
-    assert mock_manager.broadcast.call_count == 3
+    # la partida no existe en la base: no hay fin de partida
+    assert mock_manager.broadcast.call_count == 2
     
     # Primer broadcast (Jugador Destino)
     broadcast_destino_data = json.loads(mock_manager.broadcast.call_args_list[0].args[1])
@@ -0,0 +1,80 @@
+import pytest
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from sqlalchemy import event
+from game.modelos.db import unidad_de_trabajo
+from game.partidas.utils import ids_asesino_complice, eliminarPartida
+from game.partidas.roles import registro_roles
+from game.cartas.models import Carta
+from game.cartas.catalogo import ID_ASESINO
+from game.cartas.services import CartaService
+from settings import settings
+
+
+@pytest.fixture
+def partida(engine, db, nueva_partida):
+    id_partida, _ = nueva_partida(jugadores=5, estado_en_memoria=True)
+    selects = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: selects.append(statement)
+                 if statement.lstrip().upper().startswith("SELECT") else None)
+    yield db, id_partida, selects
+
+
+def carta_asesino(db, id_partida):
+    return db.query(Carta).filter_by(partida_id=id_partida, id_carta=ID_ASESINO).one()
+
+
+def test_roles_desde_el_reparto_sin_consultas(partida):
+    db, id_partida, selects = partida
+    aciertos = registro_roles.aciertos
+    selects.clear()
+
+    roles = ids_asesino_complice(db, id_partida)
+    assert CartaService(db).obtener_asesino_complice(id_partida) == roles
+    assert selects == []
+    assert registro_roles.aciertos == aciertos + 2
+    assert roles["asesino-id"] == carta_asesino(db, id_partida).jugador_id
+    assert roles["complice-id"] not in (None, roles["asesino-id"])
+
+
+def test_revelar_no_invalida_y_robar_si(partida):
+    db, id_partida, _ = partida
+    cs = CartaService(db)
+    asesino = carta_asesino(db, id_partida)
+    invalidaciones = registro_roles.invalidaciones
+    with unidad_de_trabajo(db):
+        cs.revelar_secreto(asesino.id)
+    assert registro_roles.invalidaciones == invalidaciones
+
+    roles = ids_asesino_complice(db, id_partida)
+    destino = roles["complice-id"]
+    with unidad_de_trabajo(db):
+        cs.robar_secreto(asesino, destino)
+    assert registro_roles.invalidaciones == invalidaciones + 1
+
+    fallos = registro_roles.fallos
+    assert ids_asesino_complice(db, id_partida)["asesino-id"] == destino
+    assert registro_roles.fallos == fallos + 1
+    assert ids_asesino_complice(db, id_partida)["asesino-id"] == destino
+    assert registro_roles.fallos == fallos + 1
+
+
+def test_eliminar_partida_descarta_los_roles(partida):
+    db, id_partida, _ = partida
+    with unidad_de_trabajo(db):
+        eliminarPartida(id_partida, db, archivar=False)
+    assert CartaService(db).obtener_asesino_complice(id_partida) == {"asesino-id": None, "complice-id": None}
+    assert 0 < registro_roles.estadisticas()["tasa_aciertos"] <= 1
+
+
+def test_sin_estado_en_memoria_lee_la_partida(partida, monkeypatch):
+    db, id_partida, selects = partida
+    monkeypatch.setattr(settings, "ESTADO_EN_MEMORIA", False)
+    fallos = registro_roles.fallos
+    selects.clear()
+
+    roles = ids_asesino_complice(db, id_partida)
+    assert roles["asesino-id"] == carta_asesino(db, id_partida).jugador_id
+    assert any("FROM partidas" in s for s in selects)
+    assert registro_roles.fallos == fallos + 1
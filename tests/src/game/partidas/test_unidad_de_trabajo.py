@@ -0,0 +1,61 @@
+import pytest
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from sqlalchemy import event
+from game.modelos.db import get_session_local, unidad_de_trabajo
+from game.partidas.utils import votacion_activada
+from game.partidas.models import Partida
+from game.partidas.services import PartidaService
+from game.cartas.services import CartaService
+
+
+@pytest.fixture
+def partida_iniciada(engine, db, nueva_partida):
+    """Partida de 2 jugadores iniciada sobre un archivo, con un contador de COMMITs."""
+    id_partida, _ = nueva_partida()
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    yield db, id_partida, commits
+
+
+def test_recoger_confirma_una_sola_vez(partida_iniciada):
+    db, id_partida, commits = partida_iniciada
+    turno = PartidaService(db).obtener_turno_actual(id_partida)
+    cs = CartaService(db)
+    mano = cs.obtener_mano_jugador(turno, id_partida)
+    with unidad_de_trabajo(db):
+        cs.descartar_cartas(turno, [mano[0].id_carta, mano[1].id_carta])
+    commits.clear()
+
+    draft = [c.id_carta for c in cs.obtener_mazo_draft(id_partida)][:1]
+    with unidad_de_trabajo(db):
+        resultado = PartidaService(db).manejar_accion_recoger(id_partida, turno, draft)
+
+    assert len(commits) == 1
+    assert resultado["nuevo_turno_id"] != turno
+    assert len(cs.obtener_mano_jugador(turno, id_partida)) == 6
+
+
+def test_accion_fallida_no_deja_cambios(partida_iniciada):
+    db, id_partida, commits = partida_iniciada
+    turno = PartidaService(db).obtener_turno_actual(id_partida)
+    cs = CartaService(db)
+    mano = cs.obtener_mano_jugador(turno, id_partida)
+    mano_antes = sorted(c.id for c in mano)
+
+    with pytest.raises(Exception):
+        with unidad_de_trabajo(db):
+            cs.descartar_cartas(turno, [mano[0].id_carta])
+            # la segunda carta no esta en la mano: se revierte tambien el primer descarte
+            cs.descartar_cartas(turno, [9999])
+
+    assert commits == []
+    assert sorted(c.id for c in cs.obtener_mano_jugador(turno, id_partida)) == mano_antes
+
+
+def test_votacion_activada_confirma_al_volver(engine, partida_iniciada):
+    db, id_partida, commits = partida_iniciada
+    votacion_activada(id_partida, db)
+    assert len(commits) == 1
+    with get_session_local(engine)() as otra:
+        assert otra.get(Partida, id_partida).votacion_activa is True
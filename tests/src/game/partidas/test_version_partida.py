@@ -0,0 +1,115 @@
+import json
+import pytest
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from datetime import date
+from unittest.mock import patch
+from sqlalchemy.orm.exc import StaleDataError
+from fastapi.testclient import TestClient
+from game.modelos.db import get_db, get_session_local, unidad_de_trabajo, ConflictoDeVersion
+from game.partidas.models import Partida
+from game.jugadores.models import Jugador
+from game.cartas.models import Carta
+from game.partidas.version import versiones_confirmadas, agregar_version, CABECERA_VERSION
+from main import app
+
+
+@pytest.fixture
+def base(engine):
+    Sesion = get_session_local(engine)
+    with Sesion() as db:
+        db.add(Partida(id=1, nombre="p", anfitrionId=1, cantJugadores=2, iniciada=True))
+        db.add(Jugador(id=1, nombre="j", partida_id=1, fecha_nacimiento=date(1990, 1, 1)))
+        db.add(Carta(id=1, partida_id=1, jugador_id=1, id_carta=7, nombre="Hercule Poirot",
+                     tipo="Detective", ubicacion="mazo_robo", bocaArriba=False, orden_mazo=1))
+        db.commit()
+    yield Sesion
+    versiones_confirmadas.pop(1, None)
+
+
+def test_una_version_por_transaccion(base):
+    with base() as db:
+        assert db.get(Partida, 1).version == 1
+        with unidad_de_trabajo(db):
+            carta = db.get(Carta, 1)
+            carta.ubicacion = "mano"
+            db.flush()
+            carta.orden_mazo = None
+            db.get(Partida, 1).turno_id = 1
+            db.flush()
+        assert db.get(Partida, 1).version == 2
+        assert versiones_confirmadas[1] == 2
+
+
+def test_transaccion_desactualizada_devuelve_conflicto(base):
+    with base() as primera, base() as segunda:
+        # la primera sesion leyo la partida antes de que la segunda confirmara
+        carta, partida = primera.get(Carta, 1), primera.get(Partida, 1)
+        with unidad_de_trabajo(segunda):
+            segunda.get(Partida, 1).turno_id = 1
+
+        with pytest.raises(ConflictoDeVersion) as error:
+            with unidad_de_trabajo(primera):
+                carta.bocaArriba = True
+        assert error.value.status_code == 409
+        assert error.value.headers["Retry-After"] == "0"
+
+    with base() as db:
+        assert db.get(Carta, 1).bocaArriba is False
+        assert db.get(Partida, 1).version == 2
+
+
+def test_rollback_no_registra_version(base):
+    with base() as db:
+        with pytest.raises(ValueError):
+            with unidad_de_trabajo(db):
+                db.get(Partida, 1).turno_id = 1
+                db.flush()
+                raise ValueError("se revierte")
+        assert 1 not in versiones_confirmadas
+        assert db.get(Partida, 1).version == 1
+
+
+def test_version_en_eventos_y_cabecera(base):
+    versiones_confirmadas[1] = 5
+    evento = json.loads(agregar_version(1, json.dumps({"evento": "turno-actual"})))
+    assert evento["version"] == 5
+    assert agregar_version(1, "texto plano") == "texto plano"
+    assert agregar_version(-1, '{"evento": "x"}') == '{"evento": "x"}'  # partida sin version conocida
+
+    def get_db_override():
+        with base() as db:
+            yield db
+    app.dependency_overrides[get_db] = get_db_override
+    try:
+        respuesta = TestClient(app).get("/partidas/1/turnos")
+    finally:
+        app.dependency_overrides.clear()
+    assert respuesta.headers[CABECERA_VERSION] == "5"
+
+
+def test_eliminar_partida_olvida_su_version(base):
+    from game.partidas.services import PartidaService
+    with base() as db:
+        with unidad_de_trabajo(db):
+            db.get(Partida, 1).turno_id = 1
+        assert 1 in versiones_confirmadas
+        with unidad_de_trabajo(db):
+            PartidaService(db).eliminar_partida_en_bloque(1)
+    assert 1 not in versiones_confirmadas
+
+
+@patch("game.partidas.endpoints.manager")
+@patch("game.partidas.endpoints.jugar_look_into_ashes")
+def test_conflicto_no_se_traga_en_look_into_the_ashes(mock_jugar, mock_manager, base):
+    mock_jugar.side_effect = ConflictoDeVersion()
+    respuesta = TestClient(app).put("/partidas/1/evento/LookIntoTheAshes?id_jugador=1&id_carta_objetivo=20")
+    assert respuesta.status_code == 409
+
+
+@patch("game.partidas.endpoints.abandonarPartida")
+def test_stale_data_fuera_de_la_unidad_de_trabajo_es_409(mock_abandonar, base):
+    mock_abandonar.side_effect = StaleDataError("otra transaccion gano")
+    respuesta = TestClient(app).post("/partidas/1/abandonar?id_jugador=1")
+    assert respuesta.status_code == 409
+    assert respuesta.headers["Retry-After"] == "0"
@@ -0,0 +1,84 @@
+import pytest
+import os
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+from sqlalchemy import event
+from game.modelos.db import unidad_de_trabajo
+from game.partidas.utils import evaluar_fin_partida
+from game.partidas.models import Partida
+from game.partidas.victoria import ASESINO_GANA, DETECTIVES_GANAN, MAZO_AGOTADO, mensaje_fin_partida
+from game.cartas.models import Carta
+from game.cartas.catalogo import ID_ASESINO
+from game.cartas.services import CartaService
+
+
+@pytest.fixture
+def partida(engine, db, nueva_partida):
+    id_partida, _ = nueva_partida()
+    sentencias = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: sentencias.append(statement.lower()))
+    yield db, id_partida, sentencias
+
+
+def carta_asesino(db, id_partida):
+    return db.query(Carta).filter_by(partida_id=id_partida, id_carta=ID_ASESINO).one()
+
+
+def test_roles_del_reparto_sin_fin(partida):
+    db, id_partida, sentencias = partida
+    asesino = carta_asesino(db, id_partida)
+    p = db.get(Partida, id_partida)
+    assert (p.asesino_id, p.asesino_revelado, p.complice_id) == (asesino.jugador_id, False, None)
+
+    sentencias.clear()
+    assert evaluar_fin_partida(id_partida, db) is None
+    assert not [s for s in sentencias if "from cartas" in s]
+
+
+def test_revelar_asesino_ganan_detectives(partida):
+    db, id_partida, _ = partida
+    asesino = carta_asesino(db, id_partida)
+    with unidad_de_trabajo(db):
+        CartaService(db).revelar_secreto(asesino.id)
+
+    fin = evaluar_fin_partida(id_partida, db)
+    assert fin.motivo == DETECTIVES_GANAN and fin.asesino_gano is False
+    assert fin.perdedor_id == asesino.jugador_id
+    assert asesino.jugador_id not in fin.ganadores and len(fin.ganadores) == 1
+    mensaje = mensaje_fin_partida(fin)
+    assert mensaje["jugador-perdedor-id"] == asesino.jugador_id
+    assert mensaje["payload"] == {"ganadores": fin.ganadores, "asesinoGano": False}
+
+
+def test_desgracia_social_y_robo_del_secreto(partida):
+    db, id_partida, _ = partida
+    cs = CartaService(db)
+    id_asesino = carta_asesino(db, id_partida).jugador_id
+    id_otro = next(j.id for j in db.get(Partida, id_partida).jugadores if j.id != id_asesino)
+    with unidad_de_trabajo(db):
+        for secreto in cs.obtener_secretos_jugador(id_otro, id_partida):
+            cs.revelar_secreto(secreto.id)
+
+    fin = evaluar_fin_partida(id_partida, db)
+    assert (fin.motivo, fin.asesino_gano, fin.ganadores) == (ASESINO_GANA, True, [id_asesino])
+
+    # el secreto del asesino pasa oculto al otro jugador: ya no hay ganador
+    with unidad_de_trabajo(db):
+        cs.robar_secreto(carta_asesino(db, id_partida), id_otro)
+    assert db.get(Partida, id_partida).asesino_id == id_otro
+    assert evaluar_fin_partida(id_partida, db) is None
+
+
+def test_mazo_agotado(partida):
+    db, id_partida, _ = partida
+    with unidad_de_trabajo(db):
+        db.get(Partida, id_partida).cartas_mazo_robo = 0
+    fin = evaluar_fin_partida(id_partida, db)
+    assert fin.motivo == MAZO_AGOTADO and fin.asesino_gano is True
+
+
+def test_mazo_sin_contar_no_termina_la_partida(partida):
+    db, id_partida, _ = partida
+    with unidad_de_trabajo(db):
+        db.get(Partida, id_partida).cartas_mazo_robo = None
+    assert evaluar_fin_partida(id_partida, db) is None